@@ -0,0 +1,651 @@
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Literal
+
+import httpx
+import joblib
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+from sklearn.linear_model import LinearRegression
+
+from e2e_taxi_ride_duration_prediction.features import (
+    ColumnarDictEncoder,
+    fit_dict_vectorizer,
+)
+from e2e_taxi_ride_duration_prediction.location_pairs import (
+    LOCATION_ID_CARDINALITY,
+    PAIR_ID_FEATURE,
+    pickup_dropoff_pair_ids,
+)
+from e2e_taxi_ride_duration_prediction.training import (
+    export_lookup_table,
+    export_mmap_model,
+)
+
+
+def generate_taxi_data(
+    n_rows: int,
+    start: datetime = datetime(2025, 1, 1),
+    days: int = 28,
+    seed: int = 0,
+) -> pl.DataFrame:
+    """Generate synthetic trips with the columns and value ranges of the TLC data.
+
+    Trip durations depend on the distance and on a per pickup/dropoff pair speed, so
+    models have something to learn. A few percent of the trips have negative or
+    more than one hour long durations, like the raw data, and are removed by the
+    preprocessing.
+
+    Args:
+        n_rows: Number of trips.
+        start: Earliest pickup time.
+        days: Pickup times are spread uniformly over this many days after `start`.
+        seed: Seed of the random generator, the same seed gives the same data.
+
+    Returns:
+        DataFrame with one row per trip.
+    """
+    rng = np.random.default_rng(seed)
+    # popular zones are picked far more often, as in the real data
+    zone_weights = rng.pareto(1.5, LOCATION_ID_CARDINALITY - 1) + 0.01
+    zone_weights /= zone_weights.sum()
+    pickup_ids = rng.choice(
+        np.arange(1, LOCATION_ID_CARDINALITY), n_rows, p=zone_weights
+    )
+    dropoff_ids = rng.choice(
+        np.arange(1, LOCATION_ID_CARDINALITY), n_rows, p=zone_weights
+    )
+
+    trip_distance = np.round(rng.lognormal(0.6, 0.8, n_rows), 2)
+    pair_minutes_per_mile = 2.0 + (pickup_ids * 7 + dropoff_ids * 13) % 5
+    duration_minutes = (
+        2.0 + trip_distance * pair_minutes_per_mile + rng.normal(0, 3, n_rows)
+    )
+    outliers = rng.random(n_rows) < 0.03
+    duration_minutes[outliers] = rng.uniform(-10, 180, outliers.sum())
+
+    pickup_offset = rng.integers(0, days * 24 * 3600 * 10**6, n_rows)
+    pickup = np.datetime64(start, "us") + np.sort(pickup_offset).astype(
+        "timedelta64[us]"
+    )
+    dropoff = pickup + (duration_minutes * 60 * 10**6).astype("timedelta64[us]")
+
+    return pl.DataFrame(
+        {
+            "VendorID": rng.choice(np.array([1, 2], dtype=np.int32), n_rows),
+            "tpep_pickup_datetime": pickup,
+            "tpep_dropoff_datetime": dropoff,
+            "passenger_count": rng.integers(1, 5, n_rows).astype(np.float64),
+            "trip_distance": trip_distance,
+            "RatecodeID": rng.choice(np.array([1.0, 2.0, 5.0]), n_rows),
+            "store_and_fwd_flag": rng.choice(np.array(["N", "Y"]), n_rows),
+            "PULocationID": pickup_ids.astype(np.int32),
+            "DOLocationID": dropoff_ids.astype(np.int32),
+            "payment_type": rng.choice(np.array([1, 2, 3, 4], dtype=np.int64), n_rows),
+            "fare_amount": np.round(3.0 + 2.5 * trip_distance, 2),
+        }
+    )
+
+
+def write_taxi_data(
+    path: str | Path,
+    n_rows: int,
+    chunk_rows: int = 5_000_000,
+    start: datetime = datetime(2025, 1, 1),
+    days: int = 28,
+    seed: int = 0,
+) -> Path:
+    """Write synthetic trips to a parquet file, chunk by chunk in bounded memory.
+
+    Each chunk covers its own consecutive slice of the `days` after `start`, so the
+    file is sorted by pickup time like the concatenated TLC data.
+
+    Args:
+        path: Output parquet file.
+        n_rows: Total number of trips.
+        chunk_rows: Trips generated and written at once.
+        start: Earliest pickup time.
+        days: Pickup times are spread over this many days after `start`.
+        seed: Seed of the random generator.
+
+    Returns:
+        The path of the written file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n_chunks = max(1, -(-n_rows // chunk_rows))
+    chunk_days = days / n_chunks
+
+    writer = None
+    try:
+        for i in range(n_chunks):
+            rows = min(chunk_rows, n_rows - i * chunk_rows)
+            chunk = generate_taxi_data(
+                rows,
+                start=start + timedelta(days=i * chunk_days),
+                days=max(1, round(chunk_days)),
+                seed=seed + i,
+            ).to_arrow()
+            if writer is None:
+                writer = pq.ParquetWriter(path, chunk.schema)
+            writer.write_table(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def parquet_bytes_read(
+    paths: list[Path],
+    columns: list[str] | None = None,
+    time_column: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> int:
+    """Compressed bytes a scan reads from parquet files, from their metadata.
+
+    Args:
+        paths: Scanned parquet files.
+        columns: Columns the scan reads, all columns if None.
+        time_column: Column whose row group statistics are used for pruning.
+        start: Row groups with all `time_column` values before start are skipped.
+        end: Row groups with all `time_column` values at or after end are skipped.
+
+    Returns:
+        Sum of the compressed sizes of the read column chunks.
+    """
+    total = 0
+    for path in paths:
+        metadata = pq.ParquetFile(path).metadata
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            chunks = [row_group.column(j) for j in range(row_group.num_columns)]
+            if time_column is not None:
+                stats = next(
+                    chunk.statistics
+                    for chunk in chunks
+                    if chunk.path_in_schema == time_column
+                )
+                if stats is not None and stats.has_min_max:
+                    if (start is not None and stats.max < start) or (
+                        end is not None and stats.min >= end
+                    ):
+                        continue
+            total += sum(
+                chunk.total_compressed_size
+                for chunk in chunks
+                if columns is None or chunk.path_in_schema in columns
+            )
+    return total
+
+
+@dataclass(frozen=True)
+class StageReport:
+    """Resources used by one materialized pipeline stage.
+
+    Attributes:
+        stage: Name of the stage.
+        rows: Rows of the stage output.
+        columns: Columns of the stage output.
+        bytes_read: Parquet bytes read by the stage, 0 if it reads no files.
+        memory_bytes: Estimated in-memory size of the stage output.
+        max_rss_bytes: Peak resident memory of the process after the stage.
+        seconds: Wall-clock time of the stage.
+    """
+
+    stage: str
+    rows: int
+    columns: int
+    bytes_read: int
+    memory_bytes: int
+    max_rss_bytes: int
+    seconds: float
+
+
+def profile_stages(
+    lf: pl.LazyFrame,
+    stages: list[tuple[str, Callable[[pl.LazyFrame], pl.LazyFrame]]],
+    bytes_read: int = 0,
+) -> list[StageReport]:
+    """Run pipeline stages one at a time and report the resources of each.
+
+    Every stage is collected on its own, on the materialized output of the previous
+    stage, so its output size is observable. The Polars optimizer cannot fuse stages
+    this way, the reports show where data is read and how large it gets, not the
+    end-to-end time of the fused query.
+
+    Args:
+        lf: Input of the first stage, usually a parquet scan.
+        stages: (name, function) pairs, each function maps the previous output to
+            the stage output.
+        bytes_read: Parquet bytes read by the first stage, see `parquet_bytes_read`.
+
+    Returns:
+        One StageReport per stage.
+    """
+    reports = []
+    for i, (name, stage) in enumerate(stages):
+        start = time.perf_counter()
+        df = stage(lf).collect()
+        seconds = time.perf_counter() - start
+        reports.append(
+            StageReport(
+                stage=name,
+                rows=df.height,
+                columns=df.width,
+                bytes_read=bytes_read if i == 0 else 0,
+                memory_bytes=int(df.estimated_size()),
+                # ru_maxrss is in KiB on Linux
+                max_rss_bytes=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                seconds=seconds,
+            )
+        )
+        lf = df.lazy()
+    return reports
+
+
+def format_stage_reports(reports: list[StageReport]) -> str:
+    lines = [
+        f"{'stage':<32}{'rows':>12}{'cols':>6}{'read [MB]':>11}"
+        f"{'output [MB]':>13}{'max RSS [MB]':>14}{'time [s]':>10}"
+    ]
+    for report in reports:
+        lines.append(
+            f"{report.stage:<32}{report.rows:>12,}{report.columns:>6}"
+            f"{report.bytes_read / 2**20:>11.1f}{report.memory_bytes / 2**20:>13.1f}"
+            f"{report.max_rss_bytes / 2**20:>14.1f}{report.seconds:>10.3f}"
+        )
+    return "\n".join(lines)
+
+
+@dataclass
+class BenchmarkResult:
+    """Timings of one benchmark at one scale.
+
+    Attributes:
+        name: Name of the benchmarked stage, e.g. "basic_preprocessing".
+        n_rows: Number of rows (or requests) processed per run.
+        times: Wall-clock seconds of each run, or of each request for latency
+            benchmarks.
+        extra: Additional measurements, e.g. the throughput under load.
+    """
+
+    name: str
+    n_rows: int
+    times: list[float]
+    extra: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}[{self.n_rows}]"
+
+    @property
+    def min(self) -> float:
+        return min(self.times)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.times)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.n_rows / self.min if self.min > 0 else float("inf")
+
+    def percentile(self, q: float) -> float:
+        return float(np.percentile(self.times, q))
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            **asdict(self),
+            "min": self.min,
+            "median": self.median,
+            "rows_per_second": self.rows_per_second,
+        }
+
+
+def time_function(
+    name: str,
+    function: Callable[[], Any],
+    n_rows: int,
+    repeats: int = 3,
+    warmup: int = 1,
+) -> BenchmarkResult:
+    """Time `function` over several runs, after discarding warmup runs.
+
+    Args:
+        name: Name of the benchmark.
+        function: Callable without arguments running the benchmarked code once.
+        n_rows: Number of rows one call processes, used for the throughput.
+        repeats: Number of timed runs.
+        warmup: Number of untimed runs before the timed ones.
+
+    Returns:
+        The BenchmarkResult of the timed runs.
+    """
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return BenchmarkResult(name=name, n_rows=n_rows, times=times)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(
+    results: list[BenchmarkResult],
+    path: str | Path,
+    metadata: dict[str, Any] | None = None,
+) -> Path:
+    """Save benchmark results as JSON together with the commit and the platform.
+
+    Args:
+        results: Results to save.
+        path: Output JSON file.
+        metadata: Additional entries for the metadata, e.g. the CLI arguments.
+
+    Returns:
+        The path of the written file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "metadata": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "polars": pl.__version__,
+            **(metadata or {}),
+        },
+        "results": [result.to_dict() for result in results],
+    }
+    path.write_text(json.dumps(document, indent=2))
+    return path
+
+
+def load_results(path: str | Path) -> list[BenchmarkResult]:
+    """Load the results saved with `save_results`."""
+    document = json.loads(Path(path).read_text())
+    return [
+        BenchmarkResult(
+            name=result["name"],
+            n_rows=result["n_rows"],
+            times=result["times"],
+            extra=result.get("extra", {}),
+        )
+        for result in document["results"]
+    ]
+
+
+@dataclass(frozen=True)
+class Comparison:
+    """Change of one benchmark between a baseline and the current results.
+
+    Attributes:
+        key: Benchmark name and scale.
+        baseline: Compared statistic of the baseline runs in seconds.
+        current: Compared statistic of the current runs in seconds.
+        ratio: current / baseline, above 1 means slower.
+        regression: Whether the slowdown exceeds the threshold.
+    """
+
+    key: str
+    baseline: float
+    current: float
+    ratio: float
+    regression: bool
+
+
+def compare_results(
+    baseline: list[BenchmarkResult],
+    current: list[BenchmarkResult],
+    threshold: float = 0.1,
+    statistic: Literal["min", "median"] = "min",
+) -> list[Comparison]:
+    """Compare benchmarks present in both result sets.
+
+    Args:
+        baseline: Results of the reference commit.
+        current: Results to check.
+        threshold: Relative slowdown above which a benchmark counts as regression.
+        statistic: Statistic of the times that is compared, "min" suits repeated
+            runs of the same work, "median" suits request latencies.
+
+    Returns:
+        One Comparison per benchmark key found in both result sets.
+    """
+    baseline_by_key = {result.key: result for result in baseline}
+    comparisons = []
+    for result in current:
+        reference = baseline_by_key.get(result.key)
+        if reference is None:
+            continue
+        baseline_time = getattr(reference, statistic)
+        current_time = getattr(result, statistic)
+        ratio = current_time / baseline_time if baseline_time > 0 else float("inf")
+        comparisons.append(
+            Comparison(
+                key=result.key,
+                baseline=baseline_time,
+                current=current_time,
+                ratio=ratio,
+                regression=ratio > 1 + threshold,
+            )
+        )
+    return comparisons
+
+
+def format_results(results: list[BenchmarkResult]) -> str:
+    lines = [f"{'benchmark':<40}{'min [s]':>12}{'median [s]':>12}{'rows/s':>14}"]
+    for result in results:
+        lines.append(
+            f"{result.key:<40}{result.min:>12.4f}{result.median:>12.4f}"
+            f"{result.rows_per_second:>14,.0f}"
+        )
+    return "\n".join(lines)
+
+
+def format_comparisons(comparisons: list[Comparison]) -> str:
+    lines = [f"{'benchmark':<40}{'baseline [s]':>14}{'current [s]':>14}{'ratio':>8}"]
+    for comparison in comparisons:
+        marker = "  REGRESSION" if comparison.regression else ""
+        lines.append(
+            f"{comparison.key:<40}{comparison.baseline:>14.4f}"
+            f"{comparison.current:>14.4f}{comparison.ratio:>8.2f}{marker}"
+        )
+    return "\n".join(lines)
+
+
+async def run_concurrent_load(
+    name: str,
+    send: Callable[[int], Awaitable[Any]],
+    n_requests: int,
+    concurrency: int,
+) -> BenchmarkResult:
+    """Send `n_requests` requests with at most `concurrency` in flight at once.
+
+    Args:
+        name: Name of the benchmark.
+        send: Coroutine function sending the i-th request and awaiting its response.
+        n_requests: Total number of requests.
+        concurrency: Number of concurrent clients.
+
+    Returns:
+        BenchmarkResult with the latency of each request as times, and the
+        throughput and latency percentiles as extra measurements.
+    """
+    latencies: list[float] = []
+    next_request = iter(range(n_requests))
+
+    async def client() -> None:
+        for i in next_request:
+            start = time.perf_counter()
+            await send(i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    result = BenchmarkResult(
+        name=f"{name}[concurrency={concurrency}]", n_rows=n_requests, times=latencies
+    )
+    result.extra = {
+        "throughput_rps": n_requests / elapsed,
+        "p50_ms": result.percentile(50) * 1000,
+        "p95_ms": result.percentile(95) * 1000,
+        "p99_ms": result.percentile(99) * 1000,
+    }
+    return result
+
+
+def train_synthetic_model(path: str | Path, n_rows: int = 200_000) -> Path:
+    """Train the baseline model on synthetic trips and save it like training does.
+
+    Writes the joblib (model, DictVectorizer) artifact together with its lookup
+    table and memory-mapped export, so serving benchmarks can run without a
+    trained model or downloaded data.
+
+    Args:
+        path: Path of the joblib artifact.
+        n_rows: Number of synthetic trips to train on.
+
+    Returns:
+        The artifact path.
+    """
+    path = Path(path)
+    df = generate_taxi_data(n_rows)
+    duration = (
+        df["tpep_dropoff_datetime"] - df["tpep_pickup_datetime"]
+    ).dt.total_seconds() / 60
+    valid = (duration >= 1) & (duration <= 60)
+    features = pl.DataFrame(
+        {
+            PAIR_ID_FEATURE: pickup_dropoff_pair_ids(
+                df["PULocationID"].to_numpy(), df["DOLocationID"].to_numpy()
+            ),
+            "trip_distance": df["trip_distance"],
+        }
+    ).filter(valid)
+    dict_vectorizer = fit_dict_vectorizer(features)
+    X = ColumnarDictEncoder(dict_vectorizer).transform(features)
+    model = LinearRegression().fit(X, duration.filter(valid).to_numpy())
+
+    joblib.dump((model, dict_vectorizer), path)
+    export_serving_artifacts(path)
+    return path
+
+
+def export_serving_artifacts(path: str | Path) -> None:
+    """Write the lookup table and the memory-mapped export of a joblib artifact.
+
+    Models that can not be compiled (non-linear or other features) are skipped.
+    """
+    model = joblib.load(path)
+    export_lookup_table.fn(model, path)
+    export_mmap_model.fn(model, path)
+
+
+def time_import(
+    module: str, env: dict[str, str] | None = None
+) -> tuple[float, list[str]]:
+    """Import a module in a fresh interpreter and time it.
+
+    Args:
+        module: Dotted name of the module.
+        env: Extra environment variables of the interpreter.
+
+    Returns:
+        Seconds the import took and the sorted top-level packages it loaded.
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "packages = sorted({name.partition('.')[0] for name in sys.modules})\n"
+        "print(json.dumps([elapsed, packages]))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, **(env or {})},
+    ).stdout
+    elapsed, packages = json.loads(output.splitlines()[-1])
+    return elapsed, packages
+
+
+def time_to_first_response(
+    command: list[str],
+    url: str,
+    payload: dict[str, Any],
+    env: dict[str, str] | None = None,
+    timeout: float = 60.0,
+    poll_interval: float = 0.005,
+) -> float:
+    """Start a server process and time until it answers a POST request successfully.
+
+    Args:
+        command: Command starting the server.
+        url: URL the request is sent to.
+        payload: JSON body of the request.
+        env: Extra environment variables of the server process.
+        timeout: Seconds to wait for the first successful response.
+        poll_interval: Seconds between attempts while the server is not up yet.
+
+    Returns:
+        Seconds from starting the process to the first successful response.
+
+    Raises:
+        TimeoutError: If the server did not answer successfully within `timeout`.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            while time.perf_counter() - start < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {process.returncode}")
+                try:
+                    if client.post(url, json=payload).is_success:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                time.sleep(poll_interval)
+        raise TimeoutError(f"No successful response from {url} within {timeout}s.")
+    finally:
+        process.terminate()
+        process.wait()
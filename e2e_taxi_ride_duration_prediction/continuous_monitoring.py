@@ -0,0 +1,449 @@
+import asyncio
+import contextlib
+import re
+import threading
+from collections.abc import AsyncIterator, Callable, Iterator, Mapping
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import polars as pl
+import requests
+from fastapi import FastAPI, HTTPException
+from loguru import logger
+
+from e2e_taxi_ride_duration_prediction.monitoring_stats import (
+    DRIFT_THRESHOLD,
+    ColumnDrift,
+    DataProfile,
+    compare_profiles,
+)
+from e2e_taxi_ride_duration_prediction.preprocessing import calculate_duration
+
+# Files of the prediction log, see serving/prediction_log.py. Only complete files
+# match the pattern: the file that is being written has a hidden temporary name.
+PREDICTION_LOG_PATTERN = "predictions-*.parquet"
+TIMESTAMP_COLUMN = "timestamp"
+# Columns a logged prediction and its completed trip are matched on.
+RIDE_COLUMNS = ["PULocationID", "DOLocationID", "trip_distance"]
+
+DEFAULT_WINDOWS = {
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+    "7d": timedelta(days=7),
+}
+# Evidently's DataDriftPreset flags the data set as drifted from this share of
+# drifted columns, and RegressionPreset fails errors 10% above the reference.
+DRIFT_SHARE = 0.5
+ERROR_TOLERANCE = 0.1
+
+_WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_window(text: str) -> timedelta:
+    """Parse a window length such as `15m`, `1h` or `7d`.
+
+    Raises:
+        ValueError: If the text is not a positive number of minutes, hours or days.
+    """
+    match = re.fullmatch(r"(\d+)([mhd])", text.strip())
+    if match is None or int(match[1]) == 0:
+        raise ValueError(f"Invalid window {text!r}, expected e.g. 15m, 1h or 7d.")
+    return timedelta(**{_WINDOW_UNITS[match[2]]: int(match[1])})
+
+
+@dataclass
+class WindowMetrics:
+    """Drift and error metrics of the predictions in one sliding window.
+
+    Attributes:
+        window: Name of the window, e.g. `1h`.
+        start: Start of the window, inclusive.
+        end: End of the window, the time of the evaluation.
+        rows: Logged predictions in the window.
+        drift: Drift per column against the reference profile.
+        drift_share: Share of drifted columns.
+        regression: MAE, RMSE and R² of the predictions with a target.
+        failed_tests: Names of the failed tests, empty below `min_rows` rows.
+    """
+
+    window: str
+    start: datetime
+    end: datetime
+    rows: int
+    drift: dict[str, ColumnDrift]
+    drift_share: float
+    regression: dict[str, float] | None = None
+    failed_tests: list[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON serializable metrics."""
+        return {
+            **asdict(self),
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+        }
+
+
+@dataclass
+class MonitoringAlert:
+    """Tests of a window that started failing."""
+
+    window: str
+    failed_tests: list[str]
+    metrics: WindowMetrics
+
+
+AlertHook = Callable[[MonitoringAlert], None]
+# Returns the completed trips with TLC columns, called on every poll so that
+# newly published trip files are picked up.
+TripsSource = Callable[[], pl.LazyFrame]
+
+
+def log_alert(alert: MonitoringAlert) -> None:
+    logger.warning(
+        f"Monitoring window {alert.window} failed {alert.failed_tests} "
+        f"over {alert.metrics.rows:,} predictions"
+    )
+
+
+def webhook_alert_hook(url: str, timeout: float = 5.0) -> AlertHook:
+    """Alert hook posting the alert as JSON to `url`, failures are only logged."""
+
+    def post_alert(alert: MonitoringAlert) -> None:
+        log_alert(alert)
+        try:
+            requests.post(
+                url,
+                json={
+                    "window": alert.window,
+                    "failed_tests": alert.failed_tests,
+                    "metrics": alert.metrics.to_dict(),
+                },
+                timeout=timeout,
+            ).raise_for_status()
+        except requests.RequestException as e:
+            logger.error(f"Could not post monitoring alert to {url}: {e}")
+
+    return post_alert
+
+
+def join_actual_durations(
+    records: pl.DataFrame,
+    trips: pl.LazyFrame,
+    tolerance: timedelta = timedelta(minutes=5),
+    trips_time_zone: str = "America/New_York",
+    target: str = "duration",
+) -> pl.DataFrame:
+    """Add the true duration of the completed trip to logged predictions.
+
+    The prediction log has no ride ID and no target. A prediction is matched with
+    the trip of the same pickup and dropoff zones and distance whose pickup time is
+    nearest to the prediction's timestamp, within `tolerance`. Predictions without
+    a match get a null target, they only count towards drift.
+
+    Args:
+        records: Logged predictions, see serving/prediction_log.py.
+        trips: Completed trips with TLC columns, e.g. from
+            `ingestion.scan_partitions`.
+        tolerance: Maximum time between a prediction and the trip's pickup.
+        trips_time_zone: Time zone of naive TLC timestamps.
+        target: Name of the added duration column, in minutes.
+
+    Returns:
+        The records with the `target` column.
+    """
+    if records.is_empty():
+        return records.with_columns(pl.lit(None, pl.Float64).alias(target))
+    pickup = pl.col("tpep_pickup_datetime")
+    pickup_dtype = trips.collect_schema()["tpep_pickup_datetime"]
+    if isinstance(pickup_dtype, pl.Datetime) and pickup_dtype.time_zone is None:
+        pickup = pickup.dt.replace_time_zone(trips_time_zone)
+    start, end = records[TIMESTAMP_COLUMN].min(), records[TIMESTAMP_COLUMN].max()
+    actuals = (
+        calculate_duration.fn(trips)
+        .select(
+            pickup.dt.convert_time_zone("UTC")
+            .cast(pl.Datetime("us", "UTC"))
+            .alias(TIMESTAMP_COLUMN),
+            pl.col("PULocationID").cast(pl.Int32),
+            pl.col("DOLocationID").cast(pl.Int32),
+            pl.col("trip_distance").cast(pl.Float64),
+            pl.col("duration").alias(target),
+        )
+        .filter(pl.col(TIMESTAMP_COLUMN).is_between(start - tolerance, end + tolerance))
+        .sort(TIMESTAMP_COLUMN)
+        .collect()
+    )
+    return (
+        records.with_columns(
+            pl.col("PULocationID").cast(pl.Int32),
+            pl.col("DOLocationID").cast(pl.Int32),
+            pl.col("trip_distance").cast(pl.Float64),
+        )
+        .sort(TIMESTAMP_COLUMN, maintain_order=True)
+        .join_asof(
+            actuals,
+            on=TIMESTAMP_COLUMN,
+            by=RIDE_COLUMNS,
+            strategy="nearest",
+            tolerance=tolerance,
+        )
+    )
+
+
+class PredictionLogReader:
+    """Yields the prediction log files that were not read before.
+
+    Log files are written once and never modified, so remembering their names is
+    enough to read every record exactly once.
+    """
+
+    def __init__(
+        self, log_dir: str | Path, pattern: str = PREDICTION_LOG_PATTERN
+    ) -> None:
+        self.log_dir = Path(log_dir)
+        self.pattern = pattern
+        self._read: set[str] = set()
+
+    def read_new(self) -> Iterator[pl.DataFrame]:
+        paths = sorted(self.log_dir.glob(self.pattern))
+        # forget files deleted by the log's retention, the set stays bounded
+        self._read &= {path.name for path in paths}
+        for path in paths:
+            if path.name in self._read:
+                continue
+            try:
+                frame = pl.read_parquet(path)
+            except (OSError, pl.exceptions.PolarsError) as e:
+                logger.error(f"Skipping unreadable prediction log {path}: {e}")
+            else:
+                yield frame
+            self._read.add(path.name)
+
+
+class SlidingWindowMonitor:
+    """Rolling drift and error metrics of logged predictions over several windows.
+
+    Records are summarized into one DataProfile per time bucket of `bucket`
+    length, so an update costs O(new rows) and the memory only depends on the
+    number of buckets. The metrics of a window merge the profiles of its buckets
+    and compare them with the reference profile, using the drift methods of
+    `monitoring_stats`. Buckets older than the longest window are dropped.
+
+    The tests mirror Evidently's presets:
+
+    - `drift:<column>` fails if the column drifted;
+    - `drift_share` fails if at least `drift_share` of the columns drifted;
+    - `mae` and `rmse` fail if the error is more than `error_tolerance` above
+      the reference error, if both have targets.
+
+    The served prediction log has no target, so the error tests only run on
+    records joined with the durations of the completed trips. With a `trips`
+    source, `poll` joins every new log file with it before the update, see
+    `join_actual_durations`. Trips that are not published yet when a log file is
+    read leave their predictions without target, they only count towards drift.
+
+    The alert hook is called when a window starts failing a test, not on every
+    evaluation. Windows with fewer than `min_rows` predictions are not tested.
+    Updates and queries may come from different threads.
+    """
+
+    def __init__(
+        self,
+        reference: DataProfile,
+        windows: Mapping[str, timedelta] = DEFAULT_WINDOWS,
+        bucket: timedelta = timedelta(minutes=5),
+        target: str = "duration",
+        drift_threshold: float = DRIFT_THRESHOLD,
+        drift_share: float = DRIFT_SHARE,
+        error_tolerance: float = ERROR_TOLERANCE,
+        min_rows: int = 1000,
+        alert_hook: AlertHook = log_alert,
+        clock: Callable[[], datetime] = lambda: datetime.now(UTC),
+        trips: TripsSource | None = None,
+    ) -> None:
+        if not windows:
+            raise ValueError("At least one window is required.")
+        self.reference = reference
+        self.windows = dict(windows)
+        self.bucket_seconds = int(bucket.total_seconds())
+        self.target = target
+        self.drift_threshold = drift_threshold
+        self.drift_share = drift_share
+        self.error_tolerance = error_tolerance
+        self.min_rows = min_rows
+        self.alert_hook = alert_hook
+        self.clock = clock
+        self.trips = trips
+        self._buckets: dict[int, DataProfile] = {}
+        self._failing: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, records: pl.DataFrame) -> int:
+        """Add logged prediction records, returns the number of rows kept.
+
+        Records older than the longest window are dropped.
+        """
+        oldest = self._bucket_index(self.clock() - max(self.windows.values()))
+        records = records.with_columns(
+            (pl.col(TIMESTAMP_COLUMN).dt.epoch("s") // self.bucket_seconds).alias(
+                "_bucket"
+            )
+        ).filter(pl.col("_bucket") >= oldest)
+        with self._lock:
+            for (bucket,), batch in records.partition_by(
+                "_bucket", as_dict=True
+            ).items():
+                profile = self._buckets.get(bucket)
+                if profile is None:
+                    profile = self._buckets[bucket] = DataProfile.empty()
+                profile.update(batch, self.target)
+            for bucket in [b for b in self._buckets if b < oldest]:
+                del self._buckets[bucket]
+        return records.height
+
+    def metrics(self, window: str) -> WindowMetrics:
+        """Current metrics of a window.
+
+        Raises:
+            KeyError: If the window is not monitored.
+        """
+        length = self.windows[window]
+        end = self.clock()
+        start = end - length
+        first = self._bucket_index(start)
+        profile = DataProfile.empty()
+        with self._lock:
+            for bucket, bucket_profile in self._buckets.items():
+                if bucket >= first:
+                    profile.merge(bucket_profile)
+
+        drift = compare_profiles(self.reference, profile, self.drift_threshold)
+        drifted = sum(d.drifted for d in drift.values())
+        metrics = WindowMetrics(
+            window=window,
+            start=start,
+            end=end,
+            rows=profile.rows,
+            drift=drift,
+            drift_share=drifted / len(drift) if drift else 0.0,
+        )
+        if profile.regression.n:
+            metrics.regression = _regression_metrics(profile)
+        if profile.rows >= self.min_rows:
+            metrics.failed_tests = self._failed_tests(metrics)
+        return metrics
+
+    def check(self) -> list[MonitoringAlert]:
+        """Test all windows and call the alert hook for newly failing tests."""
+        alerts = []
+        for window in self.windows:
+            metrics = self.metrics(window)
+            failing = set(metrics.failed_tests)
+            new = failing - self._failing.get(window, set())
+            self._failing[window] = failing
+            if new:
+                alert = MonitoringAlert(window, metrics.failed_tests, metrics)
+                alerts.append(alert)
+                try:
+                    self.alert_hook(alert)
+                except Exception:
+                    logger.exception(f"Alert hook failed for window {window}")
+        return alerts
+
+    def poll(self, reader: PredictionLogReader) -> int:
+        """Add the new records of the log and test the windows.
+
+        With a `trips` source, the records are joined with the actual durations
+        first. If the join fails, the records are added without target.
+        """
+        rows = 0
+        for frame in reader.read_new():
+            if self.trips is not None:
+                try:
+                    frame = join_actual_durations(
+                        frame, self.trips(), target=self.target
+                    )
+                except (OSError, pl.exceptions.PolarsError) as e:
+                    logger.error(f"Could not join actual durations: {e}")
+            rows += self.update(frame)
+        self.check()
+        return rows
+
+    async def run(self, reader: PredictionLogReader, interval: float) -> None:
+        """Poll the log every `interval` seconds until cancelled."""
+        while True:
+            try:
+                rows = await asyncio.to_thread(self.poll, reader)
+                if rows:
+                    logger.debug(f"Added {rows:,} logged predictions")
+            except Exception:
+                logger.exception("Polling the prediction log failed")
+            await asyncio.sleep(interval)
+
+    def _bucket_index(self, time: datetime) -> int:
+        return int(time.timestamp()) // self.bucket_seconds
+
+    def _failed_tests(self, metrics: WindowMetrics) -> list[str]:
+        failed = [f"drift:{d.column}" for d in metrics.drift.values() if d.drifted]
+        if metrics.drift and metrics.drift_share >= self.drift_share:
+            failed.append("drift_share")
+        if metrics.regression is not None and self.reference.regression.n:
+            reference = _regression_metrics(self.reference)
+            for name in ("mae", "rmse"):
+                limit = reference[name] * (1 + self.error_tolerance)
+                if metrics.regression[name] > limit:
+                    failed.append(name)
+        return failed
+
+
+def _regression_metrics(profile: DataProfile) -> dict[str, float]:
+    stats = profile.regression
+    return {
+        "n": stats.n,
+        "mae": stats.mean_absolute_error,
+        "rmse": stats.root_mean_squared_error,
+        "r2": stats.r2_score,
+    }
+
+
+def create_app(
+    monitor: SlidingWindowMonitor,
+    reader: PredictionLogReader,
+    poll_interval: float = 30.0,
+) -> FastAPI:
+    """Query API of a monitor that polls the prediction log in the background.
+
+    - `GET /windows`: metrics of all windows;
+    - `GET /windows/{window}`: metrics of one window.
+
+    Computing the metrics merges profiles and compares histograms, so the
+    endpoints are plain functions that FastAPI runs in its thread pool instead of
+    blocking the event loop.
+    """
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        poller = asyncio.create_task(monitor.run(reader, poll_interval))
+        try:
+            yield
+        finally:
+            poller.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await poller
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/windows")
+    def all_windows() -> list[dict[str, Any]]:
+        return [monitor.metrics(window).to_dict() for window in monitor.windows]
+
+    @app.get("/windows/{window}")
+    def one_window(window: str) -> dict[str, Any]:
+        if window not in monitor.windows:
+            raise HTTPException(404, f"Unknown window {window}.")
+        return monitor.metrics(window).to_dict()
+
+    return app
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Union
+
+import joblib
+import numpy as np
+import numpy.typing as npt
+from loguru import logger
+from scipy.sparse import load_npz, save_npz, spmatrix
+from sklearn.feature_extraction import DictVectorizer
+
+# Bump when the preprocessing or the cache layout changes in a way the
+# fingerprinted parameters do not capture, so stale entries are never reused.
+CACHE_VERSION = 1
+
+_MATRIX_FILES = ("X_train", "X_test")
+_TARGET_FILES = ("y_train", "y_test")
+_VECTORIZER_FILE = "dict_vectorizer.joblib"
+_META_FILE = "meta.json"
+
+
+@dataclass
+class CachedFeatures:
+    """Vectorized train/test data as produced by `dict_vectorize_features`.
+
+    Loaded from the cache, the targets are read-only memory-mapped arrays.
+    """
+
+    X_train: Union[spmatrix, np.ndarray]
+    X_test: Union[spmatrix, np.ndarray]
+    y_train: npt.NDArray
+    y_test: npt.NDArray
+    dict_vectorizer: DictVectorizer
+
+
+def fingerprint_files(paths: Iterable[str | Path]) -> list[dict[str, Any]]:
+    """Identify input files by path, size and modification time.
+
+    Hashing the content of multi-GB monthly files would cost about as much as the
+    preprocessing itself. The monthly files are only ever replaced atomically, so a
+    changed file always gets a new size or mtime.
+    """
+    fingerprints = []
+    for path in sorted(Path(p).resolve() for p in paths):
+        stat = path.stat()
+        fingerprints.append(
+            {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        )
+    return fingerprints
+
+
+def pipeline_fingerprint(input_paths: Iterable[str | Path], **params: Any) -> str:
+    """Content address of a preprocessing run.
+
+    Args:
+        input_paths: Input files of the run, e.g. the monthly partitions.
+        **params: Everything else the result depends on, e.g. date ranges and the
+            feature list. Values must be JSON serializable, datetimes are
+            converted with `str`.
+
+    Returns:
+        Hex sha256 of the input file fingerprints, the parameters and
+        `CACHE_VERSION`.
+    """
+    payload = json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "inputs": fingerprint_files(input_paths),
+            "params": params,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _save_array(path: Path, array: Union[spmatrix, np.ndarray]) -> None:
+    if isinstance(array, np.ndarray):
+        np.save(path.with_suffix(".npy"), array)
+    else:
+        save_npz(path.with_suffix(".npz"), array, compressed=False)
+
+
+def _load_array(path: Path) -> Union[spmatrix, np.ndarray]:
+    if path.with_suffix(".npy").exists():
+        return np.load(path.with_suffix(".npy"), mmap_mode="r")
+    return load_npz(path.with_suffix(".npz"))
+
+
+def _directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+
+
+class FeatureCache:
+    """Content-addressed on-disk cache of vectorized features, LRU-evicted by size.
+
+    Each entry is a directory named by its `pipeline_fingerprint`, holding the
+    feature matrices as `.npz` (or `.npy` if dense), the targets as `.npy`, the
+    fitted DictVectorizer and a `meta.json`. Entries are written to a temporary
+    directory and renamed into place, so concurrent runs never see partial
+    entries. The modification time of `meta.json` records the last use and the
+    least recently used entries are removed once the cache exceeds `max_bytes`.
+
+    Example:
+        cache = FeatureCache(ROOT_DIR / "data/cache/features")
+        key = pipeline_fingerprint(partition_paths, features=FEATURES)
+        features = cache.get(key)
+        if features is None:
+            features = CachedFeatures(...)
+            cache.put(key, features)
+    """
+
+    def __init__(self, cache_dir: str | Path, max_bytes: int = 10 * 2**30) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def __contains__(self, key: str) -> bool:
+        return (self._entry_dir(key) / _META_FILE).exists()
+
+    def get(self, key: str) -> CachedFeatures | None:
+        """Load an entry and mark it as recently used, None on a cache miss."""
+        entry_dir = self._entry_dir(key)
+        meta_path = entry_dir / _META_FILE
+        if not meta_path.exists():
+            logger.info(f"Feature cache miss for {key[:12]}")
+            return None
+
+        try:
+            X_train, X_test = (_load_array(entry_dir / name) for name in _MATRIX_FILES)
+            y_train, y_test = (
+                np.load(entry_dir / f"{name}.npy", mmap_mode="r")
+                for name in _TARGET_FILES
+            )
+            dict_vectorizer = joblib.load(entry_dir / _VECTORIZER_FILE)
+        except (OSError, ValueError) as e:
+            # e.g. an entry evicted by another process while it was read
+            logger.warning(f"Ignoring unreadable feature cache entry {key[:12]}: {e}")
+            return None
+
+        os.utime(meta_path)
+        logger.info(f"Feature cache hit for {key[:12]}")
+        return CachedFeatures(X_train, X_test, y_train, y_test, dict_vectorizer)
+
+    def put(
+        self, key: str, features: CachedFeatures, meta: dict[str, Any] | None = None
+    ) -> Path:
+        """Store an entry and evict least recently used entries beyond `max_bytes`.
+
+        Args:
+            key: Fingerprint of the run, see `pipeline_fingerprint`.
+            features: The vectorized data to store.
+            meta: Extra JSON serializable information stored in `meta.json`.
+
+        Returns:
+            Directory of the entry.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry_dir = self._entry_dir(key)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=self.cache_dir))
+        try:
+            _save_array(tmp_dir / "X_train", features.X_train)
+            _save_array(tmp_dir / "X_test", features.X_test)
+            np.save(tmp_dir / "y_train.npy", np.asarray(features.y_train))
+            np.save(tmp_dir / "y_test.npy", np.asarray(features.y_test))
+            joblib.dump(features.dict_vectorizer, tmp_dir / _VECTORIZER_FILE)
+            (tmp_dir / _META_FILE).write_text(
+                json.dumps({"key": key, **(meta or {})}, default=str)
+            )
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        logger.info(f"Stored features in cache entry {key[:12]}")
+        self.evict(keep=key)
+        return entry_dir
+
+    def entries(self) -> list[tuple[str, float, int]]:
+        """(key, last use timestamp, size in bytes) of all entries, oldest first."""
+        if not self.cache_dir.exists():
+            return []
+        entries = []
+        for entry_dir in self.cache_dir.iterdir():
+            meta_path = entry_dir / _META_FILE
+            if entry_dir.name.startswith(".") or not meta_path.exists():
+                continue
+            entries.append(
+                (
+                    entry_dir.name,
+                    meta_path.stat().st_mtime,
+                    _directory_size(entry_dir),
+                )
+            )
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def size_bytes(self) -> int:
+        return sum(size for _, _, size in self.entries())
+
+    def evict(self, keep: str | None = None) -> list[str]:
+        """Remove least recently used entries until the cache fits into `max_bytes`.
+
+        Args:
+            keep: Key that is never evicted, e.g. the entry that was just written.
+
+        Returns:
+            Keys of the removed entries.
+        """
+        entries = self.entries()
+        total = sum(size for _, _, size in entries)
+        evicted = []
+        for key, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+            evicted.append(key)
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} feature cache entries")
+        return evicted
+
+    def clear(self) -> None:
+        if self.cache_dir.exists():
+            shutil.rmtree(self.cache_dir)
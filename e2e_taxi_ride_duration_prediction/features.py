@@ -0,0 +1,258 @@
+from collections import defaultdict
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction import DictVectorizer
+
+from e2e_taxi_ride_duration_prediction.location_pairs import (
+    LOCATION_ID_CARDINALITY,
+    PAIR_FEATURE,
+    PAIR_ID_CARDINALITY,
+    PAIR_ID_FEATURE,
+    pair_id_to_value,
+)
+
+CATEGORICAL_DTYPES = (pl.String, pl.Categorical, pl.Enum)
+
+
+def _is_categorical(dtype: pl.DataType) -> bool:
+    return isinstance(dtype, CATEGORICAL_DTYPES)
+
+
+def _is_pair_id(column: str, dtype: pl.DataType) -> bool:
+    return column == PAIR_ID_FEATURE and dtype.is_integer()
+
+
+def _is_numeric(dtype: pl.DataType) -> bool:
+    return dtype.is_numeric() or dtype == pl.Boolean
+
+
+def fit_dict_vectorizer(
+    df: pl.DataFrame | pl.LazyFrame, separator: str = "="
+) -> DictVectorizer:
+    """Fit a DictVectorizer on a frame without materializing rows as Python dicts.
+
+    The vocabulary is derived from the unique values of the string-like columns
+    and the names of the numeric columns, which gives exactly the `vocabulary_` and
+    `feature_names_` that `DictVectorizer().fit(df.to_dicts())` would produce. An
+    integer `pickup_dropoff_pair_id` column contributes the same features as the
+    equivalent `pickup_dropoff_pair` string column.
+
+    Args:
+        df: Frame with the feature columns. Lazy frames only collect unique values.
+        separator: Separator between column name and value of one-hot features.
+
+    Returns:
+        The fitted DictVectorizer.
+
+    Raises:
+        TypeError: If a column has a dtype DictVectorizer cannot handle.
+        ValueError: If a pair ID is outside of the known location IDs.
+    """
+    lf = df.lazy()
+    schema = lf.collect_schema()
+
+    feature_names: set[str] = set()
+    categorical = []
+    for column, dtype in schema.items():
+        if _is_pair_id(column, dtype):
+            for pair_id in lf.select(pl.col(column).unique()).collect().to_series():
+                if pair_id is None:
+                    feature_names.add(PAIR_FEATURE)
+                elif 0 <= pair_id < PAIR_ID_CARDINALITY:
+                    feature_names.add(
+                        f"{PAIR_FEATURE}{separator}{pair_id_to_value(pair_id)}"
+                    )
+                else:
+                    raise ValueError(f"Invalid {column} {pair_id}.")
+        elif _is_categorical(dtype):
+            categorical.append(column)
+        elif _is_numeric(dtype):
+            feature_names.add(column)
+        else:
+            raise TypeError(f"Unsupported dtype {dtype} for feature {column}.")
+
+    if categorical:
+        uniques = pl.collect_all(
+            [
+                lf.select(pl.col(column).cast(pl.String).unique())
+                for column in categorical
+            ]
+        )
+        for column, values in zip(categorical, uniques):
+            for value in values.to_series():
+                # DictVectorizer treats a missing category as a numeric feature
+                feature_names.add(
+                    column if value is None else f"{column}{separator}{value}"
+                )
+
+    dict_vectorizer = DictVectorizer(separator=separator)
+    dict_vectorizer.feature_names_ = sorted(feature_names)
+    dict_vectorizer.vocabulary_ = {
+        name: index for index, name in enumerate(dict_vectorizer.feature_names_)
+    }
+    return dict_vectorizer
+
+
+class ColumnarDictEncoder:
+    """Encode Polars frames with a fitted DictVectorizer, without Python dicts.
+
+    `DictVectorizer.transform(df.to_dicts())` allocates one dict per row and looks
+    every value up in a Python dict. This encoder precompiles the vectorizer's
+    `vocabulary_` into per-column lookup tables once, maps whole columns to feature
+    indices with vectorized Polars/NumPy operations and assembles the CSR matrix
+    directly. The result is identical to the DictVectorizer output (same indices,
+    values, ordering and explicitly stored zeros).
+
+    String, Categorical and Enum columns are one-hot encoded (`column=value`),
+    numeric and boolean columns are used as values of the `column` feature. Values
+    not in the vocabulary are ignored, just like DictVectorizer does. Enum columns
+    are encoded from their physical codes, only their categories are looked up. An
+    integer `pickup_dropoff_pair_id` column is encoded as `pickup_dropoff_pair` by
+    indexing a dense pair ID to feature index table, without any strings.
+    """
+
+    def __init__(self, dict_vectorizer: DictVectorizer) -> None:
+        self.n_features = len(dict_vectorizer.vocabulary_)
+        self.dtype = dict_vectorizer.dtype
+        self.sparse = dict_vectorizer.sparse
+        self.numeric: dict[str, int] = {}
+        categories: defaultdict[str, dict[str, int]] = defaultdict(dict)
+        for name, index in dict_vectorizer.vocabulary_.items():
+            column, separator, value = name.partition(dict_vectorizer.separator)
+            if separator:
+                categories[column][value] = index
+            else:
+                self.numeric[name] = index
+        self.categories = {
+            column: pl.DataFrame(
+                {"value": list(mapping), "index": list(mapping.values())},
+                schema={"value": pl.String, "index": pl.Int32},
+            )
+            for column, mapping in categories.items()
+        }
+        self._enum_cache: dict[str, tuple[pl.Series, npt.NDArray[np.int32]]] = {}
+
+        # dense table from integer pair ID to feature index
+        self.pair_id_indices = np.full(PAIR_ID_CARDINALITY, -1, dtype=np.int32)
+        pair_mapping = self.categories.get(PAIR_FEATURE)
+        if pair_mapping is not None:
+            for value, index in pair_mapping.iter_rows():
+                pu, _, do = value.partition("_")
+                if (
+                    pu.isdigit()
+                    and do.isdigit()
+                    and max(int(pu), int(do)) < LOCATION_ID_CARDINALITY
+                ):
+                    self.pair_id_indices[
+                        int(pu) * LOCATION_ID_CARDINALITY + int(do)
+                    ] = index
+
+    def _value_indices(self, column: str, strings: pl.Series) -> npt.NDArray[np.int32]:
+        """Feature index of each string value of a column, -1 if not in vocabulary."""
+        mapping = self.categories.get(column)
+        if mapping is None:
+            return np.full(len(strings), -1, dtype=np.int32)
+        return strings.replace_strict(
+            mapping["value"], mapping["index"], default=-1, return_dtype=pl.Int32
+        ).to_numpy()
+
+    def _category_indices(
+        self, column: str, categories: pl.Series
+    ) -> npt.NDArray[np.int32]:
+        """Feature index of each category of an Enum column, cached per column."""
+        cached = self._enum_cache.get(column)
+        if cached is not None and cached[0].equals(categories):
+            return cached[1]
+        indices = self._value_indices(column, categories)
+        self._enum_cache[column] = (categories, indices)
+        return indices
+
+    def _encode_column(
+        self, series: pl.Series
+    ) -> tuple[npt.NDArray[np.int32], npt.NDArray] | None:
+        """Map a column to (feature index, value) arrays, -1 marks a missing entry."""
+        column = series.name
+        dtype = series.dtype
+        if _is_pair_id(column, dtype):
+            null_index = self.numeric.get(PAIR_FEATURE, -1)
+            pair_ids = series.fill_null(-1).to_numpy()
+            in_range = (pair_ids >= 0) & (pair_ids < PAIR_ID_CARDINALITY)
+            indices = np.where(
+                in_range, self.pair_id_indices[np.where(in_range, pair_ids, 0)], -1
+            )
+            if series.null_count():
+                indices = np.where(series.is_null().to_numpy(), null_index, indices)
+            values = np.where(indices == null_index, np.nan, 1.0)
+            return indices, values
+
+        if _is_categorical(dtype):
+            mapping = self.categories.get(column)
+            null_index = self.numeric.get(column, -1)
+            if mapping is None and null_index < 0:
+                return None
+            if isinstance(dtype, pl.Enum):
+                # map the categories once, then index by the physical codes
+                category_indices = self._category_indices(column, dtype.categories)
+                codes = series.to_physical().fill_null(0).to_numpy()
+                indices = (
+                    category_indices[codes]
+                    if len(category_indices)
+                    else np.full(len(series), -1, dtype=np.int32)
+                )
+            else:
+                indices = self._value_indices(column, series.cast(pl.String))
+            if series.null_count():
+                indices = np.where(series.is_null().to_numpy(), null_index, indices)
+            values = np.where(indices == null_index, np.nan, 1.0)
+            return indices, values
+
+        if _is_numeric(dtype):
+            index = self.numeric.get(column)
+            if index is None:
+                return None
+            values = series.cast(pl.Float64).to_numpy()
+            return np.full(len(series), index, dtype=np.int32), values
+
+        raise TypeError(f"Unsupported dtype {dtype} for feature {column}.")
+
+    def transform(self, df: pl.DataFrame) -> csr_matrix | npt.NDArray:
+        """Encode all columns of `df` into a feature matrix.
+
+        Args:
+            df: Frame with the feature columns, one row per sample.
+
+        Returns:
+            CSR matrix of shape (len(df), n_features), or a dense array if the
+            vectorizer was created with `sparse=False`.
+        """
+        encoded = [
+            result
+            for result in (self._encode_column(series) for series in df.iter_columns())
+            if result is not None
+        ]
+        n_rows = df.height
+
+        if encoded:
+            indices = np.column_stack([idx for idx, _ in encoded])
+            values = np.column_stack([val for _, val in encoded]).astype(self.dtype)
+            # sort the features of each row by index, missing entries go last
+            order = np.argsort(
+                np.where(indices < 0, self.n_features, indices), axis=1, kind="stable"
+            )
+            indices = np.take_along_axis(indices, order, axis=1)
+            values = np.take_along_axis(values, order, axis=1)
+            present = indices >= 0
+            indptr = np.zeros(n_rows + 1, dtype=np.int64)
+            np.cumsum(present.sum(axis=1), out=indptr[1:])
+            matrix = csr_matrix(
+                (values[present], indices[present], indptr),
+                shape=(n_rows, self.n_features),
+                dtype=self.dtype,
+            )
+        else:
+            matrix = csr_matrix((n_rows, self.n_features), dtype=self.dtype)
+
+        return matrix if self.sparse else matrix.toarray()
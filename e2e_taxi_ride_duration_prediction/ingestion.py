@@ -1,11 +1,17 @@
+import contextvars
+import os
+import re
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Literal, Tuple
 
 import polars as pl
 import requests
 from loguru import logger
 from prefect import flow, task
+from requests.adapters import HTTPAdapter
 from tqdm.auto import tqdm
 
 
@@ -51,16 +57,82 @@ def get_data_path(root: Path, start: Tuple[int, int], end: Tuple[int, int]) -> P
     )
 
 
+BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data/yellow_tripdata_{:04d}-{:02d}.parquet"
+
+SORT_COLUMN = "tpep_pickup_datetime"
+
+# Status codes worth retrying, everything else is a permanent failure.
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+@task
+def get_partition_paths(
+    root: Path, year_month_tuples: List[Tuple[int, int]]
+) -> List[Path]:
+    """Get the paths of monthly files in the Hive-partitioned store.
+
+    Args:
+        root: Root directory path
+        year_month_tuples: (year, month) tuples of the months
+
+    Returns:
+        One path per month, `data/raw/yellow_tripdata/year=YYYY/month=MM/data.parquet`
+    """
+    return [
+        root
+        / f"data/raw/yellow_tripdata/year={year:04d}/month={month:02d}/data.parquet"
+        for year, month in year_month_tuples
+    ]
+
+
+@task
+def scan_partitions(partition_paths: List[Path]) -> pl.LazyFrame:
+    """Lazily scan monthly files of the partitioned store as one frame.
+
+    The TLC schema changes slightly over the years (column names and dtypes), so
+    each file is scanned separately and the scans are combined with a relaxed
+    diagonal concat. The Hive `year` and `month` columns are part of each scan, so
+    filters on them skip files entirely.
+
+    Args:
+        partition_paths: Paths of monthly files in the partitioned store
+
+    Returns:
+        LazyFrame over all given months
+    """
+    return pl.concat(
+        [pl.scan_parquet(path, hive_partitioning=True) for path in partition_paths],
+        how="diagonal_relaxed",
+    )
+
+
 @task
 def download_parquet_file(
-    url: str, filepath: Path, session: requests.Session | None = None
+    url: str,
+    filepath: Path,
+    session: requests.Session | None = None,
+    max_retries: int = 3,
+    backoff_factor: float = 1.0,
+    chunk_size: int = 1024 * 1024,
+    timeout: float = 30.0,
 ) -> bool:
     """Download a parquet file from URL to filepath.
 
+    The response is streamed to `<filepath>.part` in chunks and renamed once
+    complete, so a crash never leaves a truncated file at `filepath`. Failed
+    attempts are retried with exponential backoff and resume the partial file
+    with a `Range` request if the server supports it. A partial file the server
+    can not resume, i.e. a 416 or a `Content-Range` that starts elsewhere, is
+    discarded and the download restarts immediately without counting an attempt.
+
     Args:
         url: URL to download from
         filepath: Local path to save file
         session: Optional requests session for connection pooling
+        max_retries: Number of retries after the first failed attempt
+        backoff_factor: Seconds to wait before the first retry, doubled per retry
+        chunk_size: Bytes read from the response per chunk
+        timeout: Connect and read timeout per request in seconds
 
     Returns:
         True if download successful, False otherwise
@@ -69,51 +141,305 @@ def download_parquet_file(
         return True
 
     http_client = session or requests
-    try:
-        r = http_client.get(url, stream=True)
-        if r.ok:
-            with open(filepath, "wb") as out:
-                out.write(r.content)
-            return True
-        else:
-            logger.warning(f"Failed to download {url}. Status code: {r.status_code}")
+    part_path = filepath.with_name(f"{filepath.name}.part")
+
+    attempt = 0
+    while True:
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            r = http_client.get(url, stream=True, headers=headers, timeout=timeout)
+            try:
+                if offset and _is_stale_resume(r, offset):
+                    # The partial file does not match the file on the server, start
+                    # over right away, this is not a failed attempt
+                    logger.warning(f"Restarting the download of {url} from scratch.")
+                    part_path.unlink()
+                    continue
+                if r.ok:
+                    # A 200 means the server ignored the Range header, start over
+                    mode = "ab" if offset and r.status_code == 206 else "wb"
+                    with open(part_path, mode) as out:
+                        for chunk in r.iter_content(chunk_size=chunk_size):
+                            out.write(chunk)
+                    os.replace(part_path, filepath)
+                    return True
+
+                logger.warning(
+                    f"Failed to download {url}. Status code: {r.status_code}"
+                )
+                if r.status_code not in RETRYABLE_STATUS_CODES:
+                    return False
+            finally:
+                r.close()
+        except requests.RequestException as e:
+            logger.error(f"Network error downloading {url}: {str(e)}")
+
+        if attempt == max_retries:
             return False
-    except requests.RequestException as e:
-        logger.error(f"Network error downloading {url}: {str(e)}")
+        attempt += 1
+        delay = backoff_factor * 2 ** (attempt - 1)
+        logger.info(f"Retrying {url} in {delay:.1f}s ({attempt}/{max_retries}).")
+        time.sleep(delay)
+
+
+def _is_stale_resume(response: requests.Response, offset: int) -> bool:
+    """Check whether a response to `Range: bytes=<offset>-` can not be appended.
+
+    That is a 416 (the partial file is longer than the file on the server) or a
+    206 whose `Content-Range` does not start at `offset`.
+    """
+    if response.status_code == 416:
+        return True
+    if response.status_code != 206:
         return False
+    match = re.match(r"bytes (\d+)-", response.headers.get("Content-Range", ""))
+    return match is None or int(match[1]) != offset
 
 
 @task
-def concatenate_parquet_files(file_paths: List[Path], output_path: Path) -> None:
+def download_parquet_files(
+    downloads: List[Tuple[str, Path]],
+    session: requests.Session | None = None,
+    max_workers: int = 4,
+) -> List[Path]:
+    """Download several parquet files concurrently.
+
+    Args:
+        downloads: (url, filepath) pairs to download
+        session: Optional requests session shared by all downloads
+        max_workers: Maximum number of concurrent downloads
+
+    Returns:
+        Paths of the files that were downloaded successfully
+    """
+    if session is not None:
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+    downloaded = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # run each download in a copy of the current context, so that Prefect
+        # associates the task runs with the calling flow run
+        futures = {
+            executor.submit(
+                contextvars.copy_context().run,
+                download_parquet_file,
+                url,
+                filepath,
+                session,
+            ): filepath
+            for url, filepath in downloads
+        }
+        for future in tqdm(
+            as_completed(futures), desc="Downloading NYC Taxi Data", total=len(futures)
+        ):
+            if future.result():
+                downloaded.append(futures[future])
+    return downloaded
+
+
+@task
+def sort_parquet_files(
+    file_paths: List[Path],
+    output_paths: List[Path],
+    max_workers: int = 4,
+    row_group_size: int | None = None,
+) -> None:
+    """Sort parquet files by pickup time, each file independently and in parallel.
+
+    The sorted files are written with row group statistics, so that filters on the
+    pickup time skip row groups. An output path may be equal to its input path, the
+    file is then replaced atomically.
+
+    Args:
+        file_paths: Parquet files to sort
+        output_paths: Output path for each input file
+        max_workers: Maximum number of files sorted at once, bounds peak memory
+        row_group_size: Rows per row group, Polars' default if None
+    """
+
+    def sort_file(file_path: Path, output_path: Path) -> None:
+        tmp_path = output_path.with_name(f".{output_path.name}.sorting")
+        pl.scan_parquet(file_path).sort(SORT_COLUMN).sink_parquet(
+            tmp_path,
+            statistics=True,
+            row_group_size=row_group_size,
+            engine="streaming",
+        )
+        os.replace(tmp_path, output_path)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(sort_file, file_paths, output_paths))
+
+
+@task
+def concatenate_parquet_files(
+    file_paths: List[Path],
+    output_path: Path,
+    sort_mode: Literal["global", "monthly"] = "global",
+    row_group_size: int | None = None,
+    max_workers: int = 4,
+) -> None:
     """Concatenate multiple parquet files into a single file.
 
+    With `sort_mode="global"` all rows are sorted by pickup time in one out-of-core
+    sort. With `sort_mode="monthly"` the files are ordered by name (i.e. by month
+    for the TLC file names), each file is sorted on its own in parallel and the
+    sorted files are appended in order. This avoids the global sort, the output is
+    sorted except for the few trips a TLC file contains from other months.
+
     Args:
         file_paths: List of parquet file paths to concatenate
         output_path: Path for the output concatenated file
+        sort_mode: How the output is sorted, see above
+        row_group_size: Rows per row group of the output, Polars' default if None
+        max_workers: Maximum number of files sorted at once in monthly mode
 
     Raises:
         FileNotFoundError: If no valid parquet files found
+        ValueError: If the sort mode is unknown
     """
     if not file_paths:
         raise FileNotFoundError("No parquet files provided for concatenation.")
+    if sort_mode not in ("global", "monthly"):
+        raise ValueError(f"Unknown sort mode {sort_mode}.")
 
-    lfs = [
-        pl.scan_parquet(x)
-        for x in tqdm(
-            file_paths,
-            desc="Reading temp Parquet files.",
-            total=len(file_paths),
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if sort_mode == "monthly":
+            logger.info("Sorting each file separately.")
+            file_paths = sorted(file_paths, key=lambda path: path.name)
+            sorted_paths = [
+                Path(temp_dir) / f"{i:05d}.parquet" for i in range(len(file_paths))
+            ]
+            sort_parquet_files(file_paths, sorted_paths, max_workers, row_group_size)
+            file_paths = sorted_paths
+
+        lfs = [
+            pl.scan_parquet(x)
+            for x in tqdm(
+                file_paths,
+                desc="Reading temp Parquet files.",
+                total=len(file_paths),
+            )
+        ]
+
+        logger.info("Concatenating and sorting the data.")
+        lf = pl.concat(lfs, how="diagonal_relaxed", rechunk=True)
+        if sort_mode == "global":
+            lf = lf.sort(SORT_COLUMN)
+
+        logger.info(f"Saving concatenated parquet file to {output_path}")
+        lf.sink_parquet(
+            output_path.resolve(),
+            statistics=True,
+            row_group_size=row_group_size,
+            engine="streaming",
         )
-    ]
 
-    logger.info("Concatenating and sorting the data.")
-    lf = pl.concat(lfs, how="diagonal_relaxed", rechunk=True).sort(
-        "tpep_pickup_datetime"
-    )
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    logger.info(f"Saving concatenated parquet file to {output_path}")
-    lf.sink_parquet(output_path.resolve(), engine="streaming")
+def _get_partitioned_data(
+    root: Path,
+    start: Tuple[int, int],
+    end: Tuple[int, int],
+    max_concurrent_downloads: int,
+) -> pl.LazyFrame:
+    year_month_tuples = generate_year_month_tuples(start, end)
+    partition_paths = get_partition_paths(root, year_month_tuples)
+
+    # A month is only present once its sorted file exists. Downloads go to a
+    # hidden staging name first, so an interrupted download or sort never leaves
+    # an unsorted file at the partition path.
+    final_paths = {}
+    missing = []
+    for (year, month), path in zip(year_month_tuples, partition_paths):
+        if not path.exists():
+            staging_path = path.with_name(f".{path.name}.download")
+            final_paths[staging_path] = path
+            missing.append((BASE_URL.format(year, month), staging_path))
+    if missing:
+        logger.info(
+            f"Downloading {len(missing)} missing months of NYC Taxi data from {start[0]}-{start[1]} to {end[0]}-{end[1]}."
+        )
+        for _, staging_path in missing:
+            staging_path.parent.mkdir(parents=True, exist_ok=True)
+        with requests.Session() as session:
+            downloaded = download_parquet_files(
+                missing, session, max_workers=max_concurrent_downloads
+            )
+        if downloaded:
+            logger.info(f"Sorting {len(downloaded)} new months by pickup time.")
+            sort_parquet_files(downloaded, [final_paths[path] for path in downloaded])
+            for staging_path in downloaded:
+                staging_path.unlink()
+    else:
+        logger.info(
+            f"Found all months of NYC Taxi data from {start[0]}-{start[1]} to {end[0]}-{end[1]} in the partitioned store. Loading them."
+        )
+
+    available = [path for path in partition_paths if path.exists()]
+    if not available:
+        raise FileNotFoundError(
+            "No parquet files were downloaded for the requested months."
+        )
+    return scan_partitions(available)
+
+
+def _get_combined_data(
+    root: Path,
+    start: Tuple[int, int],
+    end: Tuple[int, int],
+    max_concurrent_downloads: int,
+    sort_mode: Literal["global", "monthly"],
+) -> pl.LazyFrame:
+    output_file = get_data_path(root, start, end)
+
+    if output_file.exists():
+        logger.info(
+            f"Found existing parquet file for NYC Taxi data from {start[0]}-{start[1]} to {end[0]}-{end[1]}. Loading it."
+        )
+    else:
+        logger.info(
+            f"Downloading NYC Taxi data from {start[0]}-{start[1]} to {end[0]}-{end[1]}."
+        )
+
+        # Generate date range and download files
+        year_month_tuples = generate_year_month_tuples(start, end)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_folder_path = Path(temp_dir)
+
+            downloads = [
+                (
+                    BASE_URL.format(year, month),
+                    temp_folder_path
+                    / f"yellow_tripdata_{year:04d}-{month:02d}.parquet",
+                )
+                for year, month in year_month_tuples
+            ]
+            with requests.Session() as session:
+                download_parquet_files(
+                    downloads, session, max_workers=max_concurrent_downloads
+                )
+
+            logger.info("Concatenating all downloaded parquet files.")
+            parquet_files = [
+                f
+                for f in temp_folder_path.iterdir()
+                if f.is_file() and f.suffix == ".parquet"
+            ]
+
+            if not parquet_files:
+                raise FileNotFoundError(
+                    "No parquet files were downloaded to the temporary directory."
+                )
+
+            concatenate_parquet_files(parquet_files, output_file, sort_mode)
+
+    return pl.scan_parquet(output_file)
 
 
 @flow
@@ -121,54 +447,40 @@ def get_nyc_taxi_data(
     root: Path | None = None,
     start: Tuple[int, int] = (2022, 1),
     end: Tuple[int, int] = (2025, 5),
+    max_concurrent_downloads: int = 4,
+    partitioned: bool = True,
+    sort_mode: Literal["global", "monthly"] = "global",
 ) -> pl.LazyFrame:
+    """Load NYC yellow taxi trip data for a range of months, downloading as needed.
+
+    By default the months are kept in a Hive-partitioned store under
+    `data/raw/yellow_tripdata/year=YYYY/month=MM/`. Only months missing from the
+    store are downloaded and each new month is sorted by pickup time on its own, so
+    overlapping date ranges reuse earlier downloads. With `partitioned=False` the
+    whole range is downloaded into a single parquet file per (start, end) range
+    instead, sorted as given by `sort_mode` (see `concatenate_parquet_files`).
+
+    Args:
+        root: Project root directory, defaults to the repository root
+        start: (year, month) tuple for start date
+        end: (year, month) tuple for end date
+        max_concurrent_downloads: Maximum number of months downloaded at once
+        partitioned: Whether to use the month-partitioned store
+        sort_mode: How the single file is sorted if `partitioned=False`
+
+    Returns:
+        LazyFrame over the requested months. In the partitioned store it includes
+        the `year` and `month` partition columns, filters on them skip whole files.
+
+    Raises:
+        FileNotFoundError: If none of the requested months could be downloaded
+    """
     if not root:
         root = Path(__file__).parents[1]
     try:
-        output_file = get_data_path(root, start, end)
-
-        if output_file.exists():
-            logger.info(
-                f"Found existing parquet file for NYC Taxi data from {start[0]}-{start[1]} to {end[0]}-{end[1]}. Loading it."
-            )
-        else:
-            logger.info(
-                f"Downloading NYC Taxi data from {start[0]}-{start[1]} to {end[0]}-{end[1]}."
-            )
-
-            # Generate date range and download files
-            year_month_tuples = generate_year_month_tuples(start, end)
-
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_folder_path = Path(temp_dir)
-                base_url = "https://d37ci6vzurychx.cloudfront.net/trip-data/yellow_tripdata_{:04d}-{:02d}.parquet"
-
-                with requests.Session() as session:
-                    for year, month in tqdm(
-                        year_month_tuples, desc="Downloading NYC Taxi Data"
-                    ):
-                        file_path = (
-                            temp_folder_path
-                            / f"yellow_tripdata_{year:04d}-{month:02d}.parquet"
-                        )
-                        url = base_url.format(year, month)
-                        download_parquet_file(url, file_path, session)
-
-                logger.info("Concatenating all downloaded parquet files.")
-                parquet_files = [
-                    f
-                    for f in temp_folder_path.iterdir()
-                    if f.is_file() and f.suffix == ".parquet"
-                ]
-
-                if not parquet_files:
-                    raise FileNotFoundError(
-                        "No parquet files were downloaded to the temporary directory."
-                    )
-
-                concatenate_parquet_files(parquet_files, output_file)
-
-        return pl.scan_parquet(output_file)
+        if partitioned:
+            return _get_partitioned_data(root, start, end, max_concurrent_downloads)
+        return _get_combined_data(root, start, end, max_concurrent_downloads, sort_mode)
 
     except requests.RequestException as e:
         logger.error(f"Network error occurred: {str(e)}")
@@ -0,0 +1,34 @@
+import numpy as np
+import numpy.typing as npt
+
+# TLC taxi zone IDs go from 1 to 265, index 0 stays unused.
+LOCATION_ID_CARDINALITY = 266
+
+PAIR_FEATURE = "pickup_dropoff_pair"
+
+# Integer form of pickup_dropoff_pair: PULocationID * 266 + DOLocationID. It is
+# encoded as the one-hot `pickup_dropoff_pair` feature, so vectorizers fitted on
+# either form have the same vocabulary.
+PAIR_ID_FEATURE = "pickup_dropoff_pair_id"
+PAIR_ID_CARDINALITY = LOCATION_ID_CARDINALITY**2
+
+
+def pickup_dropoff_pair_ids(
+    pickup_location_ids: npt.ArrayLike, dropoff_location_ids: npt.ArrayLike
+) -> npt.NDArray[np.int64]:
+    """Integer pair IDs of location ID arrays, -1 where an ID is out of range."""
+    pu = np.asarray(pickup_location_ids, dtype=np.int64)
+    do = np.asarray(dropoff_location_ids, dtype=np.int64)
+    in_range = (
+        (pu >= 0)
+        & (pu < LOCATION_ID_CARDINALITY)
+        & (do >= 0)
+        & (do < LOCATION_ID_CARDINALITY)
+    )
+    return np.where(in_range, pu * LOCATION_ID_CARDINALITY + do, -1)
+
+
+def pair_id_to_value(pair_id: int) -> str:
+    """The `pickup_dropoff_pair` string ("PU_DO") of an integer pair ID."""
+    pu, do = divmod(pair_id, LOCATION_ID_CARDINALITY)
+    return f"{pu}_{do}"
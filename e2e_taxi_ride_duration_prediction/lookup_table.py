@@ -0,0 +1,215 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+from numpy.typing import ArrayLike
+
+from e2e_taxi_ride_duration_prediction.location_pairs import (
+    LOCATION_ID_CARDINALITY,
+    PAIR_FEATURE,
+)
+
+if TYPE_CHECKING:
+    from sklearn.feature_extraction import DictVectorizer
+
+    from e2e_taxi_ride_duration_prediction.models import SklearnCompatibleRegressor
+
+DISTANCE_FEATURE = "trip_distance"
+
+
+@dataclass(frozen=True)
+class LookupTableModel:
+    """Linear pair + distance model evaluated with plain NumPy indexing.
+
+    A `LinearRegression` over one-hot `pickup_dropoff_pair` and `trip_distance`
+    predicts `intercept + coef[pair] + coef[trip_distance] * trip_distance`. The
+    first two terms only depend on the pair, so they are precomputed into a dense
+    `pair_weights[PULocationID, DOLocationID]` table.
+
+    Attributes:
+        pair_weights: (266, 266) array of intercept + pair coefficient, pairs unseen
+            during training hold the intercept.
+        distance_coef: Coefficient of trip_distance.
+        intercept: Intercept, used for location IDs outside of the table.
+        source_version: sha256 of the joblib artifact the table was compiled from.
+    """
+
+    pair_weights: npt.NDArray[np.float64]
+    distance_coef: float
+    intercept: float
+    source_version: str = ""
+
+    def predict(
+        self,
+        pickup_location_ids: ArrayLike,
+        dropoff_location_ids: ArrayLike,
+        trip_distances: ArrayLike,
+    ) -> npt.NDArray[np.float64]:
+        """Predict durations for rides given as location ID and distance arrays."""
+        pu = np.asarray(pickup_location_ids, dtype=np.int64)
+        do = np.asarray(dropoff_location_ids, dtype=np.int64)
+        distances = np.asarray(trip_distances, dtype=np.float64)
+
+        size = self.pair_weights.shape[0]
+        in_table = (pu >= 0) & (pu < size) & (do >= 0) & (do < size)
+        weights = np.where(
+            in_table,
+            self.pair_weights[np.where(in_table, pu, 0), np.where(in_table, do, 0)],
+            self.intercept,
+        )
+        return weights + self.distance_coef * distances
+
+
+@dataclass(frozen=True)
+class PairDistanceCoefficients:
+    """Coefficients of a linear pair + distance model, keyed by pair ID.
+
+    Attributes:
+        coef: Coefficients of the linear model, indexed like the vectorizer.
+        intercept: Intercept of the linear model.
+        pair_ids: `PULocationID * 266 + DOLocationID` of each pair feature.
+        pair_indices: Coefficient index of each pair feature, aligned with
+            `pair_ids`.
+        distance_index: Coefficient index of trip_distance, -1 if not a feature.
+    """
+
+    coef: npt.NDArray[np.float64]
+    intercept: float
+    pair_ids: npt.NDArray[np.int64]
+    pair_indices: npt.NDArray[np.int64]
+    distance_index: int
+
+
+def pair_distance_coefficients(
+    model: "SklearnCompatibleRegressor",
+    dict_vectorizer: "DictVectorizer",
+) -> PairDistanceCoefficients:
+    """Extract the coefficients of a linear model over pair and distance features.
+
+    Args:
+        model: Fitted linear regressor with 1-d `coef_` and a scalar or size-1
+            `intercept_`.
+        dict_vectorizer: The vectorizer the model was trained with.
+
+    Returns:
+        The coefficients with the pair features parsed into pair IDs.
+
+    Raises:
+        ValueError: If the model is not linear or uses other features than
+            `pickup_dropoff_pair` and `trip_distance`.
+    """
+    coef = getattr(model, "coef_", None)
+    intercept = getattr(model, "intercept_", None)
+    # SGDRegressor keeps its intercept in a (1,) array
+    if (
+        coef is None
+        or intercept is None
+        or np.ndim(coef) != 1
+        or np.size(intercept) != 1
+    ):
+        raise ValueError(f"{type(model).__name__} is not a single-output linear model.")
+
+    pair_ids = []
+    pair_indices = []
+    distance_index = -1
+    pair_prefix = f"{PAIR_FEATURE}{dict_vectorizer.separator}"
+
+    for name, index in dict_vectorizer.vocabulary_.items():
+        if name == DISTANCE_FEATURE:
+            distance_index = int(index)
+            continue
+        if not name.startswith(pair_prefix):
+            raise ValueError(f"Feature {name} can not be compiled into a lookup table.")
+        try:
+            pu, do = (int(x) for x in name.removeprefix(pair_prefix).split("_"))
+        except ValueError:
+            raise ValueError(f"Feature {name} is not a location ID pair.") from None
+        if not (
+            0 <= pu < LOCATION_ID_CARDINALITY and 0 <= do < LOCATION_ID_CARDINALITY
+        ):
+            raise ValueError(f"Feature {name} is outside of the known location IDs.")
+        pair_ids.append(pu * LOCATION_ID_CARDINALITY + do)
+        pair_indices.append(index)
+
+    return PairDistanceCoefficients(
+        coef=np.asarray(coef, dtype=np.float64),
+        intercept=float(np.ravel(intercept)[0]),
+        pair_ids=np.asarray(pair_ids, dtype=np.int64),
+        pair_indices=np.asarray(pair_indices, dtype=np.int64),
+        distance_index=distance_index,
+    )
+
+
+def compile_lookup_table(
+    model: "SklearnCompatibleRegressor",
+    dict_vectorizer: "DictVectorizer",
+    source_version: str = "",
+) -> LookupTableModel:
+    """Compile a linear model over pair and distance features into a lookup table.
+
+    Args:
+        model: Fitted linear regressor with 1-d `coef_` and a scalar or size-1
+            `intercept_`.
+        dict_vectorizer: The vectorizer the model was trained with.
+        source_version: Version of the artifact the model was loaded from.
+
+    Returns:
+        The compiled LookupTableModel.
+
+    Raises:
+        ValueError: If the model is not linear or uses other features than
+            `pickup_dropoff_pair` and `trip_distance`.
+    """
+    coefficients = pair_distance_coefficients(model, dict_vectorizer)
+    intercept = coefficients.intercept
+    pair_weights = np.full(
+        (LOCATION_ID_CARDINALITY, LOCATION_ID_CARDINALITY), intercept, dtype=np.float64
+    )
+    pair_weights.flat[coefficients.pair_ids] = (
+        intercept + coefficients.coef[coefficients.pair_indices]
+    )
+    distance_coef = (
+        float(coefficients.coef[coefficients.distance_index])
+        if coefficients.distance_index >= 0
+        else 0.0
+    )
+
+    return LookupTableModel(
+        pair_weights=pair_weights,
+        distance_coef=distance_coef,
+        intercept=intercept,
+        source_version=source_version,
+    )
+
+
+def lookup_table_path(model_path: str | Path) -> Path:
+    """Path of the lookup table exported next to a joblib model artifact."""
+    return Path(model_path).with_suffix(".lookup.npz")
+
+
+def save_lookup_table(table: LookupTableModel, path: str | Path) -> None:
+    """Write the table as .npz, atomically replacing an existing file."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            pair_weights=table.pair_weights,
+            distance_coef=table.distance_coef,
+            intercept=table.intercept,
+            source_version=table.source_version,
+        )
+    os.replace(tmp_path, path)
+
+
+def load_lookup_table(path: str | Path) -> LookupTableModel:
+    with np.load(path) as data:
+        return LookupTableModel(
+            pair_weights=data["pair_weights"],
+            distance_coef=float(data["distance_coef"]),
+            intercept=float(data["intercept"]),
+            source_version=str(data["source_version"]),
+        )
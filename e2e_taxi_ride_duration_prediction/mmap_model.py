@@ -0,0 +1,167 @@
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+from numpy.typing import ArrayLike
+
+from e2e_taxi_ride_duration_prediction.location_pairs import (
+    PAIR_ID_CARDINALITY,
+    pickup_dropoff_pair_ids,
+)
+from e2e_taxi_ride_duration_prediction.lookup_table import pair_distance_coefficients
+
+if TYPE_CHECKING:
+    from sklearn.feature_extraction import DictVectorizer
+
+    from e2e_taxi_ride_duration_prediction.models import SklearnCompatibleRegressor
+
+_COEF_FILE = "coef.npy"
+_PAIR_INDEX_FILE = "pair_index.npy"
+_META_FILE = "meta.json"
+
+
+@dataclass(frozen=True)
+class MmapLinearModel:
+    """Linear pair + distance model backed by flat, memory-mappable arrays.
+
+    The pickled DictVectorizer of a model holds its ~70k pair features as Python
+    strings, so every serving worker that unpickles it pays for its own copy. Here
+    the vocabulary is a dense `pair_index[pickup_dropoff_pair_id]` array of
+    coefficient indices instead, and both arrays are loaded with `mmap_mode="r"`,
+    so all workers on a host share the same pages of the OS page cache.
+
+    Attributes:
+        coef: Coefficients of the linear model, indexed like the vectorizer.
+        pair_index: (266 * 266,) coefficient index per pair ID, -1 for pairs
+            unseen during training.
+        distance_index: Coefficient index of trip_distance, -1 if not a feature.
+        intercept: Intercept of the linear model.
+        source_version: sha256 of the joblib artifact the model was compiled from.
+    """
+
+    coef: npt.NDArray[np.float64]
+    pair_index: npt.NDArray[np.int32]
+    distance_index: int
+    intercept: float
+    source_version: str = ""
+
+    def predict(
+        self,
+        pickup_location_ids: ArrayLike,
+        dropoff_location_ids: ArrayLike,
+        trip_distances: ArrayLike,
+    ) -> npt.NDArray[np.float64]:
+        """Predict durations for rides given as location ID and distance arrays."""
+        pair_ids = pickup_dropoff_pair_ids(pickup_location_ids, dropoff_location_ids)
+        indices = np.where(pair_ids >= 0, self.pair_index[np.maximum(pair_ids, 0)], -1)
+        predictions = (
+            np.where(indices >= 0, self.coef[np.maximum(indices, 0)], 0.0)
+            + self.intercept
+        )
+        if self.distance_index >= 0:
+            distances = np.asarray(trip_distances, dtype=np.float64)
+            predictions += self.coef[self.distance_index] * distances
+        return predictions
+
+
+def compile_mmap_model(
+    model: "SklearnCompatibleRegressor",
+    dict_vectorizer: "DictVectorizer",
+    source_version: str = "",
+) -> MmapLinearModel:
+    """Flatten a linear model over pair and distance features into arrays.
+
+    Args:
+        model: Fitted linear regressor with 1-d `coef_` and a scalar or size-1
+            `intercept_`.
+        dict_vectorizer: The vectorizer the model was trained with.
+        source_version: Version of the artifact the model was loaded from.
+
+    Returns:
+        The compiled MmapLinearModel, backed by in-memory arrays.
+
+    Raises:
+        ValueError: If the model is not linear or uses other features than
+            `pickup_dropoff_pair` and `trip_distance`.
+    """
+    coefficients = pair_distance_coefficients(model, dict_vectorizer)
+    pair_index = np.full(PAIR_ID_CARDINALITY, -1, dtype=np.int32)
+    pair_index[coefficients.pair_ids] = coefficients.pair_indices
+
+    return MmapLinearModel(
+        coef=coefficients.coef,
+        pair_index=pair_index,
+        distance_index=coefficients.distance_index,
+        intercept=coefficients.intercept,
+        source_version=source_version,
+    )
+
+
+def mmap_model_path(model_path: str | Path) -> Path:
+    """Directory of the memory-mappable model exported next to a joblib artifact."""
+    return Path(model_path).with_suffix(".mmap")
+
+
+def save_mmap_model(mmap_model: MmapLinearModel, path: str | Path) -> None:
+    """Write the model as .npy arrays plus meta.json, replacing an existing export.
+
+    The new directory is completely written before it is moved into place. Workers
+    that still map the arrays of a replaced export keep reading them, the files
+    are only unlinked, not truncated.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+    try:
+        np.save(tmp_dir / _COEF_FILE, mmap_model.coef)
+        np.save(tmp_dir / _PAIR_INDEX_FILE, mmap_model.pair_index)
+        (tmp_dir / _META_FILE).write_text(
+            json.dumps(
+                {
+                    "distance_index": mmap_model.distance_index,
+                    "intercept": mmap_model.intercept,
+                    "source_version": mmap_model.source_version,
+                }
+            )
+        )
+        old_dir = None
+        if path.exists():
+            old_dir = Path(
+                tempfile.mkdtemp(prefix=f".{path.name}-old-", dir=path.parent)
+            )
+            os.replace(path, old_dir / path.name)
+        os.replace(tmp_dir, path)
+        if old_dir is not None:
+            shutil.rmtree(old_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def mmap_model_meta_path(path: str | Path) -> Path:
+    """meta.json of an export, written anew whenever the export is replaced."""
+    return Path(path) / _META_FILE
+
+
+def read_mmap_model_version(path: str | Path) -> str:
+    """The `source_version` of an export, without mapping its arrays."""
+    meta = json.loads(mmap_model_meta_path(path).read_text())
+    return meta["source_version"]
+
+
+def load_mmap_model(path: str | Path) -> MmapLinearModel:
+    """Load an export with its arrays memory-mapped read-only."""
+    path = Path(path)
+    meta = json.loads((path / _META_FILE).read_text())
+    return MmapLinearModel(
+        coef=np.load(path / _COEF_FILE, mmap_mode="r"),
+        pair_index=np.load(path / _PAIR_INDEX_FILE, mmap_mode="r"),
+        distance_index=int(meta["distance_index"]),
+        intercept=float(meta["intercept"]),
+        source_version=meta["source_version"],
+    )
@@ -8,3 +8,7 @@ from scipy.sparse import spmatrix
 class SklearnCompatibleRegressor(Protocol):
     def fit(self, X: Union[spmatrix, np.ndarray], y: ArrayLike) -> Self: ...
     def predict(self, X: Union[spmatrix, np.ndarray]) -> ArrayLike: ...
+
+
+class IncrementalRegressor(SklearnCompatibleRegressor, Protocol):
+    def partial_fit(self, X: Union[spmatrix, np.ndarray], y: ArrayLike) -> Self: ...
@@ -1,13 +1,46 @@
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
 
-import joblib
 import polars as pl
 from evidently import DataDefinition, Dataset, Regression, Report
 from evidently.core.report import Snapshot
 from evidently.presets import DataDriftPreset, RegressionPreset
+from loguru import logger
 from prefect import task
 
-from e2e_taxi_ride_duration_prediction.preprocessing import calculate_duration
+from e2e_taxi_ride_duration_prediction.feature_cache import pipeline_fingerprint
+from e2e_taxi_ride_duration_prediction.location_pairs import PAIR_ID_FEATURE
+from e2e_taxi_ride_duration_prediction.monitoring_stats import (
+    DRIFT_THRESHOLD,
+    ColumnDrift,
+    DataProfile,
+    compare_profiles,
+    load_profile,
+    read_profile_meta,
+    reference_profile_dir,
+    save_profile,
+)
+from e2e_taxi_ride_duration_prediction.preprocessing import (
+    calculate_duration,
+    create_pickup_dropoff_pair_ids,
+)
+from e2e_taxi_ride_duration_prediction.scoring import (
+    RIDE_COLUMNS,
+    iter_record_batches,
+    resolve_input_paths,
+    score_frame,
+)
+from e2e_taxi_ride_duration_prediction.serving.model_holder import (
+    LoadedModel,
+    ModelHolder,
+)
+from e2e_taxi_ride_duration_prediction.streaming import (
+    batch_rows_for_memory,
+    estimate_row_bytes,
+)
 
 pl.Config.set_engine_affinity("streaming")
 
@@ -15,19 +48,48 @@ pl.Config.set_engine_affinity("streaming")
 @task
 def add_predictions_to_data(
     data: pl.LazyFrame,
-    model_path: str | Path,
-    feature_columns: list[str] = ["PULocationID", "DOLocationID", "trip_distance"],
+    model: str | Path | LoadedModel,
+    feature_columns: list[str] = ["pickup_dropoff_pair", "trip_distance"],
 ) -> pl.LazyFrame:
-    """Add prediction column to data using trained model."""
-    with open(model_path, "rb") as f:
-        model, dict_vectorizer = joblib.load(f)
+    """Add prediction column to data using trained model.
+
+    The data is collected once, the features are taken from the collected frame
+    and the predictions added to it, so the returned frame is already in memory
+    and collecting it again is free.
+
+    If `pickup_dropoff_pair` is requested but not part of the data, the integer
+    `pickup_dropoff_pair_id` is derived from the location IDs and encoded instead,
+    which gives the same features without building pair strings.
 
-    data = calculate_duration(data)
-    X_dicts = data.select(feature_columns).collect().to_dicts()
-    X_features = dict_vectorizer.transform(X_dicts)
-    predictions = model.predict(X_features)
+    Args:
+        data: Rides with pickup and dropoff times, `duration` is added.
+        model: Model loaded by `ModelHolder(model_path, use_mmap=False)`, or the
+            path of a joblib artifact to load it from. Pass the loaded model when
+            scoring several data sets to unpickle it only once.
+        feature_columns: Feature columns of the DictVectorizer.
+    """
+    if not isinstance(model, LoadedModel):
+        model = ModelHolder(model, use_mmap=False).get()
+    if model.model is None or model.feature_encoder is None:
+        raise ValueError("Monitoring needs the sklearn model, not an mmap export.")
 
-    return data.with_columns(pl.Series("prediction", predictions))
+    data = calculate_duration.fn(data)
+    pair_ids_added = (
+        "pickup_dropoff_pair" in feature_columns
+        and "pickup_dropoff_pair" not in data.collect_schema().names()
+    )
+    if pair_ids_added:
+        data = create_pickup_dropoff_pair_ids(data)
+        feature_columns = [
+            PAIR_ID_FEATURE if column == "pickup_dropoff_pair" else column
+            for column in feature_columns
+        ]
+    frame = data.collect()
+    X_features = model.feature_encoder.transform(frame.select(feature_columns))
+    frame = frame.with_columns(pl.Series("prediction", model.model.predict(X_features)))
+    if pair_ids_added:
+        frame = frame.drop(PAIR_ID_FEATURE)
+    return frame.lazy()
 
 
 @task
@@ -36,7 +98,7 @@ def generate_monitoring_report(
     current_data_path: str | Path,
     report_path: str,
     model_path: str | Path | None = None,
-    feature_columns: list[str] = ["PULocationID", "DOLocationID", "trip_distance"],
+    feature_columns: list[str] = ["pickup_dropoff_pair", "trip_distance"],
     target: str = "duration",
     data_drift: bool = True,
     regression: bool = True,
@@ -45,6 +107,10 @@ def generate_monitoring_report(
     """
     Generate a monitoring report comparing reference and current data.
 
+    The model is loaded once, then the reference and current data are read and
+    scored concurrently in two threads. Polars and the sparse matrix product
+    release the GIL, so both run on separate cores.
+
     Args:
         reference_data_path (str | Path): Path to the reference data.
         current_data_path (str | Path): Path to the current data.
@@ -68,35 +134,282 @@ def generate_monitoring_report(
     if regression and model_path is None:
         raise ValueError("model_path is required when regression=True")
 
-    reference_data = pl.scan_parquet(reference_data_path)
-    current_data = pl.scan_parquet(current_data_path)
-
+    model = None
     if regression and model_path:
-        reference_data = add_predictions_to_data(
-            reference_data, model_path, feature_columns
+        model = ModelHolder(model_path, use_mmap=False).get()
+
+    def load(data_path: str | Path) -> Dataset:
+        data = pl.scan_parquet(data_path)
+        if model is not None:
+            data = add_predictions_to_data.fn(data, model, feature_columns)
+        return Dataset.from_pandas(
+            data.collect().to_pandas(),
+            data_definition=DataDefinition(
+                regression=[Regression(target=target, prediction="prediction")]
+            ),
         )
-        current_data = add_predictions_to_data(
-            current_data,
-            model_path,
-            feature_columns,
+
+    with ThreadPoolExecutor(2) as pool:
+        reference_data, current_data = pool.map(
+            load, [reference_data_path, current_data_path]
         )
 
-    reference_data = Dataset.from_pandas(
-        reference_data.collect().to_pandas(),
-        data_definition=DataDefinition(
-            regression=[Regression(target=target, prediction="prediction")]
-        ),
+    report = Report(metrics=metrics, include_tests=include_tests)
+    run = report.run(reference_data, current_data)
+
+    run.save_html(report_path)
+
+    return run
+
+
+@dataclass
+class StreamingMonitoringResult:
+    """Outcome of `generate_streaming_monitoring_report`.
+
+    Attributes:
+        reference: Profile of the reference data.
+        current: Profile of the current data.
+        drift: Drift per column, computed on the full data.
+        snapshot: The Evidently report run on the samples of both data sets.
+    """
+
+    reference: DataProfile
+    current: DataProfile
+    drift: dict[str, ColumnDrift]
+    snapshot: Snapshot
+
+    def summary(self) -> dict:
+        """JSON serializable drift and regression metrics."""
+        summary: dict = {
+            "rows": {"reference": self.reference.rows, "current": self.current.rows},
+            "drift": {column: asdict(drift) for column, drift in self.drift.items()},
+        }
+        for name, profile in (("reference", self.reference), ("current", self.current)):
+            stats = profile.regression
+            if stats.n:
+                summary.setdefault("regression", {})[name] = {
+                    "n": stats.n,
+                    "mae": stats.mean_absolute_error,
+                    "rmse": stats.root_mean_squared_error,
+                    "r2": stats.r2_score,
+                }
+        return summary
+
+
+def profile_parquet(
+    data_path: str | Path,
+    holder: ModelHolder | None = None,
+    target: str = "duration",
+    max_batch_bytes: int = 512 * 2**20,
+    sample_rows: int = 0,
+    seed: int = 0,
+) -> DataProfile:
+    """Build a DataProfile of parquet data one record batch at a time.
+
+    Args:
+        data_path: Parquet file or glob of files.
+        holder: Model to add a `prediction` column with, none if None.
+        target: Target column; if it is missing, `duration` is computed from the
+            pickup and dropoff times.
+        max_batch_bytes: Memory budget of a single record batch.
+        sample_rows: Approximate number of rows to keep as a stratified sample.
+        seed: Seed of the sampling.
+    """
+    paths = resolve_input_paths(str(data_path))
+    schema = pl.scan_parquet(paths).collect_schema()
+    columns = [c for c in [*RIDE_COLUMNS, target] if c in schema]
+    if target not in schema:
+        columns += ["tpep_pickup_datetime", "tpep_dropoff_datetime"]
+    total_rows = pl.scan_parquet(paths).select(pl.len()).collect().item()
+    batch_rows = batch_rows_for_memory(
+        pl.Schema({column: schema[column] for column in columns}), max_batch_bytes
+    )
+    sample_fraction = min(1.0, sample_rows / total_rows) if total_rows else 0.0
+
+    profile = DataProfile.empty()
+    for i, record_batch in enumerate(iter_record_batches(paths, batch_rows, columns)):
+        batch = pl.from_arrow(record_batch)
+        assert isinstance(batch, pl.DataFrame)
+        if target not in batch.columns:
+            batch = calculate_duration.fn(batch.lazy()).collect()
+        if holder is not None:
+            batch = score_frame(holder, batch)
+        profile.update(batch, target, "prediction", sample_fraction, seed + i)
+    return profile
+
+
+def cached_reference_profile(
+    data_path: str | Path,
+    model_path: str | Path,
+    holder: ModelHolder,
+    target: str = "duration",
+    max_batch_bytes: int = 512 * 2**20,
+    sample_rows: int = 0,
+    seed: int = 0,
+) -> DataProfile:
+    """Profile of the reference data, computed once per model and reference data.
+
+    Profiles are stored in `reference_profile_dir(model_path)` under the
+    fingerprint of the reference files, the model version and the profile
+    parameters, so a retrained model or a replaced reference file gets a new
+    profile. Profiles of other model versions are removed when a new one is saved.
+
+    Args:
+        data_path: Parquet file or glob of the reference data.
+        model_path: Model artifact the profile is stored next to.
+        holder: Model of `model_path`, adds the `prediction` column.
+        target: See `profile_parquet`.
+        max_batch_bytes: See `profile_parquet`.
+        sample_rows: See `profile_parquet`.
+        seed: See `profile_parquet`.
+    """
+    model_version = holder.get().version
+    key = pipeline_fingerprint(
+        resolve_input_paths(str(data_path)),
+        model_version=model_version,
+        target=target,
+        # the batches decide which rows end up in the sample
+        max_batch_bytes=max_batch_bytes,
+        sample_rows=sample_rows,
+        seed=seed,
+    )
+    cache_dir = reference_profile_dir(model_path)
+    path = cache_dir / key
+    try:
+        profile = load_profile(path)
+        logger.info(f"Using cached reference profile {path}")
+        return profile
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        logger.warning(f"Recomputing reference profile: {e}")
+
+    logger.info(f"Profiling {data_path}")
+    profile = profile_parquet(
+        data_path, holder, target, max_batch_bytes, sample_rows, seed
     )
-    current_data = Dataset.from_pandas(
-        current_data.collect().to_pandas(),
+    for stale in cache_dir.glob("*") if cache_dir.exists() else []:
+        try:
+            stale_version = read_profile_meta(stale).get("model_version")
+        except (OSError, ValueError):
+            continue
+        if stale_version != model_version:
+            shutil.rmtree(stale, ignore_errors=True)
+    save_profile(
+        profile,
+        path,
+        meta={"model_version": model_version, "data_path": str(data_path)},
+    )
+    logger.info(f"Saved reference profile {path}")
+    return profile
+
+
+def _evidently_dataset(
+    sample: pl.DataFrame, profile: DataProfile, regression: Regression | None
+) -> Dataset:
+    return Dataset.from_pandas(
+        sample.to_pandas(),
         data_definition=DataDefinition(
-            regression=[Regression(target=target, prediction="prediction")]
+            numerical_columns=[c for c in profile.numeric if c in sample.columns],
+            categorical_columns=[c for c in profile.categorical if c in sample.columns],
+            regression=[regression] if regression is not None else None,
         ),
     )
 
-    report = Report(metrics=metrics, include_tests=include_tests)
-    run = report.run(reference_data, current_data)
 
-    run.save_html(report_path)
+@task
+def generate_streaming_monitoring_report(
+    reference_data_path: str | Path,
+    current_data_path: str | Path,
+    report_path: str,
+    model_path: str | Path | None = None,
+    target: str = "duration",
+    max_memory_bytes: int = 2 * 2**30,
+    sample_rows: int = 100_000,
+    drift_threshold: float = DRIFT_THRESHOLD,
+    include_tests: bool = True,
+    use_reference_cache: bool = True,
+) -> StreamingMonitoringResult:
+    """Monitoring report over data of any size in bounded memory.
 
-    return run
+    Unlike `generate_monitoring_report`, the data is never collected. Both data
+    sets are read in record batches and summarized into DataProfiles: histograms
+    of trip_distance, duration and prediction, frequency tables of the location
+    IDs and streaming MAE/RMSE/R². Drift is computed on these summaries, with
+    Evidently's default methods and threshold. Evidently itself only sees a
+    stratified sample of each data set, for its HTML report.
+
+    Half of `max_memory_bytes` is the budget of a record batch, the other half of
+    the samples, which Evidently holds several times as pandas copies.
+    `sample_rows` is lowered to fit this budget.
+
+    With a model, the reference profile is cached next to the model artifact, see
+    `cached_reference_profile`, so repeated reports only read the current data.
+
+    Args:
+        reference_data_path: Parquet file or glob of the reference data.
+        current_data_path: Parquet file or glob of the current data.
+        report_path: Path of the Evidently HTML report. The exact statistics are
+            written next to it, with the suffix `.json`.
+        model_path: Model artifact for predictions and regression metrics.
+        target: Target column, computed from the pickup and dropoff times if missing.
+        max_memory_bytes: Approximate memory ceiling of the run.
+        sample_rows: Rows sampled from each data set for the Evidently report.
+        drift_threshold: Distance above which a column counts as drifted.
+        include_tests: Include Evidently's tests in the report.
+        use_reference_cache: Reuse or store the reference profile next to the
+            model artifact. Without a model, the reference is always profiled.
+
+    Returns:
+        The profiles, the drift per column and the Evidently snapshot.
+    """
+    holder = ModelHolder(model_path) if model_path is not None else None
+    sample_schema = pl.Schema(
+        {column: pl.Float64 for column in DataProfile.empty().columns}
+    )
+    # pandas copies and Evidently's intermediate frames, of both samples
+    sample_row_bytes = estimate_row_bytes(sample_schema) * 8 * 2
+    sample_rows = min(sample_rows, (max_memory_bytes // 2) // sample_row_bytes)
+
+    if holder is not None and model_path is not None and use_reference_cache:
+        reference = cached_reference_profile(
+            reference_data_path,
+            model_path,
+            holder,
+            target,
+            max_memory_bytes // 2,
+            sample_rows,
+        )
+    else:
+        logger.info(f"Profiling {reference_data_path}")
+        reference = profile_parquet(
+            reference_data_path, holder, target, max_memory_bytes // 2, sample_rows
+        )
+    logger.info(f"Profiling {current_data_path}")
+    current = profile_parquet(
+        current_data_path, holder, target, max_memory_bytes // 2, sample_rows
+    )
+    drift = compare_profiles(reference, current, drift_threshold)
+
+    metrics = [DataDriftPreset()]
+    regression = None
+    if holder is not None:
+        metrics.append(RegressionPreset())
+        regression = Regression(target=target, prediction="prediction")
+    reference_sample, current_sample = reference.sample, current.sample
+    if reference_sample is None or current_sample is None:
+        raise ValueError("Both data sets need rows to generate a report.")
+    report = Report(metrics=metrics, include_tests=include_tests)
+    snapshot = report.run(
+        _evidently_dataset(reference_sample, reference, regression),
+        _evidently_dataset(current_sample, current, regression),
+    )
+    snapshot.save_html(report_path)
+
+    result = StreamingMonitoringResult(reference, current, drift, snapshot)
+    Path(report_path).with_suffix(".json").write_text(
+        json.dumps(result.summary(), indent=2)
+    )
+    drifted = [column for column, d in drift.items() if d.drifted]
+    logger.info(f"Drifted columns: {drifted or 'none'}")
+    return result
@@ -0,0 +1,397 @@
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Iterable, Mapping
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+from numpy.typing import ArrayLike
+from scipy.spatial.distance import jensenshannon
+from scipy.stats import wasserstein_distance
+
+from e2e_taxi_ride_duration_prediction.location_pairs import LOCATION_ID_CARDINALITY
+from e2e_taxi_ride_duration_prediction.streaming import RegressionStats
+
+# Fixed bin edges, so profiles of different data sets and batches can be merged and
+# compared bin by bin. Values outside the edges go to an underflow/overflow bin.
+DURATION_EDGES = np.arange(0.0, 121.0, 1.0)
+DEFAULT_NUMERIC_EDGES: dict[str, npt.NDArray[np.float64]] = {
+    "trip_distance": np.concatenate(
+        [np.arange(0.0, 10.0, 0.25), np.arange(10.0, 50.0, 1.0), np.arange(50, 101, 10)]
+    ),
+    "duration": DURATION_EDGES,
+    "prediction": DURATION_EDGES,
+}
+DEFAULT_CATEGORICAL_COLUMNS = ("PULocationID", "DOLocationID")
+
+# Bump when the profile statistics or their storage layout change.
+PROFILE_VERSION = 1
+
+_ARRAYS_FILE = "profile.npz"
+_SAMPLE_FILE = "sample.parquet"
+_META_FILE = "meta.json"
+
+# Evidently's default drift thresholds for data sets with more than 1000 rows.
+DRIFT_THRESHOLD = 0.1
+
+
+@dataclass
+class NumericHistogram:
+    """Fixed-bin histogram and moments of a numeric column, mergeable across batches.
+
+    `counts[0]` counts values below `edges[0]`, `counts[-1]` values at or above
+    `edges[-1]` and `counts[i]` values in `[edges[i - 1], edges[i])`.
+    """
+
+    edges: npt.NDArray[np.float64]
+    counts: npt.NDArray[np.int64]
+    nulls: int = 0
+    total: float = 0.0
+    total_squares: float = 0.0
+
+    @classmethod
+    def empty(cls, edges: ArrayLike) -> "NumericHistogram":
+        edges = np.asarray(edges, dtype=np.float64)
+        return cls(edges, np.zeros(len(edges) + 1, dtype=np.int64))
+
+    @property
+    def n(self) -> int:
+        return int(self.counts.sum())
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.n if self.n else float("nan")
+
+    @property
+    def std(self) -> float:
+        if not self.n:
+            return float("nan")
+        return max(self.total_squares / self.n - self.mean**2, 0.0) ** 0.5
+
+    def update(self, values: ArrayLike) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        self.nulls += int(missing.sum())
+        values = values[~missing]
+        self.counts += np.bincount(
+            np.searchsorted(self.edges, values, side="right"),
+            minlength=len(self.counts),
+        )
+        self.total += float(values.sum())
+        self.total_squares += float(np.square(values).sum())
+
+    def merge(self, other: "NumericHistogram") -> None:
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histograms with different edges can not be merged.")
+        self.counts += other.counts
+        self.nulls += other.nulls
+        self.total += other.total
+        self.total_squares += other.total_squares
+
+    def bin_values(self) -> npt.NDArray[np.float64]:
+        """Representative value per bin: bin centers, the outer edges for the tails."""
+        centers = (self.edges[:-1] + self.edges[1:]) / 2
+        return np.concatenate([[self.edges[0]], centers, [self.edges[-1]]])
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile, interpolated linearly within the bin it falls in."""
+        if not self.n:
+            return float("nan")
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, q * self.n, side="left"))
+        if index == 0:
+            return float(self.edges[0])
+        if index == len(self.counts) - 1:
+            return float(self.edges[-1])
+        below = cumulative[index - 1]
+        fraction = (q * self.n - below) / self.counts[index]
+        low, high = self.edges[index - 1], self.edges[index]
+        return float(low + fraction * (high - low))
+
+
+@dataclass
+class CategoryCounts:
+    """Frequency table of an integer category column such as a location ID.
+
+    Values in `[0, cardinality)` are counted individually, all others in one
+    "other" bucket at index `cardinality`.
+    """
+
+    counts: npt.NDArray[np.int64]
+    nulls: int = 0
+
+    @classmethod
+    def empty(cls, cardinality: int = LOCATION_ID_CARDINALITY) -> "CategoryCounts":
+        return cls(np.zeros(cardinality + 1, dtype=np.int64))
+
+    @property
+    def cardinality(self) -> int:
+        return len(self.counts) - 1
+
+    @property
+    def n(self) -> int:
+        return int(self.counts.sum())
+
+    def update(self, values: ArrayLike) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        self.nulls += int(missing.sum())
+        values = values[~missing].astype(np.int64)
+        in_range = (values >= 0) & (values < self.cardinality)
+        self.counts += np.bincount(
+            np.where(in_range, values, self.cardinality), minlength=len(self.counts)
+        )
+
+    def merge(self, other: "CategoryCounts") -> None:
+        if self.cardinality != other.cardinality:
+            raise ValueError("Counts of different cardinality can not be merged.")
+        self.counts += other.counts
+        self.nulls += other.nulls
+
+
+@dataclass
+class ColumnDrift:
+    """Drift of one column between a reference and a current profile.
+
+    Attributes:
+        column: Column name.
+        method: "wasserstein" (normed by the reference std) for numeric columns,
+            "jensenshannon" for categorical columns, as Evidently does by default.
+        score: Distance between the two distributions.
+        drifted: Whether the score exceeds the threshold.
+    """
+
+    column: str
+    method: str
+    score: float
+    drifted: bool
+
+
+@dataclass
+class DataProfile:
+    """Compact, mergeable summary of a data set built one record batch at a time.
+
+    It holds histograms of the numeric columns, frequency tables of the categorical
+    columns, streaming regression metrics if the data has a target and a prediction
+    and a uniform sample of the rows for tools that need raw data, such as
+    Evidently. Its size does not depend on the number of rows.
+    """
+
+    numeric: dict[str, NumericHistogram]
+    categorical: dict[str, CategoryCounts]
+    regression: RegressionStats = field(default_factory=RegressionStats)
+    rows: int = 0
+    samples: list[pl.DataFrame] = field(default_factory=list)
+
+    @classmethod
+    def empty(
+        cls,
+        numeric_edges: Mapping[str, ArrayLike] = DEFAULT_NUMERIC_EDGES,
+        categorical_columns: Iterable[str] = DEFAULT_CATEGORICAL_COLUMNS,
+    ) -> "DataProfile":
+        return cls(
+            numeric={
+                column: NumericHistogram.empty(edges)
+                for column, edges in numeric_edges.items()
+            },
+            categorical={
+                column: CategoryCounts.empty() for column in categorical_columns
+            },
+        )
+
+    @property
+    def columns(self) -> list[str]:
+        return [*self.categorical, *self.numeric]
+
+    @property
+    def sample(self) -> pl.DataFrame | None:
+        return pl.concat(self.samples) if self.samples else None
+
+    def update(
+        self,
+        batch: pl.DataFrame,
+        target: str = "duration",
+        prediction: str = "prediction",
+        sample_fraction: float = 0.0,
+        seed: int | None = None,
+    ) -> None:
+        """Add a record batch; columns missing from the batch are skipped.
+
+        Args:
+            batch: The record batch.
+            target: Column with the true values for the regression metrics.
+            prediction: Column with the predictions for the regression metrics.
+            sample_fraction: Fraction of the rows of the batch kept in the sample,
+                with the profiled columns only. The same fraction of every batch is
+                kept, so the sample is stratified over the batches, e.g. over time
+                for time-ordered files.
+            seed: Seed of the sampling.
+        """
+        self.rows += batch.height
+        for column, histogram in self.numeric.items():
+            if column in batch.columns:
+                histogram.update(batch[column].cast(pl.Float64).to_numpy())
+        for column, counts in self.categorical.items():
+            if column in batch.columns:
+                counts.update(batch[column].cast(pl.Float64).to_numpy())
+        if target in batch.columns and prediction in batch.columns:
+            labeled = batch.select(target, prediction).drop_nulls().drop_nans()
+            self.regression.update(labeled[target], labeled[prediction])
+        n_sample = round(batch.height * sample_fraction)
+        if n_sample:
+            columns = [c for c in batch.columns if c in self.columns]
+            self.samples.append(batch.select(columns).sample(n_sample, seed=seed))
+
+    def merge(self, other: "DataProfile") -> None:
+        """Add the statistics and sample of another profile with the same columns."""
+        for column, histogram in self.numeric.items():
+            histogram.merge(other.numeric[column])
+        for column, counts in self.categorical.items():
+            counts.merge(other.categorical[column])
+        self.regression.merge(other.regression)
+        self.rows += other.rows
+        self.samples.extend(other.samples)
+
+
+def numeric_drift(
+    reference: NumericHistogram, current: NumericHistogram
+) -> float | None:
+    """Wasserstein distance of two histograms, normed by the reference std."""
+    if not reference.n or not current.n:
+        return None
+    distance = wasserstein_distance(
+        reference.bin_values(),
+        current.bin_values(),
+        u_weights=reference.counts,
+        v_weights=current.counts,
+    )
+    return float(distance / reference.std) if reference.std > 0 else float(distance)
+
+
+def categorical_drift(
+    reference: CategoryCounts, current: CategoryCounts
+) -> float | None:
+    """Jensen-Shannon distance of two frequency tables."""
+    if not reference.n or not current.n:
+        return None
+    return float(jensenshannon(reference.counts, current.counts))
+
+
+def compare_profiles(
+    reference: DataProfile,
+    current: DataProfile,
+    threshold: float = DRIFT_THRESHOLD,
+) -> dict[str, ColumnDrift]:
+    """Drift per column between two profiles; columns empty in either are skipped."""
+    drifts = {}
+    for column, histogram in reference.numeric.items():
+        score = numeric_drift(histogram, current.numeric[column])
+        if score is not None:
+            drifts[column] = ColumnDrift(
+                column, "wasserstein", score, score > threshold
+            )
+    for column, counts in reference.categorical.items():
+        score = categorical_drift(counts, current.categorical[column])
+        if score is not None:
+            drifts[column] = ColumnDrift(
+                column, "jensenshannon", score, score > threshold
+            )
+    return drifts
+
+
+def reference_profile_dir(model_path: str | Path) -> Path:
+    """Directory of the reference profiles cached next to a joblib model artifact."""
+    return Path(model_path).with_suffix(".profiles")
+
+
+def save_profile(
+    profile: DataProfile, path: str | Path, meta: dict[str, Any] | None = None
+) -> None:
+    """Write a profile as a directory, replacing an existing one atomically.
+
+    The histograms and frequency tables go to one `.npz` file, the sample to
+    parquet and the scalars with the extra `meta` to `meta.json`.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+    try:
+        arrays = {}
+        for column, histogram in profile.numeric.items():
+            arrays[f"numeric/{column}/edges"] = histogram.edges
+            arrays[f"numeric/{column}/counts"] = histogram.counts
+        for column, counts in profile.categorical.items():
+            arrays[f"categorical/{column}/counts"] = counts.counts
+        np.savez(tmp_dir / _ARRAYS_FILE, **arrays)
+        if profile.sample is not None:
+            profile.sample.write_parquet(tmp_dir / _SAMPLE_FILE)
+        (tmp_dir / _META_FILE).write_text(
+            json.dumps(
+                {
+                    **(meta or {}),
+                    "profile_version": PROFILE_VERSION,
+                    "rows": profile.rows,
+                    "regression": asdict(profile.regression),
+                    "numeric": {
+                        column: {
+                            "nulls": h.nulls,
+                            "total": h.total,
+                            "total_squares": h.total_squares,
+                        }
+                        for column, h in profile.numeric.items()
+                    },
+                    "categorical": {
+                        column: {"nulls": c.nulls}
+                        for column, c in profile.categorical.items()
+                    },
+                }
+            )
+        )
+        if path.exists():
+            shutil.rmtree(path)
+        os.replace(tmp_dir, path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def read_profile_meta(path: str | Path) -> dict[str, Any]:
+    return json.loads((Path(path) / _META_FILE).read_text())
+
+
+def load_profile(path: str | Path) -> DataProfile:
+    """Load a profile written by `save_profile`.
+
+    Raises:
+        FileNotFoundError: If there is no profile at `path`.
+        ValueError: If it was written with another `PROFILE_VERSION`.
+    """
+    path = Path(path)
+    meta = read_profile_meta(path)
+    if meta["profile_version"] != PROFILE_VERSION:
+        raise ValueError(f"Profile {path} has version {meta['profile_version']}.")
+    with np.load(path / _ARRAYS_FILE) as arrays:
+        numeric = {
+            column: NumericHistogram(
+                arrays[f"numeric/{column}/edges"],
+                arrays[f"numeric/{column}/counts"],
+                **scalars,
+            )
+            for column, scalars in meta["numeric"].items()
+        }
+        categorical = {
+            column: CategoryCounts(arrays[f"categorical/{column}/counts"], **scalars)
+            for column, scalars in meta["categorical"].items()
+        }
+    sample_path = path / _SAMPLE_FILE
+    return DataProfile(
+        numeric=numeric,
+        categorical=categorical,
+        regression=RegressionStats(**meta["regression"]),
+        rows=meta["rows"],
+        samples=[pl.read_parquet(sample_path)] if sample_path.exists() else [],
+    )
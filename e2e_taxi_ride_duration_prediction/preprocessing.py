@@ -1,8 +1,53 @@
-from datetime import datetime
+import functools
+from datetime import datetime, timedelta
 
 import polars as pl
 from prefect import flow, task
 
+from e2e_taxi_ride_duration_prediction.location_pairs import (
+    LOCATION_ID_CARDINALITY,
+    PAIR_ID_FEATURE,
+)
+
+LOCATION_ID_COLUMNS = ("PULocationID", "DOLocationID")
+
+# Enum categories are the IDs as strings, so the physical index of a category
+# equals the location ID and integers can be cast to it without any strings.
+LOCATION_ID_ENUM = pl.Enum([str(i) for i in range(LOCATION_ID_CARDINALITY)])
+
+
+CATEGORICAL_COLUMNS = [
+    "VendorID",
+    "RatecodeID",
+    "store_and_fwd_flag",
+    "PULocationID",
+    "DOLocationID",
+    "payment_type",
+]
+
+
+@functools.cache
+def pickup_dropoff_pair_enum() -> pl.Enum:
+    """Enum of all "PU_DO" pairs, built on first use as it holds 70,756 strings.
+
+    Category "PU_DO" sits at physical index PU * 266 + DO.
+    """
+    return pl.Enum(
+        [
+            f"{pu}_{do}"
+            for pu in range(LOCATION_ID_CARDINALITY)
+            for do in range(LOCATION_ID_CARDINALITY)
+        ]
+    )
+
+
+# Raw columns a derived feature is computed from, other features are raw columns.
+FEATURE_SOURCE_COLUMNS: dict[str, tuple[str, ...]] = {
+    "pickup_dropoff_pair": LOCATION_ID_COLUMNS,
+    PAIR_ID_FEATURE: LOCATION_ID_COLUMNS,
+    "duration": ("tpep_pickup_datetime", "tpep_dropoff_datetime"),
+}
+
 
 @task
 def calculate_duration(lf: pl.LazyFrame) -> pl.LazyFrame:
@@ -34,14 +79,7 @@ def filter_valid_durations(lf: pl.LazyFrame) -> pl.LazyFrame:
 @task
 def cast_categorical_columns(
     lf: pl.LazyFrame,
-    categorical_columns: list[str] = [
-        "VendorID",
-        "RatecodeID",
-        "store_and_fwd_flag",
-        "PULocationID",
-        "DOLocationID",
-        "payment_type",
-    ],
+    categorical_columns: list[str] = CATEGORICAL_COLUMNS,
 ) -> pl.LazyFrame:
     return lf.with_columns(
         [pl.col(col).cast(pl.Utf8).cast(pl.Categorical) for col in categorical_columns]
@@ -57,6 +95,95 @@ def create_pickup_dropoff_pairs(lf: pl.LazyFrame) -> pl.LazyFrame:
     )
 
 
+def required_columns(features: list[str], target: str = "duration") -> list[str]:
+    """Raw columns needed to compute the features and the target.
+
+    The pickup and dropoff times are always needed, for the date filter, the
+    duration and the time series split.
+    """
+    columns = ["tpep_pickup_datetime", "tpep_dropoff_datetime"]
+    for feature in [*features, target]:
+        for column in FEATURE_SOURCE_COLUMNS.get(feature, (feature,)):
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+@task
+def filter_partitions(lf: pl.LazyFrame, start: datetime, end: datetime) -> pl.LazyFrame:
+    """Keep the year/month partitions overlapping [start, end).
+
+    A filter on the Hive partition columns lets the scan skip whole files. Frames
+    without `year` and `month` columns are returned unchanged.
+    """
+    names = lf.collect_schema().names()
+    if "year" not in names or "month" not in names:
+        return lf
+    last = end - timedelta(microseconds=1)
+    month_index = pl.col("year") * 12 + pl.col("month")
+    return lf.filter(
+        month_index.is_between(
+            start.year * 12 + start.month, last.year * 12 + last.month
+        )
+    )
+
+
+@task
+def cast_location_ids(
+    lf: pl.LazyFrame, columns: list[str] = list(LOCATION_ID_COLUMNS)
+) -> pl.LazyFrame:
+    """Cast integer location IDs to `LOCATION_ID_ENUM` without a string round-trip.
+
+    IDs outside of the known range become null.
+    """
+    return lf.with_columns(
+        pl.when(pl.col(column).is_between(0, LOCATION_ID_CARDINALITY - 1))
+        .then(pl.col(column))
+        .cast(pl.UInt32)
+        .cast(LOCATION_ID_ENUM)
+        .alias(column)
+        for column in columns
+    )
+
+
+@task
+def create_pickup_dropoff_pair_enum(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """Create `pickup_dropoff_pair` as `pickup_dropoff_pair_enum()` by index arithmetic.
+
+    Expects the location IDs cast with `cast_location_ids`. The values are the same
+    "PU_DO" strings as from `create_pickup_dropoff_pairs`, but no string is built.
+    """
+    return lf.with_columns(
+        (
+            pl.col("PULocationID").to_physical() * LOCATION_ID_CARDINALITY
+            + pl.col("DOLocationID").to_physical()
+        )
+        .cast(pickup_dropoff_pair_enum())
+        .alias("pickup_dropoff_pair")
+    )
+
+
+@task
+def create_pickup_dropoff_pair_ids(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """Create `pickup_dropoff_pair_id` = PULocationID * 266 + DOLocationID as UInt32.
+
+    Integer form of `pickup_dropoff_pair` with a dense, fixed vocabulary of
+    266 * 266 pairs, no strings are built. Works on integer location IDs and on
+    IDs cast with `cast_location_ids`. Pairs with an ID out of range are null.
+    """
+    pu = pl.col("PULocationID").to_physical().cast(pl.Int64)
+    do = pl.col("DOLocationID").to_physical().cast(pl.Int64)
+    in_range = pu.is_between(0, LOCATION_ID_CARDINALITY - 1) & do.is_between(
+        0, LOCATION_ID_CARDINALITY - 1
+    )
+    return lf.with_columns(
+        pl.when(in_range)
+        .then(pu * LOCATION_ID_CARDINALITY + do)
+        .cast(pl.UInt32)
+        .alias(PAIR_ID_FEATURE)
+    )
+
+
 @flow
 def basic_preprocessing(
     lf: pl.LazyFrame, start: datetime, end: datetime
@@ -85,3 +212,63 @@ def basic_preprocessing(
         .pipe(cast_categorical_columns)
         .pipe(create_pickup_dropoff_pairs)
     )
+
+
+@flow
+def feature_preprocessing(
+    lf: pl.LazyFrame,
+    start: datetime,
+    end: datetime,
+    features: list[str] = ["pickup_dropoff_pair", "trip_distance"],
+    target: str = "duration",
+) -> pl.LazyFrame:
+    """Preprocessing that only reads and computes what the features need.
+
+    Same filters as `basic_preprocessing`, but:
+        - Only the raw columns the features and the target are derived from are
+          selected, so the parquet scan reads no other columns
+        - The date range is filtered first, on the Hive partition columns if
+          present and on the pickup time, so the scan skips files and row groups
+        - Location IDs and pairs are cast to integer-backed Enums by physical
+          index instead of going through strings, other categorical features are
+          cast as in `basic_preprocessing`
+        - `pickup_dropoff_pair_id` can be requested instead of
+          `pickup_dropoff_pair` for the plain integer pair encoding
+
+    Args:
+        lf: The LazyFrame that should be preprocessed.
+        start: Datetime indicating the start of daterange.
+        end: Datetime indicating the end of daterange
+        features: Features that should be part of the output.
+        target: Target column that should be part of the output.
+    Returns:
+        LazyFrame with `tpep_pickup_datetime`, the features and the target.
+    """
+    columns = required_columns(features, target)
+    location_columns = [
+        column
+        for column in LOCATION_ID_COLUMNS
+        if column in features or "pickup_dropoff_pair" in features
+    ]
+    categorical_columns = [
+        column
+        for column in CATEGORICAL_COLUMNS
+        if column in features and column not in LOCATION_ID_COLUMNS
+    ]
+
+    lf = (
+        lf.pipe(filter_partitions, start, end)
+        .select(columns)
+        .pipe(filter_by_date_range, start, end)
+        .pipe(calculate_duration)
+        .pipe(filter_valid_durations)
+    )
+    if categorical_columns:
+        lf = cast_categorical_columns(lf, categorical_columns)
+    if PAIR_ID_FEATURE in features:
+        lf = create_pickup_dropoff_pair_ids(lf)
+    if location_columns:
+        lf = cast_location_ids(lf, location_columns)
+    if "pickup_dropoff_pair" in features:
+        lf = create_pickup_dropoff_pair_enum(lf)
+    return lf.select(["tpep_pickup_datetime", *features, target])
@@ -0,0 +1,247 @@
+import glob
+import multiprocessing
+import shutil
+import time
+from collections.abc import Iterator, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from loguru import logger
+from prefect import task
+
+from e2e_taxi_ride_duration_prediction.serving.inference import predict_rides
+from e2e_taxi_ride_duration_prediction.serving.model_holder import ModelHolder
+
+RIDE_COLUMNS = ["PULocationID", "DOLocationID", "trip_distance"]
+PICKUP_DATETIME = "tpep_pickup_datetime"
+PREDICTION_COLUMN = "prediction"
+
+# Model of a scoring worker process, loaded once by `_init_worker`.
+_worker_holder: ModelHolder | None = None
+
+
+@dataclass
+class ScoringReport:
+    """Summary of a batch scoring run.
+
+    Attributes:
+        rows: Number of rows scored.
+        batches: Number of record batches scored.
+        files: Number of input parquet files.
+        seconds: Wall time of the run.
+    """
+
+    rows: int = 0
+    batches: int = 0
+    files: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def resolve_input_paths(input_glob: str) -> list[Path]:
+    """Sorted parquet files matching `input_glob`, `**` matches nested directories.
+
+    Raises:
+        FileNotFoundError: If no file matches.
+    """
+    paths = sorted(Path(p) for p in glob.glob(input_glob, recursive=True))
+    if not paths:
+        raise FileNotFoundError(f"No parquet files match {input_glob}")
+    return paths
+
+
+def iter_record_batches(
+    paths: Sequence[Path], batch_rows: int, columns: list[str] | None = None
+) -> Iterator[pa.RecordBatch]:
+    """Read parquet files one record batch of at most `batch_rows` rows at a time."""
+    for path in paths:
+        parquet_file = pq.ParquetFile(path)
+        yield from parquet_file.iter_batches(batch_size=batch_rows, columns=columns)
+
+
+def add_pickup_month(frame: pl.DataFrame) -> pl.DataFrame:
+    """Add `year` and `month` of the pickup, the partition columns of the raw data."""
+    return frame.with_columns(
+        pl.col(PICKUP_DATETIME).dt.year().alias("year"),
+        pl.col(PICKUP_DATETIME).dt.month().alias("month"),
+    )
+
+
+def score_frame(holder: ModelHolder, frame: pl.DataFrame) -> pl.DataFrame:
+    """Append a `prediction` column, null for rides with a missing ride column."""
+    complete = pl.all_horizontal(pl.col(RIDE_COLUMNS).is_not_null())
+    rides = frame.select(
+        complete.alias("complete"),
+        *(pl.col(column).fill_null(0) for column in RIDE_COLUMNS),
+    )
+    predictions = predict_rides(
+        holder.get(),
+        rides["PULocationID"].to_numpy(),
+        rides["DOLocationID"].to_numpy(),
+        rides["trip_distance"].to_numpy(),
+    )
+    return frame.with_columns(
+        pl.when(rides["complete"])
+        .then(pl.Series(PREDICTION_COLUMN, predictions))
+        .otherwise(None)
+        .alias(PREDICTION_COLUMN)
+    )
+
+
+def _init_worker(model_path: str, use_mmap: bool) -> None:
+    global _worker_holder
+    _worker_holder = ModelHolder(model_path, use_mmap)
+    _worker_holder.load()
+
+
+def _score_and_write(
+    batch: pa.RecordBatch,
+    batch_index: int,
+    output_dir: str,
+    partition_by: list[str],
+) -> int:
+    """Score one record batch in a worker process and write it to `output_dir`."""
+    assert _worker_holder is not None, "Worker was not initialized."
+    frame = pl.from_arrow(batch)
+    assert isinstance(frame, pl.DataFrame)
+    frame = score_frame(_worker_holder, frame)
+    if {"year", "month"} & set(partition_by) and "year" not in frame.columns:
+        frame = add_pickup_month(frame)
+
+    ds.write_dataset(
+        frame.to_arrow(),
+        output_dir,
+        format="parquet",
+        partitioning=partition_by or None,
+        partitioning_flavor="hive" if partition_by else None,
+        basename_template=f"part-{batch_index:06d}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return frame.height
+
+
+@task
+def score_parquet_files(
+    input_paths: Sequence[str | Path],
+    model_path: str | Path,
+    output_dir: str | Path,
+    columns: list[str] | None = None,
+    partition_by: list[str] | None = ["year", "month"],
+    batch_rows: int = 1_000_000,
+    max_workers: int | None = None,
+    use_mmap: bool = True,
+    progress_interval: float = 10.0,
+    overwrite: bool = False,
+) -> ScoringReport:
+    """Score parquet files with a model in parallel and bounded memory.
+
+    The files are read one record batch at a time and each batch is scored and
+    written by one of `max_workers` worker processes, which load the model once.
+    At most two batches per worker are in flight, so memory stays bounded by
+    `batch_rows` no matter how large the input is. Each batch becomes its own
+    `part-<batch>-<i>.parquet` file in the hive partitions `partition_by` of
+    `output_dir`. The partition columns `year` and `month` are derived from the
+    pickup time if the input does not have them.
+
+    The part names only depend on the batch index of the run, so scoring into a
+    directory that holds an earlier run would mix both. A non-empty `output_dir`
+    is therefore refused, or deleted first with `overwrite=True`.
+
+    Args:
+        input_paths: Parquet files to score, e.g. from `resolve_input_paths`.
+        model_path: Joblib (model, DictVectorizer) artifact. Its memory-mapped
+            export or lookup table is used if available, see `ModelHolder`.
+        output_dir: Root directory of the scored dataset.
+        columns: Input columns to keep next to `prediction`, all if None. The ride
+            columns and, for month partitions, the pickup time are always read.
+        partition_by: Partition columns of the output, None for a flat directory.
+        batch_rows: Rows per record batch.
+        max_workers: Number of worker processes, the number of CPUs if None.
+        use_mmap: Serve the model from its memory-mapped export if up to date.
+        progress_interval: Seconds between progress log messages.
+        overwrite: Delete the contents of a non-empty `output_dir` first.
+
+    Returns:
+        Rows, batches and time of the run.
+
+    Raises:
+        FileExistsError: If `output_dir` is not empty and `overwrite` is False.
+    """
+    start = time.perf_counter()
+    input_paths = [Path(path) for path in input_paths]
+    partition_by = list(partition_by or [])
+    if columns is not None:
+        required = list(RIDE_COLUMNS)
+        if {"year", "month"} & set(partition_by):
+            required.append(PICKUP_DATETIME)
+        columns = list(dict.fromkeys([*columns, *required]))
+    total_rows = sum(pq.ParquetFile(path).metadata.num_rows for path in input_paths)
+    max_workers = max_workers or multiprocessing.cpu_count()
+    output_dir = Path(output_dir)
+    if output_dir.exists() and any(output_dir.iterdir()):
+        if not overwrite:
+            raise FileExistsError(
+                f"{output_dir} is not empty, pass overwrite=True to replace it."
+            )
+        logger.info(f"Deleting the previous output in {output_dir}")
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    report = ScoringReport(files=len(input_paths))
+    last_progress = start
+    pending: set[Future[int]] = set()
+
+    def collect(futures: set[Future[int]]) -> None:
+        nonlocal last_progress
+        for future in futures:
+            report.rows += future.result()
+            report.batches += 1
+        now = time.perf_counter()
+        if now - last_progress >= progress_interval:
+            last_progress = now
+            logger.info(
+                f"Scored {report.rows:,}/{total_rows:,} rows "
+                f"({report.rows / (now - start):,.0f} rows/s)"
+            )
+
+    with ProcessPoolExecutor(
+        max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(str(model_path), use_mmap),
+    ) as pool:
+        batches = iter_record_batches(input_paths, batch_rows, columns)
+        for batch_index, batch in enumerate(batches):
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(
+                pool.submit(
+                    _score_and_write,
+                    batch,
+                    batch_index,
+                    str(output_dir),
+                    partition_by,
+                )
+            )
+        collect(set(wait(pending).done))
+
+    report.seconds = time.perf_counter() - start
+    logger.info(
+        f"Scored {report.rows:,} rows from {report.files} files in "
+        f"{report.seconds:.1f}s ({report.rows_per_second:,.0f} rows/s)"
+    )
+    return report
+
+
+def read_scored(output_dir: str | Path) -> pl.LazyFrame:
+    """Scan a dataset written by `score_parquet_files`, with its partition columns."""
+    return pl.scan_parquet(Path(output_dir) / "**/*.parquet", hive_partitioning=True)
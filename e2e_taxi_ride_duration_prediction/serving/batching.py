@@ -0,0 +1,235 @@
+import asyncio
+import contextlib
+import inspect
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass, field
+
+import numpy as np
+import numpy.typing as npt
+from loguru import logger
+
+from e2e_taxi_ride_duration_prediction.serving.executor import InferenceQueueFullError
+
+BatchPredictFn = Callable[
+    [Sequence[int], Sequence[int], Sequence[float]], npt.NDArray[np.float64]
+]
+AsyncBatchPredictFn = Callable[
+    [Sequence[int], Sequence[int], Sequence[float]],
+    Awaitable[npt.NDArray[np.float64]],
+]
+
+
+@dataclass
+class BatchingStats:
+    """Counters describing the batches formed by a MicroBatcher.
+
+    Attributes:
+        batches: Number of batches sent to the model.
+        items: Number of rides predicted across all batches.
+        max_batch_size: Largest batch formed so far.
+        total_queue_delay: Sum over all rides of the seconds spent waiting in the queue.
+        max_queue_delay: Longest time in seconds a ride waited in the queue.
+        batch_sizes: Number of batches per power-of-two size bucket (1, 2, 4, ...).
+        rejected: Number of rides refused because the queue was full.
+    """
+
+    batches: int = 0
+    items: int = 0
+    max_batch_size: int = 0
+    total_queue_delay: float = 0.0
+    max_queue_delay: float = 0.0
+    batch_sizes: Counter[int] = field(default_factory=Counter)
+    rejected: int = 0
+
+    def record(self, batch_size: int, queue_delays: Sequence[float]) -> None:
+        self.batches += 1
+        self.items += batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.total_queue_delay += sum(queue_delays)
+        self.max_queue_delay = max(self.max_queue_delay, *queue_delays)
+        # bucket upper bound: the smallest power of two >= batch_size
+        self.batch_sizes[1 << (batch_size - 1).bit_length()] += 1
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    @property
+    def mean_queue_delay(self) -> float:
+        return self.total_queue_delay / self.items if self.items else 0.0
+
+
+@dataclass
+class _PendingRide:
+    pickup_location_id: int
+    dropoff_location_id: int
+    trip_distance: float
+    future: asyncio.Future[float]
+    enqueued_at: float
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-ride predictions into vectorized batches.
+
+    Callers `await submit(...)` and get their own prediction back. A background task
+    takes rides off the queue until either `max_batch_size` rides are collected or
+    `max_wait_ms` passed since the first ride of the batch arrived, then runs one
+    `predict_fn` call for the whole batch in a worker thread, or awaits it if it is
+    a coroutine function (e.g. `InferenceExecutor.predict`). Each batch is predicted
+    in its own task, so while a batch is being predicted the next one is already
+    filling up. At most `max_concurrent_batches` batches are predicted at once,
+    which should match the workers of the inference pool; further rides wait in
+    the queue. At most `max_queue_size` rides wait, further calls to `submit` are
+    rejected right away with `InferenceQueueFullError` (a 503 in the API).
+    """
+
+    def __init__(
+        self,
+        predict_fn: BatchPredictFn | AsyncBatchPredictFn,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 1.0,
+        max_concurrent_batches: int = 4,
+        max_queue_size: int = 1024,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        if max_concurrent_batches < 1:
+            raise ValueError("max_concurrent_batches must be at least 1.")
+        if max_queue_size < 1:
+            raise ValueError("max_queue_size must be at least 1.")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrent_batches = max_concurrent_batches
+        self.max_queue_size = max_queue_size
+        self.stats = BatchingStats()
+        self._queue: asyncio.Queue[_PendingRide] | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._batch_tasks: set[asyncio.Task[None]] = set()
+
+    def _ensure_running(self) -> asyncio.Queue[_PendingRide]:
+        loop = asyncio.get_running_loop()
+        if (
+            self._queue is None
+            or self._task is None
+            or self._task.done()
+            or self._loop is not loop
+        ):
+            self._loop = loop
+            self._queue = asyncio.Queue(self.max_queue_size)
+            self._task = loop.create_task(self._run(self._queue))
+        return self._queue
+
+    async def submit(
+        self, pickup_location_id: int, dropoff_location_id: int, trip_distance: float
+    ) -> float:
+        """Queue a ride and wait for its predicted duration.
+
+        Raises:
+            InferenceQueueFullError: If `max_queue_size` rides are already waiting.
+        """
+        queue = self._ensure_running()
+        future: asyncio.Future[float] = asyncio.get_running_loop().create_future()
+        try:
+            queue.put_nowait(
+                _PendingRide(
+                    pickup_location_id,
+                    dropoff_location_id,
+                    trip_distance,
+                    future,
+                    time.perf_counter(),
+                )
+            )
+        except asyncio.QueueFull:
+            self.stats.rejected += 1
+            raise InferenceQueueFullError(
+                f"{queue.qsize()} rides are already waiting for a micro-batch."
+            ) from None
+        return await future
+
+    async def stop(self) -> None:
+        """Cancel the background tasks; rides not predicted yet are cancelled."""
+        tasks = [task for task in (self._task, *self._batch_tasks) if task is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._batch_tasks.clear()
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._queue.get_nowait().future.cancel()
+        self._task = self._queue = self._loop = None
+
+    async def _collect_batch(
+        self, queue: asyncio.Queue[_PendingRide]
+    ) -> list[_PendingRide]:
+        loop = asyncio.get_running_loop()
+        batch = [await queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except TimeoutError:
+                break
+        return batch
+
+    async def _run(self, queue: asyncio.Queue[_PendingRide]) -> None:
+        slots = asyncio.Semaphore(self.max_concurrent_batches)
+        while True:
+            await slots.acquire()
+            try:
+                batch = await self._collect_batch(queue)
+            except BaseException:
+                slots.release()
+                raise
+            batch = [ride for ride in batch if not ride.future.cancelled()]
+            if not batch:
+                slots.release()
+                continue
+
+            dispatched_at = time.perf_counter()
+            self.stats.record(
+                len(batch), [dispatched_at - ride.enqueued_at for ride in batch]
+            )
+            task = asyncio.create_task(self._predict_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _predict_batch(self, batch: list[_PendingRide]) -> None:
+        columns = (
+            [ride.pickup_location_id for ride in batch],
+            [ride.dropoff_location_id for ride in batch],
+            [ride.trip_distance for ride in batch],
+        )
+        try:
+            if inspect.iscoroutinefunction(self.predict_fn):
+                predictions = await self.predict_fn(*columns)
+            else:
+                predictions = await asyncio.to_thread(self.predict_fn, *columns)
+        except asyncio.CancelledError:
+            for ride in batch:
+                ride.future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Batch prediction of {len(batch)} rides failed: {e}")
+            for ride in batch:
+                if not ride.future.done():
+                    ride.future.set_exception(e)
+            return
+
+        for ride, prediction in zip(batch, predictions):
+            if not ride.future.done():
+                ride.future.set_result(float(prediction))
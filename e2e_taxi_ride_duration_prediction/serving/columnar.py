@@ -0,0 +1,112 @@
+import io
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+JSON_MEDIA_TYPE = "application/json"
+COLUMNAR_MEDIA_TYPES = (ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE)
+
+LOCATION_ID_COLUMNS = ("PULocationID", "DOLocationID")
+RIDE_COLUMNS = (*LOCATION_ID_COLUMNS, "trip_distance")
+PREDICTION_COLUMN = "predicted_duration"
+
+
+class ColumnarDecodeError(ValueError):
+    """Raised when a columnar request body can not be turned into rides."""
+
+
+@dataclass(frozen=True)
+class RideColumns:
+    """Rides of a columnar request as NumPy arrays, views of the decoded buffers."""
+
+    pickup_location_ids: npt.NDArray[np.integer]
+    dropoff_location_ids: npt.NDArray[np.integer]
+    trip_distances: npt.NDArray[np.floating]
+
+    def __len__(self) -> int:
+        return len(self.trip_distances)
+
+
+def media_type(content_type: str | None) -> str:
+    """The media type of a Content-Type header without its parameters."""
+    return (content_type or JSON_MEDIA_TYPE).partition(";")[0].strip().lower()
+
+
+def negotiate_response_media_type(accept: str | None, request_media_type: str) -> str:
+    """Pick the response format of a batch prediction from the Accept header.
+
+    An explicit columnar or JSON media type in Accept wins, in the order listed.
+    Without one (no header, or only wildcards), the response has the format of the
+    request.
+    """
+    for part in (accept or "").split(","):
+        candidate = part.partition(";")[0].strip().lower()
+        if candidate in (*COLUMNAR_MEDIA_TYPES, JSON_MEDIA_TYPE):
+            return candidate
+    return request_media_type
+
+
+def decode_rides(body: bytes, body_media_type: str) -> RideColumns:
+    """Decode an Arrow IPC stream or Parquet body into ride columns.
+
+    Only the three ride columns are read. Numeric columns without nulls are not
+    copied: the arrays are read-only views of the buffers Polars decoded.
+
+    Raises:
+        ColumnarDecodeError: If the body is not readable, a column is missing or
+            has nulls, a location ID column is not integer or `trip_distance` is
+            not numeric or not finite.
+    """
+    import polars as pl
+
+    try:
+        if body_media_type == ARROW_STREAM_MEDIA_TYPE:
+            rides = pl.read_ipc_stream(body, columns=list(RIDE_COLUMNS))
+        elif body_media_type == PARQUET_MEDIA_TYPE:
+            rides = pl.read_parquet(body, columns=list(RIDE_COLUMNS))
+        else:
+            raise ColumnarDecodeError(f"Unsupported media type {body_media_type}.")
+    except (pl.exceptions.PolarsError, OSError) as e:
+        raise ColumnarDecodeError(f"Could not read the request body: {e}") from e
+
+    for column in RIDE_COLUMNS:
+        series = rides[column]
+        if column in LOCATION_ID_COLUMNS:
+            # a float ID would be truncated into another zone
+            if not series.dtype.is_integer():
+                raise ColumnarDecodeError(f"Column {column} must be integer.")
+        elif not series.dtype.is_numeric():
+            raise ColumnarDecodeError(f"Column {column} must be numeric.")
+        if series.null_count():
+            raise ColumnarDecodeError(f"Column {column} must not contain nulls.")
+    # like the JSON body, which rejects NaN and infinity
+    if not rides["trip_distance"].cast(pl.Float64).is_finite().all():
+        raise ColumnarDecodeError("Column trip_distance must be finite.")
+    if rides.is_empty():
+        raise ColumnarDecodeError("The request contains no rides.")
+
+    return RideColumns(
+        pickup_location_ids=rides["PULocationID"].to_numpy(),
+        dropoff_location_ids=rides["DOLocationID"].to_numpy(),
+        trip_distances=rides["trip_distance"].to_numpy(),
+    )
+
+
+def encode_predictions(
+    predictions: npt.NDArray[np.float64], response_media_type: str
+) -> bytes:
+    """Write predictions as a one-column Arrow IPC stream or Parquet file."""
+    import polars as pl
+
+    frame = pl.DataFrame({PREDICTION_COLUMN: predictions})
+    buffer = io.BytesIO()
+    if response_media_type == ARROW_STREAM_MEDIA_TYPE:
+        frame.write_ipc_stream(buffer)
+    elif response_media_type == PARQUET_MEDIA_TYPE:
+        frame.write_parquet(buffer)
+    else:
+        raise ValueError(f"Unsupported media type {response_media_type}.")
+    return buffer.getvalue()
@@ -0,0 +1,117 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+DEFAULT_MODEL_PATH = (
+    Path(__file__).parents[2]
+    / "models/baseline_taxi_duration_model_and_vectorizer.joblib"
+)
+
+
+@dataclass(frozen=True)
+class ServingConfig:
+    """Runtime configuration of the prediction API.
+
+    Attributes:
+        model_path: Path to the joblib (model, DictVectorizer) artifact.
+        use_mmap_model: Serve the memory-mapped export of the artifact if there is
+            an up-to-date one, instead of unpickling the artifact in every worker.
+        model_reload_interval: Seconds between checks of the artifact for changes.
+            A value <= 0 disables the background watcher.
+        max_batch_size: Maximum number of rides accepted by /predict/batch as JSON.
+        max_columnar_batch_size: Maximum number of rides accepted by /predict/batch
+            as an Arrow IPC stream or Parquet file.
+        micro_batch_max_size: Maximum number of concurrent /predict calls coalesced
+            into one model call. A value <= 1 disables micro-batching.
+        micro_batch_max_wait_ms: Maximum time the first ride of a micro-batch waits
+            for more rides before the batch is predicted.
+        micro_batch_queue_size: Maximum number of rides waiting for a micro-batch,
+            further /predict calls are rejected with 503.
+        inference_executor: "thread" or "process", the kind of pool predictions
+            run on.
+        inference_workers: Number of threads or processes of the inference pool.
+        inference_queue_size: Number of predictions that may wait for a free
+            worker, further requests are rejected with 503.
+        prediction_cache_size: Maximum number of cached /predict results. A value
+            <= 0 disables the cache.
+        prediction_cache_ttl_seconds: Seconds a cached prediction is served, a value
+            <= 0 keeps entries until they are evicted or the model changes.
+        prediction_cache_distance_step: Width in miles of the trip_distance buckets
+            that share a cache entry.
+        prediction_log_dir: Directory of the Parquet log of served predictions,
+            None disables the log.
+        prediction_log_sample_rate: Fraction of the served rides that is logged.
+        prediction_log_flush_rows: Buffered rows that trigger a flush.
+        prediction_log_flush_interval: Maximum seconds between flushes.
+        prediction_log_buffer_rows: Maximum number of buffered rows, further rides
+            are not logged until the next flush.
+        prediction_log_max_bytes: Size of the log at which the oldest files are
+            deleted, a value <= 0 keeps all files.
+    """
+
+    model_path: Path = DEFAULT_MODEL_PATH
+    use_mmap_model: bool = True
+    model_reload_interval: float = 0.0
+    max_batch_size: int = 100_000
+    max_columnar_batch_size: int = 10_000_000
+    micro_batch_max_size: int = 1
+    micro_batch_max_wait_ms: float = 1.0
+    micro_batch_queue_size: int = 1024
+    inference_executor: str = "thread"
+    inference_workers: int = 4
+    inference_queue_size: int = 64
+    prediction_cache_size: int = 0
+    prediction_cache_ttl_seconds: float = 300.0
+    prediction_cache_distance_step: float = 0.1
+    prediction_log_dir: Path | None = None
+    prediction_log_sample_rate: float = 1.0
+    prediction_log_flush_rows: int = 10_000
+    prediction_log_flush_interval: float = 60.0
+    prediction_log_buffer_rows: int = 100_000
+    prediction_log_max_bytes: int = 2**30
+
+    @classmethod
+    def from_env(cls) -> "ServingConfig":
+        """Build the config from environment variables, falling back to defaults."""
+        return cls(
+            model_path=Path(os.getenv("MODEL_PATH", str(DEFAULT_MODEL_PATH))),
+            use_mmap_model=os.getenv("MODEL_MMAP", "1") != "0",
+            model_reload_interval=float(os.getenv("MODEL_RELOAD_INTERVAL", "0")),
+            max_batch_size=int(os.getenv("MAX_BATCH_SIZE", "100000")),
+            max_columnar_batch_size=int(
+                os.getenv("MAX_COLUMNAR_BATCH_SIZE", "10000000")
+            ),
+            micro_batch_max_size=int(os.getenv("MICRO_BATCH_MAX_SIZE", "1")),
+            micro_batch_max_wait_ms=float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "1.0")),
+            micro_batch_queue_size=int(os.getenv("MICRO_BATCH_QUEUE_SIZE", "1024")),
+            inference_executor=os.getenv("INFERENCE_EXECUTOR", "thread"),
+            inference_workers=int(os.getenv("INFERENCE_WORKERS", "4")),
+            inference_queue_size=int(os.getenv("INFERENCE_QUEUE_SIZE", "64")),
+            prediction_cache_size=int(os.getenv("PREDICTION_CACHE_SIZE", "0")),
+            prediction_cache_ttl_seconds=float(
+                os.getenv("PREDICTION_CACHE_TTL_SECONDS", "300")
+            ),
+            prediction_cache_distance_step=float(
+                os.getenv("PREDICTION_CACHE_DISTANCE_STEP", "0.1")
+            ),
+            prediction_log_dir=(
+                Path(os.environ["PREDICTION_LOG_DIR"])
+                if os.getenv("PREDICTION_LOG_DIR")
+                else None
+            ),
+            prediction_log_sample_rate=float(
+                os.getenv("PREDICTION_LOG_SAMPLE_RATE", "1.0")
+            ),
+            prediction_log_flush_rows=int(
+                os.getenv("PREDICTION_LOG_FLUSH_ROWS", "10000")
+            ),
+            prediction_log_flush_interval=float(
+                os.getenv("PREDICTION_LOG_FLUSH_INTERVAL", "60")
+            ),
+            prediction_log_buffer_rows=int(
+                os.getenv("PREDICTION_LOG_BUFFER_ROWS", "100000")
+            ),
+            prediction_log_max_bytes=int(
+                os.getenv("PREDICTION_LOG_MAX_BYTES", str(2**30))
+            ),
+        )
@@ -0,0 +1,201 @@
+import asyncio
+import contextlib
+import multiprocessing
+import time
+from collections.abc import Sequence
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from e2e_taxi_ride_duration_prediction.serving.inference import predict_rides
+from e2e_taxi_ride_duration_prediction.serving.metrics import (
+    MODEL_BATCH_SIZE,
+    QUEUE_STAGE,
+)
+from e2e_taxi_ride_duration_prediction.serving.model_holder import (
+    LoadedModel,
+    ModelHolder,
+)
+
+# Model holder of a worker process, created on the first prediction in the worker.
+_worker_holder: ModelHolder | None = None
+
+
+class InferenceQueueFullError(RuntimeError):
+    """Raised when the inference executor has no room for another prediction."""
+
+
+@dataclass
+class ExecutorStats:
+    """Counters of an InferenceExecutor.
+
+    Attributes:
+        completed: Number of predictions that finished, successfully or not.
+        rejected: Number of predictions refused because the queue was full.
+        max_pending: Highest number of predictions running or queued at once.
+    """
+
+    completed: int = 0
+    rejected: int = 0
+    max_pending: int = 0
+
+
+def _predict_in_worker(
+    model_path: str,
+    use_mmap: bool,
+    version: str,
+    pickup_location_ids: Sequence[int],
+    dropoff_location_ids: Sequence[int],
+    trip_distances: Sequence[float],
+) -> npt.NDArray[np.float64]:
+    """Predict with the worker process' own copy of the model at `version`."""
+    global _worker_holder
+    if _worker_holder is None or _worker_holder.model_path != Path(model_path):
+        _worker_holder = ModelHolder(model_path, use_mmap)
+    loaded = _worker_holder.get()
+    if loaded.version != version:
+        loaded = _worker_holder.load()
+    return predict_rides(
+        loaded, pickup_location_ids, dropoff_location_ids, trip_distances
+    )
+
+
+def _predict_in_thread(
+    submitted_at: float,
+    loaded: LoadedModel,
+    pickup_location_ids: Sequence[int],
+    dropoff_location_ids: Sequence[int],
+    trip_distances: Sequence[float],
+) -> npt.NDArray[np.float64]:
+    QUEUE_STAGE.observe(time.perf_counter() - submitted_at)
+    return predict_rides(
+        loaded, pickup_location_ids, dropoff_location_ids, trip_distances
+    )
+
+
+class InferenceExecutor:
+    """Runs predictions on a dedicated pool with a bounded queue.
+
+    FastAPI runs sync endpoints and `run_in_threadpool` calls on one shared pool of
+    40 threads, so under a burst an unbounded number of requests piles up behind
+    the model and every request gets slow. Here predictions run on their own pool of
+    `max_workers` threads or processes, at most `max_queue_size` more wait for a
+    worker, and any further prediction is rejected right away with
+    `InferenceQueueFullError` (a 503 in the API) instead of queueing without limit.
+
+    With `kind="process"`, each worker process loads the model itself and reloads it
+    when the holder of the API has published a new version, so CPU-bound models are
+    not limited by the GIL. Workers are started with "spawn" and only import the
+    serving modules. Their "queue", "encode" and "predict" stage timings stay in
+    the worker processes and are not exported at /metrics.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_queue_size: int = 64,
+        kind: str = "thread",
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+        if max_queue_size < 0:
+            raise ValueError("max_queue_size must not be negative.")
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.kind = kind
+        self.stats = ExecutorStats()
+        self._pending = 0
+        self._pool: Executor | None = None
+
+    @property
+    def pending(self) -> int:
+        """Number of predictions currently running or waiting for a worker."""
+        return self._pending
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="inference"
+                )
+        return self._pool
+
+    async def predict(
+        self,
+        holder: ModelHolder,
+        pickup_location_ids: Sequence[int],
+        dropoff_location_ids: Sequence[int],
+        trip_distances: Sequence[float],
+    ) -> npt.NDArray[np.float64]:
+        """Predict durations with the current model of `holder` on the pool.
+
+        Raises:
+            InferenceQueueFullError: If `max_workers + max_queue_size` predictions
+                are already running or queued.
+        """
+        if self._pending >= self.max_workers + self.max_queue_size:
+            self.stats.rejected += 1
+            raise InferenceQueueFullError(
+                f"{self._pending} predictions are already running or queued."
+            )
+
+        loaded = holder.get()
+        loop = asyncio.get_running_loop()
+        if self.kind == "process":
+            future = self._get_pool().submit(
+                _predict_in_worker,
+                str(holder.model_path),
+                holder.use_mmap,
+                loaded.version,
+                pickup_location_ids,
+                dropoff_location_ids,
+                trip_distances,
+            )
+        else:
+            future = self._get_pool().submit(
+                _predict_in_thread,
+                time.perf_counter(),
+                loaded,
+                pickup_location_ids,
+                dropoff_location_ids,
+                trip_distances,
+            )
+
+        MODEL_BATCH_SIZE.observe(len(trip_distances))
+        # only touched from the event loop thread, so no lock is needed
+        self._pending += 1
+        self.stats.max_pending = max(self.stats.max_pending, self._pending)
+
+        # A cancelled request (client disconnect, timeout) stops waiting, but the
+        # worker keeps running the prediction: the slot is only released once the
+        # pool's future is done, from the event loop.
+        def release(_: Future) -> None:
+            with contextlib.suppress(RuntimeError):  # the loop is already closed
+                loop.call_soon_threadsafe(self._release)
+
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self) -> None:
+        self._pending -= 1
+        self.stats.completed += 1
+
+    def shutdown(self) -> None:
+        """Stop the pool; running predictions finish, queued ones are cancelled."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
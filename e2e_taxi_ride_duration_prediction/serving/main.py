@@ -1,13 +1,166 @@
-from pathlib import Path
+import asyncio
+import contextlib
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import asdict
+from typing import Annotated
 
-import joblib
-import polars as pl
-from fastapi import FastAPI
-from pydantic import BaseModel
+import numpy as np
+import numpy.typing as npt
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import BaseModel, Field, ValidationError, model_validator
 
-pl.Config.set_engine_affinity("streaming")
+from e2e_taxi_ride_duration_prediction.serving.batching import MicroBatcher
+from e2e_taxi_ride_duration_prediction.serving.columnar import (
+    ARROW_STREAM_MEDIA_TYPE,
+    COLUMNAR_MEDIA_TYPES,
+    JSON_MEDIA_TYPE,
+    PARQUET_MEDIA_TYPE,
+    ColumnarDecodeError,
+    decode_rides,
+    encode_predictions,
+    media_type,
+    negotiate_response_media_type,
+)
+from e2e_taxi_ride_duration_prediction.serving.config import ServingConfig
+from e2e_taxi_ride_duration_prediction.serving.executor import (
+    InferenceExecutor,
+    InferenceQueueFullError,
+)
+from e2e_taxi_ride_duration_prediction.serving.metrics import (
+    DECODE_STAGE,
+    REGISTRY,
+    MetricsMiddleware,
+    ServingCollector,
+    instrument_stages,
+)
+from e2e_taxi_ride_duration_prediction.serving.model_holder import (
+    ModelHolder,
+    watch_model_file,
+)
+from e2e_taxi_ride_duration_prediction.serving.prediction_cache import PredictionCache
+from e2e_taxi_ride_duration_prediction.serving.prediction_log import PredictionLogger
 
-app = FastAPI()
+config = ServingConfig.from_env()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    holder: ModelHolder = app.state.model_holder
+    await asyncio.to_thread(holder.load)
+
+    watcher = None
+    if config.model_reload_interval > 0:
+        watcher = asyncio.create_task(
+            watch_model_file(holder, config.model_reload_interval)
+        )
+    try:
+        yield
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await watcher
+        if app.state.batcher is not None:
+            await app.state.batcher.stop()
+        if app.state.prediction_logger is not None:
+            await app.state.prediction_logger.stop()
+        await asyncio.to_thread(app.state.executor.shutdown)
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.state.model_holder = ModelHolder(config.model_path, config.use_mmap_model)
+app.state.executor = InferenceExecutor(
+    max_workers=config.inference_workers,
+    max_queue_size=config.inference_queue_size,
+    kind=config.inference_executor,
+)
+
+
+async def _predict_with_current_model(
+    pickup_location_ids: Sequence[int],
+    dropoff_location_ids: Sequence[int],
+    trip_distances: Sequence[float],
+) -> npt.NDArray[np.float64]:
+    return await app.state.executor.predict(
+        app.state.model_holder,
+        pickup_location_ids,
+        dropoff_location_ids,
+        trip_distances,
+    )
+
+
+app.state.batcher = (
+    MicroBatcher(
+        _predict_with_current_model,
+        max_batch_size=config.micro_batch_max_size,
+        max_wait_ms=config.micro_batch_max_wait_ms,
+        max_concurrent_batches=config.inference_workers,
+        max_queue_size=config.micro_batch_queue_size,
+    )
+    if config.micro_batch_max_size > 1
+    else None
+)
+
+app.state.prediction_cache = (
+    PredictionCache(
+        max_size=config.prediction_cache_size,
+        ttl_seconds=config.prediction_cache_ttl_seconds,
+        distance_step=config.prediction_cache_distance_step,
+    )
+    if config.prediction_cache_size > 0
+    else None
+)
+
+app.state.prediction_logger = (
+    PredictionLogger(
+        config.prediction_log_dir,
+        sample_rate=config.prediction_log_sample_rate,
+        flush_rows=config.prediction_log_flush_rows,
+        flush_interval=config.prediction_log_flush_interval,
+        max_buffered_rows=config.prediction_log_buffer_rows,
+        max_bytes=config.prediction_log_max_bytes,
+    )
+    if config.prediction_log_dir is not None
+    else None
+)
+
+REGISTRY.register(ServingCollector(app.state))
+
+
+def get_model_holder(request: Request) -> ModelHolder:
+    return request.app.state.model_holder
+
+
+def get_executor(request: Request) -> InferenceExecutor:
+    return request.app.state.executor
+
+
+def get_batcher(request: Request) -> MicroBatcher | None:
+    return request.app.state.batcher
+
+
+def get_prediction_cache(request: Request) -> PredictionCache | None:
+    return request.app.state.prediction_cache
+
+
+def get_prediction_logger(request: Request) -> PredictionLogger | None:
+    return request.app.state.prediction_logger
+
+
+@app.exception_handler(InferenceQueueFullError)
+async def inference_queue_full(
+    request: Request, exc: InferenceQueueFullError
+) -> JSONResponse:
+    """Shed load with 503 instead of queueing predictions without limit."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Inference queue is full, retry later."},
+        headers={"Retry-After": "1"},
+    )
 
 
 class TaxiRideRequest(BaseModel):
@@ -20,24 +173,314 @@ class TaxiRidePrediction(BaseModel):
     predicted_duration: float
 
 
+class TaxiRideBatchRequest(BaseModel):
+    """Columnar batch of rides, the i-th ride is made of the i-th entry of each list."""
+
+    PULocationID: list[int] = Field(min_length=1)
+    DOLocationID: list[int] = Field(min_length=1)
+    trip_distance: list[float] = Field(min_length=1)
+
+    @model_validator(mode="after")
+    def check_lengths(self) -> "TaxiRideBatchRequest":
+        lengths = {
+            len(self.PULocationID),
+            len(self.DOLocationID),
+            len(self.trip_distance),
+        }
+        if len(lengths) != 1:
+            raise ValueError("All columns of a batch must have the same length.")
+        if len(self.trip_distance) > config.max_batch_size:
+            raise ValueError(
+                f"Batch size exceeds the maximum of {config.max_batch_size} rides."
+            )
+        return self
+
+
+class TaxiRideBatchPrediction(BaseModel):
+    predicted_duration: list[float]
+
+
+class ModelInfo(BaseModel):
+    version: str
+    model_path: str
+
+
+class BatchingStatsResponse(BaseModel):
+    enabled: bool
+    batches: int = 0
+    items: int = 0
+    mean_batch_size: float = 0.0
+    max_batch_size: int = 0
+    mean_queue_delay_ms: float = 0.0
+    max_queue_delay_ms: float = 0.0
+    rejected: int = 0
+    batch_size_histogram: dict[int, int] = {}
+
+
+class InferenceStatsResponse(BaseModel):
+    executor: str
+    workers: int
+    queue_size: int
+    pending: int
+    completed: int
+    rejected: int
+    max_pending: int
+
+
+class PredictionCacheStatsResponse(BaseModel):
+    enabled: bool
+    size: int = 0
+    max_size: int = 0
+    hits: int = 0
+    misses: int = 0
+    hit_rate: float = 0.0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+
+class PredictionLogStatsResponse(BaseModel):
+    enabled: bool
+    sample_rate: float = 0.0
+    buffered: int = 0
+    logged: int = 0
+    sampled_out: int = 0
+    dropped: int = 0
+    written: int = 0
+    files: int = 0
+    removed_files: int = 0
+    write_errors: int = 0
+
+
 @app.post("/predict")
-def predict_duration(request: TaxiRideRequest) -> TaxiRidePrediction:
-    lf = pl.LazyFrame(
-        {
-            "PULocationID": [request.PULocationID],
-            "DOLocationID": [request.DOLocationID],
-            "trip_distance": [request.trip_distance],
+@instrument_stages
+async def predict_duration(
+    request: TaxiRideRequest,
+    holder: Annotated[ModelHolder, Depends(get_model_holder)],
+    executor: Annotated[InferenceExecutor, Depends(get_executor)],
+    batcher: Annotated[MicroBatcher | None, Depends(get_batcher)],
+    cache: Annotated[PredictionCache | None, Depends(get_prediction_cache)],
+    prediction_logger: Annotated[
+        PredictionLogger | None, Depends(get_prediction_logger)
+    ],
+) -> TaxiRidePrediction:
+    if cache is not None:
+        version = holder.get().version
+        key = cache.key(
+            request.PULocationID, request.DOLocationID, request.trip_distance
+        )
+        prediction = cache.get(key, version)
+        if prediction is not None:
+            if prediction_logger is not None:
+                _log_ride(prediction_logger, request, prediction, version)
+            return TaxiRidePrediction(predicted_duration=prediction)
+
+    if batcher is not None:
+        prediction = await batcher.submit(
+            request.PULocationID, request.DOLocationID, request.trip_distance
+        )
+    else:
+        predictions = await executor.predict(
+            holder,
+            [request.PULocationID],
+            [request.DOLocationID],
+            [request.trip_distance],
+        )
+        prediction = float(predictions[0])
+
+    if cache is not None:
+        cache.put(key, version, prediction)
+    if prediction_logger is not None:
+        _log_ride(prediction_logger, request, prediction, holder.get().version)
+    return TaxiRidePrediction(predicted_duration=prediction)
+
+
+def _log_ride(
+    prediction_logger: PredictionLogger,
+    request: TaxiRideRequest,
+    prediction: float,
+    model_version: str,
+) -> None:
+    prediction_logger.log(
+        [request.PULocationID],
+        [request.DOLocationID],
+        [request.trip_distance],
+        [prediction],
+        model_version,
+    )
+
+
+_COLUMNAR_BODY_SCHEMA = {
+    "schema": {"type": "string", "format": "binary"},
+}
+
+
+@app.post(
+    "/predict/batch",
+    response_model=TaxiRideBatchPrediction,
+    responses={415: {"description": "Unsupported request media type"}},
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                JSON_MEDIA_TYPE: {"schema": TaxiRideBatchRequest.model_json_schema()},
+                ARROW_STREAM_MEDIA_TYPE: _COLUMNAR_BODY_SCHEMA,
+                PARQUET_MEDIA_TYPE: _COLUMNAR_BODY_SCHEMA,
+            },
         }
+    },
+)
+@instrument_stages
+async def predict_duration_batch(
+    request: Request,
+    holder: Annotated[ModelHolder, Depends(get_model_holder)],
+    executor: Annotated[InferenceExecutor, Depends(get_executor)],
+    prediction_logger: Annotated[
+        PredictionLogger | None, Depends(get_prediction_logger)
+    ],
+) -> TaxiRideBatchPrediction | Response:
+    """Predict many rides given as JSON columns, an Arrow IPC stream or Parquet.
+
+    Bulk clients send `application/vnd.apache.arrow.stream` or
+    `application/vnd.apache.parquet` bodies with PULocationID, DOLocationID and
+    trip_distance columns. They skip pydantic, the columns are handed to the model
+    as NumPy views of the decoded buffers. The response is a `predicted_duration`
+    column in the format requested by Accept, by default the format of the request.
+    """
+    body_media_type = media_type(request.headers.get("content-type"))
+    response_media_type = negotiate_response_media_type(
+        request.headers.get("accept"), body_media_type
+    )
+    body = await request.body()
+
+    with DECODE_STAGE.time():
+        if body_media_type in COLUMNAR_MEDIA_TYPES:
+            try:
+                rides = await asyncio.to_thread(decode_rides, body, body_media_type)
+            except ColumnarDecodeError as e:
+                raise HTTPException(status_code=422, detail=str(e)) from e
+            if len(rides) > config.max_columnar_batch_size:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Batch size exceeds the maximum of "
+                    f"{config.max_columnar_batch_size} rides.",
+                )
+            columns = (
+                rides.pickup_location_ids,
+                rides.dropoff_location_ids,
+                rides.trip_distances,
+            )
+        elif body_media_type == JSON_MEDIA_TYPE:
+            try:
+                batch = TaxiRideBatchRequest.model_validate_json(body)
+            except ValidationError as e:
+                raise RequestValidationError(
+                    [{**error, "loc": ("body", *error["loc"])} for error in e.errors()]
+                ) from e
+            columns = (batch.PULocationID, batch.DOLocationID, batch.trip_distance)
+        else:
+            raise HTTPException(
+                status_code=415, detail=f"Unsupported media type {body_media_type}."
+            )
+
+    predictions = await executor.predict(holder, *columns)
+    if prediction_logger is not None:
+        prediction_logger.log(*columns, predictions, holder.get().version)
+
+    if response_media_type in COLUMNAR_MEDIA_TYPES:
+        content = await asyncio.to_thread(
+            encode_predictions, predictions, response_media_type
+        )
+        return Response(content, media_type=response_media_type)
+    return TaxiRideBatchPrediction(predicted_duration=predictions.tolist())
+
+
+@app.post("/admin/reload")
+def reload_model(
+    holder: Annotated[ModelHolder, Depends(get_model_holder)],
+) -> ModelInfo:
+    """Reload the model artifact from disk; in-flight requests keep the old model."""
+    loaded = holder.load()
+    return ModelInfo(version=loaded.version, model_path=str(holder.model_path))
+
+
+@app.get("/stats/batching")
+def batching_stats(
+    batcher: Annotated[MicroBatcher | None, Depends(get_batcher)],
+) -> BatchingStatsResponse:
+    """Achieved micro-batch sizes and queue delays since startup."""
+    if batcher is None:
+        return BatchingStatsResponse(enabled=False)
+    stats = batcher.stats
+    return BatchingStatsResponse(
+        enabled=True,
+        batches=stats.batches,
+        items=stats.items,
+        mean_batch_size=stats.mean_batch_size,
+        max_batch_size=stats.max_batch_size,
+        mean_queue_delay_ms=stats.mean_queue_delay * 1000,
+        max_queue_delay_ms=stats.max_queue_delay * 1000,
+        rejected=stats.rejected,
+        batch_size_histogram=dict(sorted(stats.batch_sizes.items())),
     )
 
-    root = Path(__file__).parents[2]
-    with open(
-        (root / "models/baseline_taxi_duration_model_and_vectorizer.joblib"), "rb"
-    ) as f:
-        model, dict_vectorizer = joblib.load(f)
 
-    X_dicts = lf.collect().to_dicts()
-    X_test = dict_vectorizer.transform(X_dicts)
-    prediction = model.predict(X_test)
+@app.get("/stats/inference")
+def inference_stats(
+    executor: Annotated[InferenceExecutor, Depends(get_executor)],
+) -> InferenceStatsResponse:
+    """Load of the inference pool and number of requests rejected with 503."""
+    stats = executor.stats
+    return InferenceStatsResponse(
+        executor=executor.kind,
+        workers=executor.max_workers,
+        queue_size=executor.max_queue_size,
+        pending=executor.pending,
+        completed=stats.completed,
+        rejected=stats.rejected,
+        max_pending=stats.max_pending,
+    )
+
+
+@app.get("/stats/cache")
+def prediction_cache_stats(
+    cache: Annotated[PredictionCache | None, Depends(get_prediction_cache)],
+) -> PredictionCacheStatsResponse:
+    """Hit/miss counters of the /predict result cache since startup."""
+    if cache is None:
+        return PredictionCacheStatsResponse(enabled=False)
+    stats = cache.stats
+    return PredictionCacheStatsResponse(
+        enabled=True,
+        size=len(cache),
+        max_size=cache.max_size,
+        hits=stats.hits,
+        misses=stats.misses,
+        hit_rate=stats.hit_rate,
+        evictions=stats.evictions,
+        expirations=stats.expirations,
+        invalidations=stats.invalidations,
+    )
+
+
+@app.get("/stats/prediction-log")
+def prediction_log_stats(
+    prediction_logger: Annotated[
+        PredictionLogger | None, Depends(get_prediction_logger)
+    ],
+) -> PredictionLogStatsResponse:
+    """Logged, sampled out and dropped rides and written log files since startup."""
+    if prediction_logger is None:
+        return PredictionLogStatsResponse(enabled=False)
+    return PredictionLogStatsResponse(
+        enabled=True,
+        sample_rate=prediction_logger.sample_rate,
+        buffered=prediction_logger.buffered_rows,
+        **asdict(prediction_logger.stats),
+    )
+
 
-    return TaxiRidePrediction(predicted_duration=prediction[0])
+@app.get("/metrics")
+def metrics() -> Response:
+    """Prometheus metrics: requests, per-stage latencies, batch sizes and model."""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
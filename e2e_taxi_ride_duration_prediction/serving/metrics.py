@@ -0,0 +1,272 @@
+import functools
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import ParamSpec, TypeVar
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+from starlette.datastructures import State
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from e2e_taxi_ride_duration_prediction.serving.model_holder import LoadedModel
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+# Separate from prometheus_client's global registry, so importing the app twice
+# (e.g. in tests) never registers a metric twice.
+REGISTRY = CollectorRegistry()
+
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+BATCH_SIZE_BUCKETS = tuple(float(2**i) for i in range(17))
+
+REQUESTS = Counter(
+    "taxi_api_requests",
+    "HTTP requests by route and status code.",
+    ["method", "route", "status"],
+    registry=REGISTRY,
+)
+REQUEST_DURATION = Histogram(
+    "taxi_api_request_duration_seconds",
+    "Time from receiving a request until its response headers are sent.",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+IN_FLIGHT = Gauge(
+    "taxi_api_requests_in_flight",
+    "Requests currently being handled.",
+    registry=REGISTRY,
+)
+STAGE_DURATION = Histogram(
+    "taxi_api_stage_duration_seconds",
+    "Time spent per stage of a prediction request.",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+MODEL_BATCH_SIZE = Histogram(
+    "taxi_api_model_batch_size_rides",
+    "Rides per model call, after micro-batching.",
+    buckets=BATCH_SIZE_BUCKETS,
+    registry=REGISTRY,
+)
+
+# Children are bound once, a labels() lookup per observation would cost more than
+# the observation itself.
+VALIDATION_STAGE = STAGE_DURATION.labels("validation")
+DECODE_STAGE = STAGE_DURATION.labels("decode")
+QUEUE_STAGE = STAGE_DURATION.labels("queue")
+ENCODE_STAGE = STAGE_DURATION.labels("encode")
+PREDICT_STAGE = STAGE_DURATION.labels("predict")
+SERIALIZATION_STAGE = STAGE_DURATION.labels("serialization")
+
+
+@dataclass
+class RequestTiming:
+    """perf_counter timestamps of the request that is being handled."""
+
+    start: float
+    handler_start: float | None = None
+    handler_end: float | None = None
+
+
+_current_timing = ContextVar[RequestTiming | None]("request_timing", default=None)
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them end to end.
+
+    It also records the "serialization" stage: the time between the return of an
+    endpoint decorated with `instrument_stages` and the start of the response.
+    Requests that matched no route are counted under the route "unmatched", so
+    scanners can not create an unbounded number of label values.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming(start=time.perf_counter())
+        token = _current_timing.set(timing)
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                now = time.perf_counter()
+                if timing.handler_end is not None:
+                    SERIALIZATION_STAGE.observe(now - timing.handler_end)
+                route = _route_template(scope)
+                REQUEST_DURATION.labels(scope["method"], route).observe(
+                    now - timing.start
+                )
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            REQUESTS.labels(scope["method"], _route_template(scope), str(status)).inc()
+            _current_timing.reset(token)
+
+
+def _route_template(scope: Scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+def instrument_stages(
+    endpoint: Callable[P, Awaitable[R]],
+) -> Callable[P, Awaitable[R]]:
+    """Record the "validation" stage of an async endpoint and mark its return.
+
+    Validation is the time from the arrival of the request until the endpoint
+    runs, i.e. reading the body, JSON parsing, pydantic validation and resolving
+    dependencies.
+    """
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        timing = _current_timing.get()
+        if timing is not None:
+            timing.handler_start = time.perf_counter()
+            VALIDATION_STAGE.observe(timing.handler_start - timing.start)
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            if timing is not None:
+                timing.handler_end = time.perf_counter()
+
+    return wrapper
+
+
+class ServingCollector(Collector):
+    """Exports the state of the model holder, executor, batcher, cache and log.
+
+    The components keep their own counters, this collector only reads them when
+    /metrics is scraped, so the request path does not pay for them twice.
+    """
+
+    def __init__(self, state: State) -> None:
+        self.state = state
+
+    def collect(self) -> Iterator[Metric]:
+        holder = getattr(self.state, "model_holder", None)
+        if holder is not None and holder.is_loaded:
+            loaded = holder.get()
+            info = GaugeMetricFamily(
+                "taxi_api_model_info",
+                "Version of the served model, the value is always 1.",
+                labels=["version", "kind"],
+            )
+            info.add_metric([loaded.version[:12], _model_kind(loaded)], 1)
+            yield info
+
+        executor = getattr(self.state, "executor", None)
+        if executor is not None:
+            yield GaugeMetricFamily(
+                "taxi_api_inference_pending",
+                "Predictions running or waiting for an inference worker.",
+                value=executor.pending,
+            )
+            yield CounterMetricFamily(
+                "taxi_api_inference_completed",
+                "Predictions finished by the inference pool.",
+                value=executor.stats.completed,
+            )
+            yield CounterMetricFamily(
+                "taxi_api_inference_rejected",
+                "Predictions rejected with 503 because the queue was full.",
+                value=executor.stats.rejected,
+            )
+
+        batcher = getattr(self.state, "batcher", None)
+        if batcher is not None:
+            yield CounterMetricFamily(
+                "taxi_api_micro_batches",
+                "Micro-batches sent to the model.",
+                value=batcher.stats.batches,
+            )
+            yield CounterMetricFamily(
+                "taxi_api_micro_batch_queue_delay_seconds",
+                "Total time rides waited for their micro-batch.",
+                value=batcher.stats.total_queue_delay,
+            )
+            yield CounterMetricFamily(
+                "taxi_api_micro_batch_rejected",
+                "Rides rejected with 503 because the micro-batch queue was full.",
+                value=batcher.stats.rejected,
+            )
+
+        cache = getattr(self.state, "prediction_cache", None)
+        if cache is not None:
+            lookups = CounterMetricFamily(
+                "taxi_api_prediction_cache_lookups",
+                "Prediction cache lookups by result.",
+                labels=["result"],
+            )
+            lookups.add_metric(["hit"], cache.stats.hits)
+            lookups.add_metric(["miss"], cache.stats.misses)
+            yield lookups
+            yield GaugeMetricFamily(
+                "taxi_api_prediction_cache_entries",
+                "Predictions currently cached.",
+                value=len(cache),
+            )
+
+        prediction_logger = getattr(self.state, "prediction_logger", None)
+        if prediction_logger is not None:
+            rows = CounterMetricFamily(
+                "taxi_api_prediction_log_rows",
+                "Served rides by what the prediction log did with them.",
+                labels=["result"],
+            )
+            stats = prediction_logger.stats
+            rows.add_metric(["logged"], stats.logged)
+            rows.add_metric(["sampled_out"], stats.sampled_out)
+            rows.add_metric(["dropped"], stats.dropped)
+            rows.add_metric(["written"], stats.written)
+            yield rows
+            yield GaugeMetricFamily(
+                "taxi_api_prediction_log_buffered_rows",
+                "Rides waiting to be written to the prediction log.",
+                value=prediction_logger.buffered_rows,
+            )
+            yield CounterMetricFamily(
+                "taxi_api_prediction_log_write_errors",
+                "Flushes of the prediction log that failed.",
+                value=stats.write_errors,
+            )
+
+
+def _model_kind(loaded: LoadedModel) -> str:
+    if loaded.model is None:
+        return "mmap"
+    if loaded.lookup_table is not None:
+        return "lookup_table"
+    return "sklearn"
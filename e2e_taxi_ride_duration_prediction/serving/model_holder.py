@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from e2e_taxi_ride_duration_prediction.lookup_table import (
+    LookupTableModel,
+    compile_lookup_table,
+    load_lookup_table,
+    lookup_table_path,
+)
+from e2e_taxi_ride_duration_prediction.mmap_model import (
+    MmapLinearModel,
+    load_mmap_model,
+    mmap_model_meta_path,
+    mmap_model_path,
+    read_mmap_model_version,
+)
+
+if TYPE_CHECKING:
+    from sklearn.feature_extraction import DictVectorizer
+
+    from e2e_taxi_ride_duration_prediction.features import ColumnarDictEncoder
+    from e2e_taxi_ride_duration_prediction.models import SklearnCompatibleRegressor
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """Immutable snapshot of a loaded (model, DictVectorizer) artifact.
+
+    If the artifact was served from its memory-mapped export, the pickle is never
+    loaded: `model`, `dict_vectorizer` and `feature_encoder` are None and
+    `lookup_table` holds the MmapLinearModel.
+
+    Attributes:
+        model: The fitted regressor.
+        dict_vectorizer: The DictVectorizer fitted alongside the model.
+        feature_encoder: Columnar encoder precompiled from the vectorizer.
+        lookup_table: Lookup-table form of the model if it is a linear pair/distance
+            model, None if predictions need the generic sklearn path.
+        version: sha256 hex digest of the artifact file.
+        mtime_ns: Modification time of the artifact when it was read.
+        size: Size of the artifact in bytes when it was read.
+        export_mtime_ns: Modification times of the memory-mapped export's
+            meta.json and of the exported lookup table when the artifact was read,
+            None for a missing export.
+    """
+
+    model: "SklearnCompatibleRegressor | None"
+    dict_vectorizer: "DictVectorizer | None"
+    feature_encoder: "ColumnarDictEncoder | None"
+    lookup_table: LookupTableModel | MmapLinearModel | None
+    version: str
+    mtime_ns: int
+    size: int
+    export_mtime_ns: tuple[int | None, int | None] = (None, None)
+
+
+class ModelHolder:
+    """Keeps the served model in memory and swaps it atomically on reload.
+
+    Request handlers grab the current snapshot once via `get()` and keep using it,
+    so a reload never affects in-flight requests: they finish on the old model while
+    new requests see the new one. A failed reload keeps the previous model.
+
+    With `use_mmap=True`, an up-to-date memory-mapped export of the artifact (see
+    `mmap_model.mmap_model_path`) is served instead of unpickling it, so many
+    worker processes share one copy of the model in the OS page cache.
+    """
+
+    def __init__(self, model_path: str | Path, use_mmap: bool = True) -> None:
+        self.model_path = Path(model_path)
+        self.use_mmap = use_mmap
+        self._loaded: LoadedModel | None = None
+        self._reload_lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded is not None
+
+    def get(self) -> LoadedModel:
+        """Return the current model snapshot, loading it on first access."""
+        loaded = self._loaded
+        if loaded is None:
+            return self.load()
+        return loaded
+
+    def load(self) -> LoadedModel:
+        """(Re)load the artifact from disk and publish it as the current model.
+
+        Raises:
+            FileNotFoundError: If the artifact does not exist.
+        """
+        with self._reload_lock:
+            export_mtime_ns = self._export_mtime_ns()
+            stat = self.model_path.stat()
+            data = self.model_path.read_bytes()
+            version = hashlib.sha256(data).hexdigest()
+            mmap_model = self._mmap_model(version) if self.use_mmap else None
+            if mmap_model is not None:
+                loaded = LoadedModel(
+                    model=None,
+                    dict_vectorizer=None,
+                    feature_encoder=None,
+                    lookup_table=mmap_model,
+                    version=version,
+                    mtime_ns=stat.st_mtime_ns,
+                    size=stat.st_size,
+                    export_mtime_ns=export_mtime_ns,
+                )
+            else:
+                loaded = self._load_pickle(data, version, stat, export_mtime_ns)
+            # Single reference assignment, readers never see a partial state.
+            self._loaded = loaded
+
+        logger.info(f"Loaded model {loaded.version[:12]} from {self.model_path}")
+        return loaded
+
+    def _load_pickle(
+        self,
+        data: bytes,
+        version: str,
+        stat: os.stat_result,
+        export_mtime_ns: tuple[int | None, int | None],
+    ) -> LoadedModel:
+        """Unpickle the artifact, only this path imports joblib, sklearn and Polars."""
+        import joblib
+
+        from e2e_taxi_ride_duration_prediction.features import ColumnarDictEncoder
+
+        model, dict_vectorizer = joblib.load(io.BytesIO(data))
+        return LoadedModel(
+            model=model,
+            dict_vectorizer=dict_vectorizer,
+            feature_encoder=ColumnarDictEncoder(dict_vectorizer),
+            lookup_table=self._lookup_table(model, dict_vectorizer, version),
+            version=version,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            export_mtime_ns=export_mtime_ns,
+        )
+
+    def _export_mtime_ns(self) -> tuple[int | None, int | None]:
+        """Modification times of the exports next to the artifact, None if missing."""
+        mtimes = []
+        for path in (
+            mmap_model_meta_path(mmap_model_path(self.model_path)),
+            lookup_table_path(self.model_path),
+        ):
+            try:
+                mtimes.append(path.stat().st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+        return mtimes[0], mtimes[1]
+
+    def _mmap_model(self, version: str) -> MmapLinearModel | None:
+        """Map the exported arrays of this artifact, None if there is no valid export."""
+        path = mmap_model_path(self.model_path)
+        try:
+            if read_mmap_model_version(path) != version:
+                logger.warning(f"Ignoring stale memory-mapped model {path}")
+                return None
+            return load_mmap_model(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable memory-mapped model {path}: {e}")
+            return None
+
+    def _lookup_table(
+        self,
+        model: "SklearnCompatibleRegressor",
+        dict_vectorizer: "DictVectorizer",
+        version: str,
+    ) -> LookupTableModel | None:
+        """Use the exported lookup table of this artifact, or compile one in-process."""
+        table_path = lookup_table_path(self.model_path)
+        if table_path.exists():
+            table = load_lookup_table(table_path)
+            if table.source_version == version:
+                return table
+            logger.warning(f"Ignoring stale lookup table {table_path}")
+        try:
+            return compile_lookup_table(model, dict_vectorizer, version)
+        except ValueError as e:
+            logger.info(f"Using the generic prediction path: {e}")
+            return None
+
+    def has_changed(self) -> bool:
+        """Check whether the artifact or its exports on disk differ from the loaded ones.
+
+        Training writes the exports after the artifact, so the watcher may load the
+        artifact before its exports exist; their modification times are part of the
+        signature so that the export is picked up once it is written.
+        """
+        loaded = self._loaded
+        if loaded is None:
+            return True
+        try:
+            stat = self.model_path.stat()
+        except FileNotFoundError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size, self._export_mtime_ns()) != (
+            loaded.mtime_ns,
+            loaded.size,
+            loaded.export_mtime_ns,
+        )
+
+    def reload_if_changed(self) -> bool:
+        """Reload the artifact if it changed on disk.
+
+        Returns:
+            True if a new model was published, False otherwise.
+        """
+        if not self.has_changed():
+            return False
+        previous = self._loaded
+        try:
+            loaded = self.load()
+        except Exception as e:
+            logger.error(f"Failed to reload model from {self.model_path}: {e}")
+            return False
+        return previous is None or (loaded.version, loaded.export_mtime_ns) != (
+            previous.version,
+            previous.export_mtime_ns,
+        )
+
+
+async def watch_model_file(holder: ModelHolder, interval: float) -> None:
+    """Poll the artifact every `interval` seconds and hot-reload it when it changes."""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(holder.reload_if_changed)
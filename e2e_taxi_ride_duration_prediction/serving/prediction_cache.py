@@ -0,0 +1,112 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+
+CacheKey = tuple[int, int, int]
+
+
+@dataclass
+class PredictionCacheStats:
+    """Counters of a PredictionCache.
+
+    Attributes:
+        hits: Lookups answered from the cache.
+        misses: Lookups that had to be predicted, including expired entries.
+        evictions: Entries dropped because the cache was full.
+        expirations: Entries dropped because they were older than the TTL.
+        invalidations: Number of times the cache was emptied for a new model.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class PredictionCache:
+    """LRU cache of single-ride predictions with a time to live.
+
+    Rides are keyed on `(PULocationID, DOLocationID, trip_distance // distance_step)`,
+    so rides between the same zones with almost the same distance share an entry and
+    get the prediction of the first of them. The answer differs from an uncached
+    prediction by at most the distance coefficient times `distance_step`.
+
+    Every entry belongs to the model version it was predicted with. A lookup with a
+    different version empties the cache, so a reloaded model never serves
+    predictions of its predecessor. The cache is only used from the event loop and
+    is therefore not locked.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10_000,
+        ttl_seconds: float = 300.0,
+        distance_step: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        if distance_step <= 0:
+            raise ValueError("distance_step must be positive.")
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.distance_step = distance_step
+        self.stats = PredictionCacheStats()
+        self._clock = clock
+        self._version: str | None = None
+        # key -> (prediction, expiry time), least recently used first
+        self._entries: OrderedDict[CacheKey, tuple[float, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(
+        self, pickup_location_id: int, dropoff_location_id: int, trip_distance: float
+    ) -> CacheKey:
+        return (
+            pickup_location_id,
+            dropoff_location_id,
+            int(trip_distance // self.distance_step),
+        )
+
+    def get(self, key: CacheKey, version: str) -> float | None:
+        """Cached prediction of `key` by the model `version`, None on a miss."""
+        if version != self._version:
+            if self._entries:
+                self.stats.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        prediction, expires_at = entry
+        if self.ttl_seconds > 0 and self._clock() >= expires_at:
+            del self._entries[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return prediction
+
+    def put(self, key: CacheKey, version: str, prediction: float) -> None:
+        """Store a prediction, unless the cache moved on to a newer model meanwhile."""
+        if version != self._version:
+            return
+        self._entries[key] = (prediction, self._clock() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
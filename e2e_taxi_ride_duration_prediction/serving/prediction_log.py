@@ -0,0 +1,265 @@
+import asyncio
+import contextlib
+import os
+import random
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+from loguru import logger
+
+# File names sort by time, see continuous_monitoring.PREDICTION_LOG_PATTERN.
+LOG_FILE_PREFIX = "predictions-"
+
+
+@dataclass
+class PredictionLogStats:
+    """Counters of a PredictionLogger.
+
+    Attributes:
+        logged: Rows added to the buffer.
+        sampled_out: Rows skipped by sampling.
+        dropped: Rows dropped because the buffer was full.
+        written: Rows written to log files.
+        files: Log files written.
+        removed_files: Old log files deleted to stay within `max_bytes`.
+        write_errors: Flushes that failed, their rows are lost.
+    """
+
+    logged: int = 0
+    sampled_out: int = 0
+    dropped: int = 0
+    written: int = 0
+    files: int = 0
+    removed_files: int = 0
+    write_errors: int = 0
+
+
+@dataclass
+class _Chunk:
+    """Rides and predictions of one request, as received from the endpoint."""
+
+    timestamp_us: int
+    pickup_location_ids: Sequence[int] | npt.NDArray[np.integer]
+    dropoff_location_ids: Sequence[int] | npt.NDArray[np.integer]
+    trip_distances: Sequence[float] | npt.NDArray[np.floating]
+    predictions: Sequence[float] | npt.NDArray[np.floating]
+    model_version: str
+
+    def __len__(self) -> int:
+        return len(self.predictions)
+
+
+class PredictionLogger:
+    """Logs served predictions to rotating Parquet files without blocking requests.
+
+    `log` only appends references to the request's columns to an in-memory buffer
+    bounded by `max_buffered_rows`: no copy, no lock and no I/O. When the writer
+    falls behind, the rows of a request that do not fit are dropped and counted
+    instead of waiting. An empty buffer takes a whole request, even a columnar
+    batch larger than `max_buffered_rows`, which is then flushed right away. A
+    background task flushes the buffer every `flush_interval` seconds, or as soon
+    as it holds `flush_rows` rows, and writes it in a worker thread as one file:
+    `predictions-<UTC time>-<pid>-<n>.parquet`. Files are written under a hidden
+    temporary name and renamed when complete, so readers never see partial files.
+    The oldest files are deleted when the log exceeds `max_bytes`.
+
+    `log` and `stop` must be called from the event loop. Each uvicorn worker has its
+    own logger, the process ID keeps their file names apart.
+    """
+
+    def __init__(
+        self,
+        log_dir: str | Path,
+        sample_rate: float = 1.0,
+        flush_rows: int = 10_000,
+        flush_interval: float = 60.0,
+        max_buffered_rows: int = 100_000,
+        max_bytes: int = 2**30,
+        seed: int | None = None,
+    ) -> None:
+        if not 0.0 < sample_rate <= 1.0:
+            raise ValueError("sample_rate must be in (0, 1].")
+        self.log_dir = Path(log_dir)
+        self.sample_rate = sample_rate
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_buffered_rows = max_buffered_rows
+        self.max_bytes = max_bytes
+        self.stats = PredictionLogStats()
+        self._random = random.Random(seed)
+        self._rng = np.random.default_rng(seed)
+        self._chunks: list[_Chunk] = []
+        self._buffered_rows = 0
+        self._file_index = 0
+        self._wake: asyncio.Event | None = None
+        self._stopping = False
+        self._task: asyncio.Task[None] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def buffered_rows(self) -> int:
+        return self._buffered_rows
+
+    def log(
+        self,
+        pickup_location_ids: Sequence[int] | npt.NDArray[np.integer],
+        dropoff_location_ids: Sequence[int] | npt.NDArray[np.integer],
+        trip_distances: Sequence[float] | npt.NDArray[np.floating],
+        predictions: Sequence[float] | npt.NDArray[np.floating],
+        model_version: str,
+    ) -> None:
+        """Buffer the rides and predictions of a request; never blocks.
+
+        The columns are kept by reference and must not be modified afterwards. With
+        sampling, a single ride is logged with probability `sample_rate` and the
+        same fraction of the rides of a batch is selected at random.
+        """
+        n = len(predictions)
+        columns = (
+            pickup_location_ids,
+            dropoff_location_ids,
+            trip_distances,
+            predictions,
+        )
+        if self.sample_rate < 1.0:
+            if n == 1:
+                if self._random.random() >= self.sample_rate:
+                    self.stats.sampled_out += 1
+                    return
+            else:
+                mask = self._rng.random(n) < self.sample_rate
+                columns = tuple(np.asarray(column)[mask] for column in columns)
+                self.stats.sampled_out += n - len(columns[-1])
+                n = len(columns[-1])
+                if not n:
+                    return
+
+        free = self.max_buffered_rows - self._buffered_rows
+        if n > free and self._buffered_rows:
+            # The writer is behind: keep the rows that fit, as views
+            if free <= 0:
+                self.stats.dropped += n
+                return
+            columns = tuple(column[:free] for column in columns)
+            self.stats.dropped += n - free
+            n = free
+        self._ensure_running()
+        pickup_location_ids, dropoff_location_ids, trip_distances, predictions = columns
+        self._chunks.append(
+            _Chunk(
+                timestamp_us=time.time_ns() // 1000,
+                pickup_location_ids=pickup_location_ids,
+                dropoff_location_ids=dropoff_location_ids,
+                trip_distances=trip_distances,
+                predictions=predictions,
+                model_version=model_version,
+            )
+        )
+        self._buffered_rows += n
+        self.stats.logged += n
+        if self._buffered_rows >= min(self.flush_rows, self.max_buffered_rows):
+            assert self._wake is not None
+            self._wake.set()
+
+    async def stop(self) -> None:
+        """Flush the buffer and stop the background task."""
+        if self._task is not None and not self._task.done():
+            assert self._wake is not None
+            self._stopping = True
+            self._wake.set()
+            await self._task
+        elif self._chunks:
+            await self._flush()
+        self._task = self._wake = self._loop = None
+        self._stopping = False
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run(self._wake))
+
+    async def _run(self, wake: asyncio.Event) -> None:
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(wake.wait(), self.flush_interval)
+            wake.clear()
+            await self._flush()
+            if self._stopping:
+                return
+
+    async def _flush(self) -> None:
+        chunks, self._chunks = self._chunks, []
+        self._buffered_rows = 0
+        if not chunks:
+            return
+        self._file_index += 1
+        try:
+            await asyncio.to_thread(self._write, chunks, self._file_index)
+        except Exception as e:
+            self.stats.write_errors += 1
+            rows = sum(len(chunk) for chunk in chunks)
+            logger.error(f"Could not write {rows} logged predictions: {e}")
+
+    def _write(self, chunks: list[_Chunk], file_index: int) -> None:
+        """Write chunks as one log file and enforce `max_bytes`, in a worker thread."""
+        import polars as pl
+
+        lengths = [len(chunk) for chunk in chunks]
+        frame = pl.DataFrame(
+            {
+                "timestamp": pl.Series(
+                    np.repeat([chunk.timestamp_us for chunk in chunks], lengths),
+                    dtype=pl.Int64,
+                ).cast(pl.Datetime("us", "UTC")),
+                "PULocationID": _concatenate(chunks, "pickup_location_ids", np.int32),
+                "DOLocationID": _concatenate(chunks, "dropoff_location_ids", np.int32),
+                "trip_distance": _concatenate(chunks, "trip_distances", np.float64),
+                "prediction": _concatenate(chunks, "predictions", np.float64),
+                "model_version": pl.Series(
+                    np.repeat([chunk.model_version for chunk in chunks], lengths),
+                    dtype=pl.Categorical,
+                ),
+            }
+        )
+
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        created = datetime.now(UTC).strftime("%Y%m%dT%H%M%S%fZ")
+        name = f"{LOG_FILE_PREFIX}{created}-{os.getpid()}-{file_index:06d}.parquet"
+        tmp_path = self.log_dir / f".{name}.tmp"
+        frame.write_parquet(tmp_path)
+        os.replace(tmp_path, self.log_dir / name)
+        self.stats.written += frame.height
+        self.stats.files += 1
+        if self.max_bytes > 0:
+            self._remove_old_files()
+
+    def _remove_old_files(self) -> None:
+        files = []
+        for path in sorted(self.log_dir.glob(f"{LOG_FILE_PREFIX}*.parquet")):
+            # other workers may remove files concurrently
+            with contextlib.suppress(FileNotFoundError):
+                files.append((path, path.stat().st_size))
+        total = sum(size for _, size in files)
+        # the newest file is always kept
+        for path, size in files[:-1]:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                path.unlink()
+                self.stats.removed_files += 1
+            total -= size
+
+
+def _concatenate(
+    chunks: list[_Chunk], column: str, dtype: type[np.generic]
+) -> npt.NDArray:
+    return np.concatenate(
+        [np.asarray(getattr(chunk, column), dtype=dtype) for chunk in chunks]
+    )
@@ -0,0 +1,177 @@
+import tempfile
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from types import TracebackType
+
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+from numpy.typing import ArrayLike
+
+# Rough in-memory size of one value per dtype, strings are assumed to be short.
+_DTYPE_BYTES: dict[type[pl.DataType], int] = {
+    pl.Boolean: 1,
+    pl.Int8: 1,
+    pl.UInt8: 1,
+    pl.Int16: 2,
+    pl.UInt16: 2,
+    pl.Int32: 4,
+    pl.UInt32: 4,
+    pl.Float32: 4,
+    pl.Date: 4,
+    pl.Categorical: 4,
+    pl.Enum: 4,
+    pl.String: 32,
+}
+
+
+def estimate_row_bytes(schema: pl.Schema) -> int:
+    """Estimate the in-memory size of one row of a frame with the given schema."""
+    return sum(_DTYPE_BYTES.get(type(dtype), 8) for dtype in schema.dtypes())
+
+
+def batch_rows_for_memory(
+    schema: pl.Schema, max_batch_bytes: int, overhead_factor: float = 4.0
+) -> int:
+    """Number of rows per batch so that one batch stays within `max_batch_bytes`.
+
+    Args:
+        schema: Schema of the frame that is read in batches.
+        max_batch_bytes: Memory budget for a single batch.
+        overhead_factor: Multiplier on the raw row size to account for the Arrow
+            batch, the Polars frame and the encoded feature matrix that coexist
+            while a batch is processed.
+
+    Returns:
+        Rows per batch, at least 1.
+    """
+    row_bytes = estimate_row_bytes(schema) * overhead_factor
+    return max(1, int(max_batch_bytes // row_bytes))
+
+
+class LazyFrameBatches:
+    """Re-iterable record batches of a LazyFrame with bounded peak memory.
+
+    On enter, the query is executed once with the streaming engine and sunk to a
+    temporary parquet file with row groups of `batch_rows` rows. Iterating then
+    reads the file back one record batch at a time, so at most one batch is held
+    in memory, and the batches can be iterated as often as needed (e.g. for several
+    epochs or by XGBoost's external memory iterator). The file is removed on exit.
+
+    Example:
+        with LazyFrameBatches(lf, batch_rows=1_000_000) as batches:
+            for batch in batches:
+                ...
+    """
+
+    def __init__(
+        self,
+        lf: pl.LazyFrame,
+        batch_rows: int | None = None,
+        max_batch_bytes: int | None = None,
+    ) -> None:
+        if batch_rows is None:
+            if max_batch_bytes is None:
+                raise ValueError("One of batch_rows or max_batch_bytes must be set.")
+            batch_rows = batch_rows_for_memory(lf.collect_schema(), max_batch_bytes)
+        if batch_rows < 1:
+            raise ValueError("batch_rows must be at least 1.")
+        self.lf = lf
+        self.batch_rows = batch_rows
+        self._tmp_dir: tempfile.TemporaryDirectory | None = None
+        self._path: Path | None = None
+
+    def __enter__(self) -> "LazyFrameBatches":
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._path = Path(self._tmp_dir.name) / "batches.parquet"
+        self.lf.sink_parquet(
+            self._path, row_group_size=self.batch_rows, engine="streaming"
+        )
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        if self._tmp_dir is not None:
+            self._tmp_dir.cleanup()
+        self._tmp_dir = self._path = None
+
+    @property
+    def num_rows(self) -> int:
+        if self._path is None:
+            raise RuntimeError("LazyFrameBatches must be used as a context manager.")
+        return pq.ParquetFile(self._path).metadata.num_rows
+
+    def __iter__(self) -> Iterator[pl.DataFrame]:
+        if self._path is None:
+            raise RuntimeError("LazyFrameBatches must be used as a context manager.")
+        parquet_file = pq.ParquetFile(self._path)
+        for record_batch in parquet_file.iter_batches(batch_size=self.batch_rows):
+            frame = pl.from_arrow(record_batch)
+            assert isinstance(frame, pl.DataFrame)
+            yield frame
+
+
+@dataclass
+class RegressionStats:
+    """Regression metrics accumulated batch by batch in constant memory.
+
+    The target mean and sum of squares are merged with Chan's parallel algorithm,
+    so the R² is numerically stable even over hundreds of millions of rows.
+    """
+
+    n: int = 0
+    sum_abs_error: float = 0.0
+    sum_squared_error: float = 0.0
+    target_mean: float = 0.0
+    target_m2: float = 0.0
+
+    def update(self, y_true: ArrayLike, y_pred: ArrayLike) -> None:
+        y_true = np.asarray(y_true, dtype=np.float64)
+        y_pred = np.asarray(y_pred, dtype=np.float64)
+        n = y_true.size
+        if n == 0:
+            return
+        errors = y_true - y_pred
+        self.sum_abs_error += float(np.abs(errors).sum())
+        self.sum_squared_error += float(np.square(errors).sum())
+
+        batch_mean = float(y_true.mean())
+        batch_m2 = float(np.square(y_true - batch_mean).sum())
+        total = self.n + n
+        delta = batch_mean - self.target_mean
+        self.target_m2 += batch_m2 + delta**2 * self.n * n / total
+        self.target_mean += delta * n / total
+        self.n = total
+
+    def merge(self, other: "RegressionStats") -> None:
+        """Add the statistics of another accumulator, e.g. of a parallel worker."""
+        if other.n == 0:
+            return
+        total = self.n + other.n
+        delta = other.target_mean - self.target_mean
+        self.sum_abs_error += other.sum_abs_error
+        self.sum_squared_error += other.sum_squared_error
+        self.target_m2 += other.target_m2 + delta**2 * self.n * other.n / total
+        self.target_mean += delta * other.n / total
+        self.n = total
+
+    @property
+    def mean_absolute_error(self) -> float:
+        return self.sum_abs_error / self.n
+
+    @property
+    def mean_squared_error(self) -> float:
+        return self.sum_squared_error / self.n
+
+    @property
+    def root_mean_squared_error(self) -> float:
+        return self.mean_squared_error**0.5
+
+    @property
+    def r2_score(self) -> float:
+        return 1 - self.sum_squared_error / self.target_m2
@@ -1,3 +1,7 @@
+import hashlib
+import os
+import tempfile
+from collections.abc import Callable
 from datetime import datetime
 from pathlib import Path
 from typing import Union
@@ -7,6 +11,7 @@ import mlflow
 import numpy as np
 import numpy.typing as npt
 import polars as pl
+import xgboost
 from loguru import logger
 from prefect import task
 from scipy.sparse import spmatrix
@@ -18,7 +23,28 @@ from sklearn.metrics import (
     root_mean_squared_error,
 )
 
-from e2e_taxi_ride_duration_prediction.models import SklearnCompatibleRegressor
+from e2e_taxi_ride_duration_prediction.features import (
+    ColumnarDictEncoder,
+    fit_dict_vectorizer,
+)
+from e2e_taxi_ride_duration_prediction.lookup_table import (
+    compile_lookup_table,
+    lookup_table_path,
+    save_lookup_table,
+)
+from e2e_taxi_ride_duration_prediction.mmap_model import (
+    compile_mmap_model,
+    mmap_model_path,
+    save_mmap_model,
+)
+from e2e_taxi_ride_duration_prediction.models import (
+    IncrementalRegressor,
+    SklearnCompatibleRegressor,
+)
+from e2e_taxi_ride_duration_prediction.streaming import (
+    LazyFrameBatches,
+    RegressionStats,
+)
 
 pl.Config.set_engine_affinity("streaming")
 
@@ -61,16 +87,21 @@ def dict_vectorize_features(
     test_lf: pl.LazyFrame,
     features: list[str] | None = None,
 ) -> tuple[Union[spmatrix, np.ndarray], Union[spmatrix, np.ndarray], DictVectorizer]:
-    dict_vectorizer = DictVectorizer()
+    """Fit a DictVectorizer on the train features and vectorize train and test.
+
+    The matrices are built column-wise with `ColumnarDictEncoder` and are identical
+    to `DictVectorizer().fit_transform(train_lf.collect().to_dicts())`, without
+    materializing one Python dict per row.
+    """
     if features:
-        train_dicts = train_lf.select(features).collect().to_dicts()
-        test_dicts = test_lf.select(features).collect().to_dicts()
-    else:
-        train_dicts = train_lf.collect().to_dicts()
-        test_dicts = test_lf.collect().to_dicts()
+        train_lf = train_lf.select(features)
+        test_lf = test_lf.select(features)
+    train_df, test_df = pl.collect_all([train_lf, test_lf])
 
-    X_train = dict_vectorizer.fit_transform(train_dicts)
-    X_test = dict_vectorizer.transform(test_dicts)
+    dict_vectorizer = fit_dict_vectorizer(train_df)
+    encoder = ColumnarDictEncoder(dict_vectorizer)
+    X_train = encoder.transform(train_df)
+    X_test = encoder.transform(test_df)
 
     return X_train, X_test, dict_vectorizer
 
@@ -114,6 +145,12 @@ def validate_model(
         "test_root_mean_squared_error": root_mean_squared_error(y_test, y_pred),
     }
     logger.info(f"Results: {results}")
+    _log_metrics_to_mlflow(results)
+
+    return results
+
+
+def _log_metrics_to_mlflow(results: dict[str, float]) -> None:
     try:
         active_run = mlflow.active_run()
         if active_run:
@@ -125,14 +162,227 @@ def validate_model(
     except Exception as e:
         logger.warning(f"Failed to log metrics to MLflow: {e}")
 
+
+@task
+def train_model_streaming(
+    model: IncrementalRegressor,
+    batches: LazyFrameBatches,
+    dict_vectorizer: DictVectorizer,
+    features: list[str],
+    target_column: str = "duration",
+    epochs: int = 1,
+) -> IncrementalRegressor:
+    """Train a model with `partial_fit`, one record batch at a time.
+
+    Only one batch and its encoded feature matrix are in memory at any time, so the
+    peak memory is bounded by the batch size of `batches` instead of the data size.
+
+    Args:
+        model: Regressor supporting `partial_fit`, e.g. `SGDRegressor`.
+        batches: Record batches holding the feature and target columns.
+        dict_vectorizer: Vectorizer fitted on the training features, e.g. with
+            `features.fit_dict_vectorizer` on the lazy training frame.
+        features: Feature columns to encode.
+        target_column: Name of the target column.
+        epochs: Number of passes over the batches.
+
+    Returns:
+        The trained model.
+    """
+    encoder = ColumnarDictEncoder(dict_vectorizer)
+    logger.info(
+        f"Training {type(model).__name__} on batches of {batches.batch_rows} rows"
+    )
+    for epoch in range(epochs):
+        n_rows = 0
+        for batch in batches:
+            X = encoder.transform(batch.select(features))
+            y = batch.get_column(target_column).to_numpy()
+            model.partial_fit(X, y)
+            n_rows += batch.height
+        logger.info(f"Epoch {epoch + 1}/{epochs}: trained on {n_rows} rows")
+    return model
+
+
+class _EncodedBatchIter(xgboost.DataIter):
+    """Feeds encoded record batches to XGBoost's external memory DMatrix."""
+
+    def __init__(
+        self,
+        batches: LazyFrameBatches,
+        encoder: ColumnarDictEncoder,
+        features: list[str],
+        target_column: str,
+        cache_prefix: str,
+    ) -> None:
+        self._batches = batches
+        self._encoder = encoder
+        self._features = features
+        self._target_column = target_column
+        self._iterator = iter(batches)
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data: Callable[..., None]) -> bool:
+        batch = next(self._iterator, None)
+        if batch is None:
+            return False
+        input_data(
+            data=self._encoder.transform(batch.select(self._features)),
+            label=batch.get_column(self._target_column).to_numpy(),
+        )
+        return True
+
+    def reset(self) -> None:
+        self._iterator = iter(self._batches)
+
+
+@task
+def train_xgboost_external_memory(
+    batches: LazyFrameBatches,
+    dict_vectorizer: DictVectorizer,
+    features: list[str],
+    target_column: str = "duration",
+    params: dict | None = None,
+    num_boost_round: int = 100,
+) -> xgboost.XGBRegressor:
+    """Train XGBoost with external memory, one record batch at a time.
+
+    The batches are quantized into an `ExtMemQuantileDMatrix` whose pages are cached
+    on disk, so the training data never has to fit into memory at once.
+
+    Args:
+        batches: Record batches holding the feature and target columns.
+        dict_vectorizer: Vectorizer fitted on the training features.
+        features: Feature columns to encode.
+        target_column: Name of the target column.
+        params: XGBoost booster parameters.
+        num_boost_round: Number of boosting rounds.
+
+    Returns:
+        The trained booster wrapped in a sklearn-compatible XGBRegressor.
+    """
+    encoder = ColumnarDictEncoder(dict_vectorizer)
+    params = {"tree_method": "hist", "objective": "reg:squarederror", **(params or {})}
+    logger.info(f"Training XGBoost on batches of {batches.batch_rows} rows")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        data_iter = _EncodedBatchIter(
+            batches, encoder, features, target_column, str(Path(cache_dir) / "cache")
+        )
+        dtrain = xgboost.ExtMemQuantileDMatrix(data_iter)
+        booster = xgboost.train(params, dtrain, num_boost_round=num_boost_round)
+        # release the on-disk pages before the cache directory is removed
+        del dtrain, data_iter
+
+    model = xgboost.XGBRegressor()
+    model.load_model(bytearray(booster.save_raw(raw_format="ubj")))
+    return model
+
+
+@task
+def validate_model_streaming(
+    model: SklearnCompatibleRegressor,
+    batches: LazyFrameBatches,
+    dict_vectorizer: DictVectorizer,
+    features: list[str],
+    target_column: str = "duration",
+) -> dict[str, float]:
+    """Validate a model batch by batch, with the same metrics as `validate_model`."""
+    encoder = ColumnarDictEncoder(dict_vectorizer)
+    stats = RegressionStats()
+    logger.info("Calculating predictions")
+    for batch in batches:
+        y_pred = model.predict(encoder.transform(batch.select(features)))
+        stats.update(batch.get_column(target_column).to_numpy(), y_pred)
+
+    results = {
+        "test_mean_squared_error": stats.mean_squared_error,
+        "test_mean_absolute_error": stats.mean_absolute_error,
+        "test_r2_score": stats.r2_score,
+        "test_root_mean_squared_error": stats.root_mean_squared_error,
+    }
+    logger.info(f"Results: {results}")
+    _log_metrics_to_mlflow(results)
+
     return results
 
 
 @task
 def save_model_and_vectorizer(
     model: tuple[SklearnCompatibleRegressor, DictVectorizer],
-    save_path: str | Path | None,
+    save_path: str | Path,
 ) -> None:
-    """Save any model and vectorizer pair."""
-    joblib.dump(model, save_path)
+    """Save any model and vectorizer pair.
+
+    The artifact is written to a temporary file first and then moved into place,
+    so a serving process watching `save_path` never reads a partially written file.
+    """
+    save_path = Path(save_path)
+    tmp_path = save_path.with_name(f".{save_path.name}.tmp")
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, save_path)
     logger.info(f"saved model and vectorizer to {save_path}.")
+
+
+@task
+def export_lookup_table(
+    model: tuple[SklearnCompatibleRegressor, DictVectorizer],
+    model_path: str | Path,
+) -> Path | None:
+    """Compile a saved linear pair/distance model into a lookup table for serving.
+
+    The table is written next to the joblib artifact (see `lookup_table_path`) and
+    records the artifact's sha256, so the API only uses it together with the model
+    it was compiled from.
+
+    Args:
+        model: The (model, vectorizer) pair that was saved to `model_path`.
+        model_path: Path of the saved joblib artifact.
+
+    Returns:
+        Path of the lookup table, or None if the model can not be compiled.
+    """
+    regressor, dict_vectorizer = model
+    source_version = hashlib.sha256(Path(model_path).read_bytes()).hexdigest()
+    try:
+        table = compile_lookup_table(regressor, dict_vectorizer, source_version)
+    except ValueError as e:
+        logger.warning(f"Skipping lookup table export: {e}")
+        return None
+
+    table_path = lookup_table_path(model_path)
+    save_lookup_table(table, table_path)
+    logger.info(f"saved lookup table to {table_path}.")
+    return table_path
+
+
+@task
+def export_mmap_model(
+    model: tuple[SklearnCompatibleRegressor, DictVectorizer],
+    model_path: str | Path,
+) -> Path | None:
+    """Export a saved linear pair/distance model as memory-mappable arrays.
+
+    The arrays are written to a directory next to the joblib artifact (see
+    `mmap_model_path`) and record the artifact's sha256, so serving workers only
+    map them together with the model they were compiled from.
+
+    Args:
+        model: The (model, vectorizer) pair that was saved to `model_path`.
+        model_path: Path of the saved joblib artifact.
+
+    Returns:
+        Path of the export, or None if the model can not be exported.
+    """
+    regressor, dict_vectorizer = model
+    source_version = hashlib.sha256(Path(model_path).read_bytes()).hexdigest()
+    try:
+        mmap_model = compile_mmap_model(regressor, dict_vectorizer, source_version)
+    except ValueError as e:
+        logger.warning(f"Skipping memory-mapped model export: {e}")
+        return None
+
+    export_path = mmap_model_path(model_path)
+    save_mmap_model(mmap_model, export_path)
+    logger.info(f"saved memory-mapped model to {export_path}.")
+    return export_path
@@ -0,0 +1,124 @@
+"""Benchmark the cold start of the prediction API.
+
+Measures the import time of the serving app in a fresh interpreter and the time
+from starting a uvicorn server to its first successful /predict response, once
+with the memory-mapped model export and once unpickling the joblib artifact.
+The artifact is copied to a temporary directory and exported there like training
+does. Without an existing --model-path, a model is trained on synthetic data.
+
+Usage:
+    uv run scripts/bench_cold_start.py --repeats 5
+"""
+
+import argparse
+import shutil
+import socket
+import sys
+import tempfile
+from pathlib import Path
+
+from e2e_taxi_ride_duration_prediction.benchmarking import (
+    BenchmarkResult,
+    compare_results,
+    export_serving_artifacts,
+    format_comparisons,
+    format_results,
+    load_results,
+    save_results,
+    time_import,
+    time_to_first_response,
+    train_synthetic_model,
+)
+
+ROOT_DIR = Path(__file__).parent.parent
+DEFAULT_MODEL_PATH = (
+    ROOT_DIR / "models/baseline_taxi_duration_model_and_vectorizer.joblib"
+)
+SERVING_MODULE = "e2e_taxi_ride_duration_prediction.serving.main"
+# Packages the serving fast path must not import
+HEAVY_PACKAGES = ("polars", "sklearn", "scipy", "pyarrow", "prefect", "mlflow")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench(model_path: Path, repeats: int) -> list[BenchmarkResult]:
+    results = []
+    for mode, use_mmap in (("mmap", "1"), ("pickle", "0")):
+        env = {"MODEL_PATH": str(model_path), "MODEL_MMAP": use_mmap}
+
+        import_times = []
+        for _ in range(repeats):
+            elapsed, packages = time_import(SERVING_MODULE, env)
+            import_times.append(elapsed)
+        heavy = [package for package in HEAVY_PACKAGES if package in packages]
+        print(
+            f"{mode}: packages imported by the app: {heavy or 'none of'} {HEAVY_PACKAGES}"
+        )
+        results.append(BenchmarkResult(f"import[{mode}]", 1, import_times))
+
+        first_response_times = []
+        for _ in range(repeats):
+            port = free_port()
+            first_response_times.append(
+                time_to_first_response(
+                    [
+                        sys.executable,
+                        "-m",
+                        "uvicorn",
+                        f"{SERVING_MODULE}:app",
+                        "--port",
+                        str(port),
+                    ],
+                    f"http://127.0.0.1:{port}/predict",
+                    {"PULocationID": 132, "DOLocationID": 148, "trip_distance": 3.1},
+                    env,
+                )
+            )
+        results.append(
+            BenchmarkResult(
+                f"time_to_first_prediction[{mode}]", 1, first_response_times
+            )
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--model-path", type=Path, default=DEFAULT_MODEL_PATH)
+    parser.add_argument(
+        "--output", type=Path, default=Path("benchmarks/cold_start.json")
+    )
+    parser.add_argument("--compare", type=Path, help="Baseline results to compare to")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        model_path = Path(temp_dir) / "model.joblib"
+        if args.model_path.exists():
+            shutil.copyfile(args.model_path, model_path)
+            export_serving_artifacts(model_path)
+        else:
+            train_synthetic_model(model_path)
+        results = bench(model_path, args.repeats)
+
+    print(format_results(results))
+    save_results(results, args.output, {"repeats": args.repeats})
+
+    if args.compare:
+        comparisons = compare_results(
+            load_results(args.compare), results, args.threshold, statistic="median"
+        )
+        print(format_comparisons(comparisons))
+        if any(comparison.regression for comparison in comparisons):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
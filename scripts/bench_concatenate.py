@@ -0,0 +1,100 @@
+"""Benchmark the global and the monthly sort of concatenate_parquet_files.
+
+Writes synthetic monthly files that look like the TLC files (almost sorted by
+pickup time, with a few trips from other months), concatenates them with both
+sort modes and times a one-week date filter on each output.
+
+Usage:
+    uv run scripts/bench_concatenate.py --months 12 --rows-per-month 2000000
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+
+from e2e_taxi_ride_duration_prediction.ingestion import concatenate_parquet_files
+
+
+def write_synthetic_months(
+    directory: Path, months: int, rows_per_month: int, seed: int = 42
+) -> list[Path]:
+    rng = np.random.default_rng(seed)
+    paths = []
+    for month in range(1, months + 1):
+        start = datetime(2023 + (month - 1) // 12, (month - 1) % 12 + 1, 1)
+        seconds = np.sort(rng.integers(0, 28 * 24 * 3600, rows_per_month))
+        # local disorder plus ~0.1% of trips from other months, like the raw files
+        seconds += rng.integers(-600, 600, rows_per_month)
+        strays = rng.random(rows_per_month) < 0.001
+        seconds[strays] += rng.integers(-90, 90, strays.sum()) * 24 * 3600
+        pickup = pl.Series(
+            "tpep_pickup_datetime",
+            (np.datetime64(start, "s") + seconds.astype("timedelta64[s]")).astype(
+                "datetime64[us]"
+            ),
+        )
+        path = directory / f"yellow_tripdata_{start:%Y-%m}.parquet"
+        pl.DataFrame(
+            {
+                "tpep_pickup_datetime": pickup,
+                "tpep_dropoff_datetime": pickup + timedelta(minutes=15),
+                "PULocationID": rng.integers(1, 266, rows_per_month),
+                "DOLocationID": rng.integers(1, 266, rows_per_month),
+                "trip_distance": rng.exponential(3.0, rows_per_month),
+            }
+        ).write_parquet(path)
+        paths.append(path)
+    return paths
+
+
+def time_filter(path: Path) -> float:
+    start = time.perf_counter()
+    pl.scan_parquet(path).filter(
+        pl.col("tpep_pickup_datetime").is_between(
+            datetime(2023, 3, 1), datetime(2023, 3, 8), closed="left"
+        )
+    ).select(pl.len()).collect()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--rows-per-month", type=int, default=1_000_000)
+    parser.add_argument("--row-group-size", type=int, default=250_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = Path(temp_dir)
+        file_paths = write_synthetic_months(directory, args.months, args.rows_per_month)
+
+        print(f"{'mode':<10}{'concatenate [s]':>18}{'filter [s]':>14}{'sorted':>10}")
+        for sort_mode in ("global", "monthly"):
+            output_path = directory / f"{sort_mode}.parquet"
+            start = time.perf_counter()
+            concatenate_parquet_files(
+                file_paths,
+                output_path,
+                sort_mode=sort_mode,
+                row_group_size=args.row_group_size,
+            )
+            elapsed = time.perf_counter() - start
+            filter_time = min(time_filter(output_path) for _ in range(3))
+            pickup = pl.read_parquet(output_path, columns=["tpep_pickup_datetime"])
+            is_sorted = pickup.to_series().is_sorted()
+            assert pq.ParquetFile(output_path).metadata.num_rows == len(pickup)
+            print(
+                f"{sort_mode:<10}{elapsed:>18.2f}{filter_time:>14.3f}{is_sorted!s:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
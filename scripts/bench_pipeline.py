@@ -0,0 +1,148 @@
+"""Benchmark the training and monitoring pipeline stages on synthetic data.
+
+Times basic_preprocessing, feature_preprocessing, dict_vectorize_features,
+train_model and add_predictions_to_data at several scales and saves the results as JSON. With
+--compare, the results are checked against an earlier run and the script exits
+with status 1 if a stage got slower than the threshold.
+
+The stages are called through `.fn`, so the Prefect overhead of the stage itself
+is not part of the timings (tasks called inside a stage, e.g. by
+add_predictions_to_data, still run through Prefect). Lazy stages are timed
+including their `.collect()`.
+
+Usage:
+    uv run scripts/bench_pipeline.py --scales 10000,100000,1000000
+    uv run scripts/bench_pipeline.py --compare benchmarks/pipeline.json
+"""
+
+import argparse
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import polars as pl
+from sklearn.linear_model import LinearRegression
+
+from e2e_taxi_ride_duration_prediction.benchmarking import (
+    BenchmarkResult,
+    compare_results,
+    format_comparisons,
+    format_results,
+    load_results,
+    save_results,
+    time_function,
+    write_taxi_data,
+)
+from e2e_taxi_ride_duration_prediction.monitoring import add_predictions_to_data
+from e2e_taxi_ride_duration_prediction.preprocessing import (
+    basic_preprocessing,
+    feature_preprocessing,
+)
+from e2e_taxi_ride_duration_prediction.training import (
+    dict_vectorize_features,
+    train_model,
+    vectorize_target,
+)
+
+FEATURES = ["pickup_dropoff_pair_id", "trip_distance"]
+TARGET = "duration"
+START = datetime(2025, 1, 1)
+SPLIT = datetime(2025, 1, 22)
+END = datetime(2025, 1, 29)
+
+
+def bench_scale(n_rows: int, directory: Path, repeats: int) -> list[BenchmarkResult]:
+    data_path = write_taxi_data(directory / f"taxi_{n_rows}.parquet", n_rows)
+    lf = pl.scan_parquet(data_path)
+    results = []
+
+    processed_lf = basic_preprocessing.fn(lf, START, END)
+    results.append(
+        time_function(
+            "basic_preprocessing", processed_lf.collect, n_rows, repeats=repeats
+        )
+    )
+
+    pruned_lf = feature_preprocessing.fn(lf, START, END, FEATURES, TARGET)
+    results.append(
+        time_function(
+            "feature_preprocessing", pruned_lf.collect, n_rows, repeats=repeats
+        )
+    )
+
+    processed = pruned_lf.collect().lazy()
+    train_lf = processed.filter(pl.col("tpep_pickup_datetime") < SPLIT)
+    test_lf = processed.filter(pl.col("tpep_pickup_datetime") >= SPLIT)
+    results.append(
+        time_function(
+            "dict_vectorize_features",
+            lambda: dict_vectorize_features.fn(train_lf, test_lf, FEATURES),
+            n_rows,
+            repeats=repeats,
+        )
+    )
+
+    X_train, _, dict_vectorizer = dict_vectorize_features.fn(
+        train_lf, test_lf, FEATURES
+    )
+    y_train, _ = vectorize_target.fn(train_lf.select(TARGET), test_lf.select(TARGET))
+    results.append(
+        time_function(
+            "train_model",
+            lambda: train_model.fn(LinearRegression(), X_train, y_train),
+            X_train.shape[0],
+            repeats=repeats,
+        )
+    )
+
+    model = train_model.fn(LinearRegression(), X_train, y_train)
+    model_path = directory / f"model_{n_rows}.joblib"
+    joblib.dump((model, dict_vectorizer), model_path)
+    results.append(
+        time_function(
+            "add_predictions_to_data",
+            lambda: add_predictions_to_data.fn(lf, model_path).collect(),
+            n_rows,
+            repeats=repeats,
+        )
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--scales",
+        default="10000,100000,1000000",
+        help="Comma separated numbers of rows, e.g. 10000,1000000,50000000",
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=Path("benchmarks/pipeline.json"))
+    parser.add_argument("--compare", type=Path, help="Baseline results to compare to")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(",")]
+    results = []
+    with pl.StringCache(), tempfile.TemporaryDirectory() as temp_dir:
+        for n_rows in scales:
+            results.extend(bench_scale(n_rows, Path(temp_dir), args.repeats))
+
+    print(format_results(results))
+    save_results(results, args.output, {"scales": scales, "repeats": args.repeats})
+
+    if args.compare:
+        comparisons = compare_results(
+            load_results(args.compare), results, args.threshold
+        )
+        print(format_comparisons(comparisons))
+        if any(comparison.regression for comparison in comparisons):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Benchmark /predict latency and throughput under concurrent load.
+
+By default the FastAPI app is benchmarked in-process through an ASGI transport, so
+no server needs to run; pass --url to benchmark a running server instead. Without
+an existing --model-path, a model is trained on synthetic data first.
+
+Usage:
+    uv run scripts/bench_serving.py --requests 5000 --concurrency 1,16,64
+    uv run scripts/bench_serving.py --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+import httpx
+
+from e2e_taxi_ride_duration_prediction.benchmarking import (
+    BenchmarkResult,
+    compare_results,
+    format_comparisons,
+    generate_taxi_data,
+    load_results,
+    run_concurrent_load,
+    save_results,
+    train_synthetic_model,
+)
+from e2e_taxi_ride_duration_prediction.serving.columnar import ARROW_STREAM_MEDIA_TYPE
+
+ROOT_DIR = Path(__file__).parent.parent
+DEFAULT_MODEL_PATH = (
+    ROOT_DIR / "models/baseline_taxi_duration_model_and_vectorizer.joblib"
+)
+
+
+def in_process_client(model_path: Path) -> httpx.AsyncClient:
+    from e2e_taxi_ride_duration_prediction.serving.main import app
+    from e2e_taxi_ride_duration_prediction.serving.model_holder import ModelHolder
+
+    app.state.model_holder = ModelHolder(model_path)
+    app.state.model_holder.load()
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench"
+    )
+
+
+async def bench(
+    client: httpx.AsyncClient,
+    n_requests: int,
+    concurrencies: list[int],
+    batch_size: int,
+) -> list[BenchmarkResult]:
+    rides = generate_taxi_data(max(n_requests, batch_size), seed=1)
+    pickup = rides["PULocationID"].to_list()
+    dropoff = rides["DOLocationID"].to_list()
+    distance = rides["trip_distance"].to_list()
+
+    async def predict(i: int) -> None:
+        response = await client.post(
+            "/predict",
+            json={
+                "PULocationID": pickup[i],
+                "DOLocationID": dropoff[i],
+                "trip_distance": distance[i],
+            },
+        )
+        response.raise_for_status()
+
+    batch = {
+        "PULocationID": pickup[:batch_size],
+        "DOLocationID": dropoff[:batch_size],
+        "trip_distance": distance[:batch_size],
+    }
+
+    async def predict_batch(i: int) -> None:
+        response = await client.post("/predict/batch", json=batch)
+        response.raise_for_status()
+
+    arrow_batch = rides.head(batch_size).write_ipc_stream(None).getvalue()
+
+    async def predict_batch_arrow(i: int) -> None:
+        response = await client.post(
+            "/predict/batch",
+            content=arrow_batch,
+            headers={"content-type": ARROW_STREAM_MEDIA_TYPE},
+        )
+        response.raise_for_status()
+
+    # warmup
+    await run_concurrent_load("warmup", predict, min(100, n_requests), 1)
+
+    results = []
+    for concurrency in concurrencies:
+        results.append(
+            await run_concurrent_load("predict", predict, n_requests, concurrency)
+        )
+    results.append(
+        await run_concurrent_load(
+            f"predict_batch[size={batch_size}]",
+            predict_batch,
+            max(10, n_requests // batch_size),
+            1,
+        )
+    )
+    results.append(
+        await run_concurrent_load(
+            f"predict_batch_arrow[size={batch_size}]",
+            predict_batch_arrow,
+            max(10, n_requests // batch_size),
+            1,
+        )
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--url", help="Benchmark a running server at this URL")
+    parser.add_argument("--model-path", type=Path, default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--output", type=Path, default=Path("benchmarks/serving.json"))
+    parser.add_argument("--compare", type=Path, help="Baseline results to compare to")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    concurrencies = [int(c) for c in args.concurrency.split(",")]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        else:
+            model_path = args.model_path
+            if not model_path.exists():
+                model_path = train_synthetic_model(Path(temp_dir) / "model.joblib")
+            client = in_process_client(model_path)
+
+        async def run() -> list[BenchmarkResult]:
+            async with client:
+                return await bench(
+                    client, args.requests, concurrencies, args.batch_size
+                )
+
+        results = asyncio.run(run())
+
+    print(
+        f"{'benchmark':<55}{'rps':>10}{'p50 [ms]':>10}{'p95 [ms]':>10}{'p99 [ms]':>10}"
+    )
+    for result in results:
+        print(
+            f"{result.key:<55}{result.extra['throughput_rps']:>10.0f}"
+            f"{result.extra['p50_ms']:>10.2f}{result.extra['p95_ms']:>10.2f}"
+            f"{result.extra['p99_ms']:>10.2f}"
+        )
+    save_results(
+        results,
+        args.output,
+        {"url": args.url or "in-process", "concurrency": concurrencies},
+    )
+
+    if args.compare:
+        comparisons = compare_results(
+            load_results(args.compare), results, args.threshold, statistic="median"
+        )
+        print(format_comparisons(comparisons))
+        if any(comparison.regression for comparison in comparisons):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Monitor drift and errors of the predictions logged by the API over sliding windows.
+
+The prediction log is polled in the background and the current metrics of every
+window are served as JSON. The reference profile is computed once from the
+reference data and cached next to the model artifact. The log has no target:
+with `--trips`, new log files are joined with the durations of the completed trips
+so that MAE and RMSE are tested too.
+
+Usage:
+    uv run scripts/monitor_predictions.py data/reference.parquet
+    uv run scripts/monitor_predictions.py "data/raw/yellow_tripdata/year=2025/month=3/*.parquet" \
+        --log-dir logs/predictions --windows 1h,1d,7d --alert-webhook http://localhost:9000/alerts \
+        --trips "data/raw/yellow_tripdata/**/*.parquet"
+    curl localhost:8001/windows/1h
+"""
+
+import argparse
+from pathlib import Path
+
+import polars as pl
+import uvicorn
+from loguru import logger
+
+from e2e_taxi_ride_duration_prediction.continuous_monitoring import (
+    PredictionLogReader,
+    SlidingWindowMonitor,
+    create_app,
+    log_alert,
+    parse_window,
+    webhook_alert_hook,
+)
+from e2e_taxi_ride_duration_prediction.monitoring import cached_reference_profile
+from e2e_taxi_ride_duration_prediction.scoring import resolve_input_paths
+from e2e_taxi_ride_duration_prediction.serving.model_holder import ModelHolder
+
+ROOT_DIR = Path(__file__).parent.parent
+DEFAULT_MODEL_PATH = (
+    ROOT_DIR / "models/baseline_taxi_duration_model_and_vectorizer.joblib"
+)
+
+logger.add("logs/monitor_predictions.log")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("reference_data", help="Parquet file or glob of the reference")
+    parser.add_argument("--model-path", default=str(DEFAULT_MODEL_PATH))
+    parser.add_argument("--log-dir", default=str(ROOT_DIR / "logs/predictions"))
+    parser.add_argument(
+        "--windows", default="1h,1d,7d", help="Comma-separated window lengths"
+    )
+    parser.add_argument("--bucket", default="5m", help="Time resolution of windows")
+    parser.add_argument("--poll-interval", type=float, default=30.0)
+    parser.add_argument("--min-rows", type=int, default=1000)
+    parser.add_argument("--alert-webhook", help="URL the alerts are posted to")
+    parser.add_argument(
+        "--trips",
+        help="Parquet glob of completed trips, their durations enable the error tests",
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    reference = cached_reference_profile(
+        args.reference_data, args.model_path, ModelHolder(args.model_path)
+    )
+    monitor = SlidingWindowMonitor(
+        reference,
+        windows={window: parse_window(window) for window in args.windows.split(",")},
+        bucket=parse_window(args.bucket),
+        min_rows=args.min_rows,
+        alert_hook=(
+            webhook_alert_hook(args.alert_webhook) if args.alert_webhook else log_alert
+        ),
+        trips=(
+            (lambda: pl.scan_parquet(resolve_input_paths(args.trips)))
+            if args.trips
+            else None
+        ),
+    )
+    app = create_app(monitor, PredictionLogReader(args.log_dir), args.poll_interval)
+    uvicorn.run(app, host=args.host, port=args.port)
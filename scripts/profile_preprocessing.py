@@ -0,0 +1,113 @@
+"""Report bytes read and memory per stage of both preprocessing modes.
+
+Writes synthetic data, then runs the stages of basic_preprocessing and of the
+column-pruned feature_preprocessing one at a time and prints the parquet bytes
+each mode reads, the size of each stage output and the peak resident memory. Each
+mode runs in its own process, so the peak memory of one does not hide the other.
+
+Usage:
+    uv run scripts/profile_preprocessing.py --rows 10000000
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+from e2e_taxi_ride_duration_prediction.benchmarking import (
+    format_stage_reports,
+    parquet_bytes_read,
+    profile_stages,
+    write_taxi_data,
+)
+from e2e_taxi_ride_duration_prediction.preprocessing import (
+    calculate_duration,
+    cast_categorical_columns,
+    cast_location_ids,
+    create_pickup_dropoff_pair_enum,
+    create_pickup_dropoff_pairs,
+    filter_by_date_range,
+    filter_partitions,
+    filter_valid_durations,
+    required_columns,
+)
+
+FEATURES = ["pickup_dropoff_pair", "trip_distance"]
+TARGET = "duration"
+START = datetime(2025, 1, 8)
+END = datetime(2025, 1, 15)
+
+
+def profile(path: Path, mode: str) -> None:
+    lf = pl.scan_parquet(path)
+    if mode == "basic":
+        stages = [
+            ("scan (all columns)", lambda lf: lf),
+            ("calculate_duration", calculate_duration.fn),
+            (
+                "filter_by_date_range",
+                lambda lf: filter_by_date_range.fn(lf, START, END),
+            ),
+            ("filter_valid_durations", filter_valid_durations.fn),
+            ("cast_categorical_columns", cast_categorical_columns.fn),
+            ("create_pickup_dropoff_pairs", create_pickup_dropoff_pairs.fn),
+        ]
+        bytes_read = parquet_bytes_read([path])
+    else:
+        columns = required_columns(FEATURES, TARGET)
+        stages = [
+            (
+                "scan (pruned, date filtered)",
+                lambda lf: filter_by_date_range.fn(
+                    filter_partitions.fn(lf, START, END).select(columns), START, END
+                ),
+            ),
+            ("calculate_duration", calculate_duration.fn),
+            ("filter_valid_durations", filter_valid_durations.fn),
+            ("cast_location_ids", cast_location_ids.fn),
+            ("create_pickup_dropoff_pair_enum", create_pickup_dropoff_pair_enum.fn),
+            (
+                "select features",
+                lambda lf: lf.select(["tpep_pickup_datetime", *FEATURES, TARGET]),
+            ),
+        ]
+        bytes_read = parquet_bytes_read(
+            [path], columns, "tpep_pickup_datetime", START, END
+        )
+
+    with pl.StringCache():
+        reports = profile_stages(lf, stages, bytes_read)
+    print(f"\n{mode} mode")
+    print(format_stage_reports(reports))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--path", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=["basic", "feature"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        profile(args.path, args.mode)
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = write_taxi_data(
+            Path(temp_dir) / "taxi.parquet", args.rows, chunk_rows=500_000
+        )
+        for mode in ("basic", "feature"):
+            subprocess.run(
+                [sys.executable, __file__, "--path", str(path), "--mode", mode],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Score historical taxi rides from parquet files with a trained model.
+
+The rides are streamed in record batches, scored in parallel by a pool of worker
+processes and written as a month-partitioned parquet dataset with a `prediction`
+column. Memory stays bounded by the batch size, whatever the size of the input.
+
+Usage:
+    uv run scripts/score_batch.py "data/raw/yellow_tripdata/year=2025/**/*.parquet"
+    uv run scripts/score_batch.py "data/raw/**/*.parquet" --output data/scored \
+        --columns tpep_pickup_datetime,fare_amount --workers 8
+"""
+
+import argparse
+from pathlib import Path
+
+from loguru import logger
+from prefect import flow
+
+from e2e_taxi_ride_duration_prediction.scoring import (
+    ScoringReport,
+    resolve_input_paths,
+    score_parquet_files,
+)
+
+ROOT_DIR = Path(__file__).parent.parent
+DEFAULT_MODEL_PATH = (
+    ROOT_DIR / "models/baseline_taxi_duration_model_and_vectorizer.joblib"
+)
+
+logger.add("logs/score_batch.log")
+
+
+@flow
+def main(
+    input_glob: str,
+    model_path: str = str(DEFAULT_MODEL_PATH),
+    output_dir: str = str(ROOT_DIR / "data/scored"),
+    columns: list[str] | None = None,
+    partition_by: list[str] | None = ["year", "month"],
+    batch_rows: int = 1_000_000,
+    max_workers: int | None = None,
+    overwrite: bool = False,
+) -> ScoringReport:
+    """Score all parquet files matching `input_glob` into `output_dir`.
+
+    See `scoring.score_parquet_files` for the parameters.
+    """
+    input_paths = resolve_input_paths(input_glob)
+    logger.info(f"Scoring {len(input_paths)} files with {model_path}")
+    return score_parquet_files(
+        input_paths,
+        model_path,
+        output_dir,
+        columns=columns,
+        partition_by=partition_by,
+        batch_rows=batch_rows,
+        max_workers=max_workers,
+        overwrite=overwrite,
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("input_glob", help="Parquet files to score, ** is recursive")
+    parser.add_argument("--model-path", default=str(DEFAULT_MODEL_PATH))
+    parser.add_argument("--output", default=str(ROOT_DIR / "data/scored"))
+    parser.add_argument(
+        "--columns", help="Comma-separated input columns to keep, all by default"
+    )
+    parser.add_argument(
+        "--partition-by",
+        default="year,month",
+        help="Comma-separated partition columns, empty for a flat directory",
+    )
+    parser.add_argument("--batch-rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, help="Defaults to the number of CPUs")
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Replace the contents of a non-empty output directory",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(
+        args.input_glob,
+        model_path=args.model_path,
+        output_dir=args.output,
+        columns=args.columns.split(",") if args.columns else None,
+        partition_by=[c for c in args.partition_by.split(",") if c],
+        batch_rows=args.batch_rows,
+        max_workers=args.workers,
+        overwrite=args.overwrite,
+    )
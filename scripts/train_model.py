@@ -7,21 +7,43 @@ import mlflow
 from loguru import logger
 from prefect import flow
 from sklearn.feature_extraction import DictVectorizer
-from sklearn.linear_model import LinearRegression
+from sklearn.linear_model import LinearRegression, SGDRegressor
 
-from e2e_taxi_ride_duration_prediction.ingestion import get_nyc_taxi_data
+from e2e_taxi_ride_duration_prediction.feature_cache import (
+    CachedFeatures,
+    FeatureCache,
+    pipeline_fingerprint,
+)
+from e2e_taxi_ride_duration_prediction.features import fit_dict_vectorizer
+from e2e_taxi_ride_duration_prediction.ingestion import (
+    generate_year_month_tuples,
+    get_nyc_taxi_data,
+    get_partition_paths,
+)
 from e2e_taxi_ride_duration_prediction.mlflow_utils import setup_mlflow
 from e2e_taxi_ride_duration_prediction.models import SklearnCompatibleRegressor
-from e2e_taxi_ride_duration_prediction.preprocessing import basic_preprocessing
+from e2e_taxi_ride_duration_prediction.preprocessing import (
+    feature_preprocessing,
+    filter_by_date_range,
+)
+from e2e_taxi_ride_duration_prediction.streaming import LazyFrameBatches
 from e2e_taxi_ride_duration_prediction.training import (
     dict_vectorize_features,
+    export_lookup_table,
+    export_mmap_model,
     save_model_and_vectorizer,
     time_series_train_test_split,
     train_model,
+    train_model_streaming,
+    train_xgboost_external_memory,
     validate_model,
+    validate_model_streaming,
     vectorize_target,
 )
 
+FEATURES = ["pickup_dropoff_pair_id", "trip_distance"]
+TARGET = "duration"
+
 logger.add("logs/train_model.log")
 
 
@@ -37,8 +59,26 @@ def main(
     test_start_month: int = 2,
     test_end_year: int = 2025,
     test_end_month: int = 3,
+    streaming: bool = False,
+    streaming_model: str = "sgd",
+    batch_rows: int | None = 1_000_000,
+    max_batch_bytes: int | None = None,
+    use_feature_cache: bool = True,
+    feature_cache_max_bytes: int = 10 * 2**30,
 ) -> tuple[SklearnCompatibleRegressor, dict[str, float], DictVectorizer]:
-    """Run the complete ML training pipeline with configurable parameters."""
+    """Run the complete ML training pipeline with configurable parameters.
+
+    With `streaming=True` the data is never collected as a whole: it is processed in
+    record batches of `batch_rows` rows (or as many rows as fit into
+    `max_batch_bytes` if `batch_rows` is None) and an incremental model is trained,
+    `SGDRegressor.partial_fit` for `streaming_model="sgd"` or XGBoost with external
+    memory for `streaming_model="xgboost"`. Use this for multi-year date ranges.
+
+    Without streaming, the vectorized train/test data is cached under
+    `data/cache/features`, keyed by the input partitions, the date ranges and the
+    features. Repeated runs on unchanged data skip straight to training, set
+    `use_feature_cache=False` to always recompute.
+    """
     ROOT_DIR = Path(__file__).parent.parent
     MODEL_DIR = ROOT_DIR / "models"
 
@@ -58,40 +98,123 @@ def main(
 
         # Preprocessing
         logger.info("Preprocessing data")
-        processed_lf = basic_preprocessing(
+        processed_lf = feature_preprocessing(
             lf,
             start=datetime(start_year, start_month, 1),
             end=datetime(end_year, end_month, 28),
+            features=FEATURES,
+            target=TARGET,
         )
 
-        # Train/test split
-        logger.info("Creating train/test split")
-        X_train, X_test, y_train, y_test = time_series_train_test_split(
-            processed_lf,
-            train_start=datetime(start_year, start_month, 1),
-            test_start=datetime(test_start_year, test_start_month, 1),
-            test_end=datetime(test_end_year, test_end_month, 1),
-            train_end=datetime(train_end_year, train_end_month, 1),
-        )
-
-        # Vectorization
-        logger.info("Vectorizing features")
-        X_train_vec, X_test_vec, fitted_dict_vectorizer = dict_vectorize_features(
-            X_train, X_test, features=["pickup_dropoff_pair", "trip_distance"]
-        )
-        y_train_vec, y_test_vec = vectorize_target(y_train, y_test)
-
-        # Training
-        logger.info("Training model")
-        model = train_model(LinearRegression(), X_train_vec, y_train_vec)
-
-        # Evaluation
-        logger.info("Evaluating model")
-        results = validate_model(model, X_test_vec, y_test_vec)
+        if streaming:
+            # Bounded-memory train/test windows, each read back in record batches
+            train_lf = filter_by_date_range(
+                processed_lf,
+                datetime(start_year, start_month, 1),
+                datetime(train_end_year, train_end_month, 1),
+            ).select([*FEATURES, TARGET])
+            test_lf = filter_by_date_range(
+                processed_lf,
+                datetime(test_start_year, test_start_month, 1),
+                datetime(test_end_year, test_end_month, 1),
+            ).select([*FEATURES, TARGET])
+
+            logger.info("Fitting vectorizer on the unique training feature values")
+            fitted_dict_vectorizer = fit_dict_vectorizer(train_lf.select(FEATURES))
+
+            logger.info("Training model on record batches")
+            with LazyFrameBatches(train_lf, batch_rows, max_batch_bytes) as batches:
+                if streaming_model == "xgboost":
+                    model = train_xgboost_external_memory(
+                        batches, fitted_dict_vectorizer, FEATURES, TARGET
+                    )
+                elif streaming_model == "sgd":
+                    model = train_model_streaming(
+                        SGDRegressor(),
+                        batches,
+                        fitted_dict_vectorizer,
+                        FEATURES,
+                        TARGET,
+                    )
+                else:
+                    raise ValueError(f"Unknown streaming model: {streaming_model}")
+
+            logger.info("Evaluating model on record batches")
+            with LazyFrameBatches(test_lf, batch_rows, max_batch_bytes) as batches:
+                results = validate_model_streaming(
+                    model, batches, fitted_dict_vectorizer, FEATURES, TARGET
+                )
+        else:
+            feature_cache = FeatureCache(
+                ROOT_DIR / "data/cache/features", feature_cache_max_bytes
+            )
+            year_month_tuples = generate_year_month_tuples(
+                (start_year, start_month), (end_year, end_month)
+            )
+            cache_key = pipeline_fingerprint(
+                [
+                    path
+                    for path in get_partition_paths(ROOT_DIR, year_month_tuples)
+                    if path.exists()
+                ],
+                start=(start_year, start_month),
+                end=(end_year, end_month),
+                train_end=(train_end_year, train_end_month),
+                test_start=(test_start_year, test_start_month),
+                test_end=(test_end_year, test_end_month),
+                features=FEATURES,
+                target=TARGET,
+            )
+            cached = feature_cache.get(cache_key) if use_feature_cache else None
+
+            if cached is None:
+                # Train/test split
+                logger.info("Creating train/test split")
+                X_train, X_test, y_train, y_test = time_series_train_test_split(
+                    processed_lf,
+                    train_start=datetime(start_year, start_month, 1),
+                    test_start=datetime(test_start_year, test_start_month, 1),
+                    test_end=datetime(test_end_year, test_end_month, 1),
+                    train_end=datetime(train_end_year, train_end_month, 1),
+                )
+
+                # Vectorization
+                logger.info("Vectorizing features")
+                X_train_vec, X_test_vec, fitted_dict_vectorizer = (
+                    dict_vectorize_features(X_train, X_test, features=FEATURES)
+                )
+                y_train_vec, y_test_vec = vectorize_target(y_train, y_test)
+
+                if use_feature_cache:
+                    feature_cache.put(
+                        cache_key,
+                        CachedFeatures(
+                            X_train_vec,
+                            X_test_vec,
+                            y_train_vec,
+                            y_test_vec,
+                            fitted_dict_vectorizer,
+                        ),
+                    )
+            else:
+                logger.info("Using cached vectorized features")
+                X_train_vec, X_test_vec = cached.X_train, cached.X_test
+                y_train_vec, y_test_vec = cached.y_train, cached.y_test
+                fitted_dict_vectorizer = cached.dict_vectorizer
+
+            # Training
+            logger.info("Training model")
+            model = train_model(LinearRegression(), X_train_vec, y_train_vec)
+
+            # Evaluation
+            logger.info("Evaluating model")
+            results = validate_model(model, X_test_vec, y_test_vec)
 
         # Save outputs
         model_path = MODEL_DIR / "baseline_taxi_duration_model_and_vectorizer.joblib"
         save_model_and_vectorizer((model, fitted_dict_vectorizer), model_path)
+        export_lookup_table((model, fitted_dict_vectorizer), model_path)
+        export_mmap_model((model, fitted_dict_vectorizer), model_path)
 
         logger.info(f"Model saved: {model_path}")
 
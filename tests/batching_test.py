@@ -0,0 +1,175 @@
+import asyncio
+from collections.abc import Sequence
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+
+from e2e_taxi_ride_duration_prediction.serving.batching import (
+    BatchingStats,
+    MicroBatcher,
+)
+from e2e_taxi_ride_duration_prediction.serving.executor import InferenceQueueFullError
+
+
+class RecordingPredictor:
+    def __init__(self) -> None:
+        self.batch_sizes: list[int] = []
+
+    def __call__(
+        self,
+        pickup_ids: Sequence[int],
+        dropoff_ids: Sequence[int],
+        distances: Sequence[float],
+    ) -> npt.NDArray[np.float64]:
+        self.batch_sizes.append(len(distances))
+        return np.asarray(pickup_ids, dtype=np.float64) + np.asarray(distances)
+
+
+def test_micro_batcher_coalesces_concurrent_calls():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, max_batch_size=8, max_wait_ms=50)
+
+    async def run() -> list[float]:
+        results = list(
+            await asyncio.gather(*(batcher.submit(i, 0, 0.5) for i in range(5)))
+        )
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+
+    assert results == [i + 0.5 for i in range(5)]
+    assert predictor.batch_sizes == [5]
+    assert batcher.stats.batches == 1
+    assert batcher.stats.items == 5
+    assert batcher.stats.max_batch_size == 5
+    assert batcher.stats.batch_sizes == {8: 1}
+
+
+def test_micro_batcher_respects_max_batch_size():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, max_batch_size=4, max_wait_ms=50)
+
+    async def run() -> list[float]:
+        results = list(
+            await asyncio.gather(*(batcher.submit(i, 0, 0.0) for i in range(10)))
+        )
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+
+    assert results == [float(i) for i in range(10)]
+    assert predictor.batch_sizes == [4, 4, 2]
+    assert batcher.stats.mean_batch_size == pytest.approx(10 / 3)
+
+
+def test_micro_batcher_propagates_errors():
+    def failing_predictor(
+        pickup_ids: Sequence[int],
+        dropoff_ids: Sequence[int],
+        distances: Sequence[float],
+    ) -> npt.NDArray[np.float64]:
+        raise RuntimeError("model exploded")
+
+    batcher = MicroBatcher(failing_predictor, max_batch_size=4, max_wait_ms=1)
+
+    async def run() -> None:
+        try:
+            await batcher.submit(1, 2, 3.0)
+        finally:
+            await batcher.stop()
+
+    with pytest.raises(RuntimeError, match="model exploded"):
+        asyncio.run(run())
+
+
+def test_micro_batcher_predicts_batches_concurrently():
+    running = 0
+    max_running = 0
+
+    async def slow_predictor(
+        pickup_ids: Sequence[int],
+        dropoff_ids: Sequence[int],
+        distances: Sequence[float],
+    ) -> npt.NDArray[np.float64]:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return np.asarray(pickup_ids, dtype=np.float64)
+
+    batcher = MicroBatcher(
+        slow_predictor, max_batch_size=2, max_wait_ms=1, max_concurrent_batches=3
+    )
+
+    async def run() -> list[float]:
+        results = list(
+            await asyncio.gather(*(batcher.submit(i, 0, 0.0) for i in range(12)))
+        )
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+
+    assert results == [float(i) for i in range(12)]
+    # the next batches are collected while earlier ones are predicted
+    assert max_running == 3
+    assert batcher.stats.batches == 6
+
+
+def test_micro_batcher_rejects_when_queue_is_full():
+    async def slow_predictor(
+        pickup_ids: Sequence[int],
+        dropoff_ids: Sequence[int],
+        distances: Sequence[float],
+    ) -> npt.NDArray[np.float64]:
+        await asyncio.sleep(0.05)
+        return np.zeros(len(distances))
+
+    batcher = MicroBatcher(
+        slow_predictor,
+        max_batch_size=2,
+        max_wait_ms=1,
+        max_concurrent_batches=1,
+        max_queue_size=3,
+    )
+
+    async def run() -> list[float | BaseException]:
+        results = list(
+            await asyncio.gather(
+                *(batcher.submit(i, 0, 0.0) for i in range(10)), return_exceptions=True
+            )
+        )
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+
+    rejected = [r for r in results if isinstance(r, InferenceQueueFullError)]
+    assert rejected
+    assert batcher.stats.rejected == len(rejected)
+    assert batcher.stats.items == 10 - len(rejected)
+
+
+def test_micro_batcher_invalid_size():
+    with pytest.raises(ValueError, match="max_batch_size"):
+        MicroBatcher(RecordingPredictor(), max_batch_size=0)
+    with pytest.raises(ValueError, match="max_concurrent_batches"):
+        MicroBatcher(RecordingPredictor(), max_concurrent_batches=0)
+    with pytest.raises(ValueError, match="max_queue_size"):
+        MicroBatcher(RecordingPredictor(), max_queue_size=0)
+
+
+def test_batching_stats_record():
+    stats = BatchingStats()
+    stats.record(3, [0.001, 0.002, 0.003])
+    stats.record(1, [0.004])
+
+    assert stats.batches == 2
+    assert stats.items == 4
+    assert stats.max_queue_delay == 0.004
+    assert stats.mean_queue_delay == pytest.approx(0.0025)
+    assert stats.batch_sizes == {4: 1, 1: 1}
@@ -0,0 +1,233 @@
+import asyncio
+import socket
+import sys
+from datetime import datetime
+
+import polars as pl
+import pytest
+
+from e2e_taxi_ride_duration_prediction.benchmarking import (
+    BenchmarkResult,
+    compare_results,
+    format_comparisons,
+    format_results,
+    format_stage_reports,
+    generate_taxi_data,
+    load_results,
+    parquet_bytes_read,
+    profile_stages,
+    run_concurrent_load,
+    save_results,
+    time_function,
+    time_import,
+    time_to_first_response,
+    train_synthetic_model,
+    write_taxi_data,
+)
+from e2e_taxi_ride_duration_prediction.lookup_table import lookup_table_path
+from e2e_taxi_ride_duration_prediction.mmap_model import (
+    load_mmap_model,
+    mmap_model_path,
+)
+from e2e_taxi_ride_duration_prediction.serving.model_holder import ModelHolder
+
+# Minimal server answering every POST with 200, started in a subprocess
+ECHO_SERVER = """
+import sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+HTTPServer(("127.0.0.1", int(sys.argv[1])), Handler).serve_forever()
+"""
+
+
+def test_generate_taxi_data():
+    df = generate_taxi_data(1_000, start=datetime(2025, 2, 1), days=7, seed=3)
+
+    assert df.height == 1_000
+    assert df.equals(
+        generate_taxi_data(1_000, start=datetime(2025, 2, 1), days=7, seed=3)
+    )
+    assert df["tpep_pickup_datetime"].is_sorted()
+    assert (
+        df["tpep_pickup_datetime"]
+        .is_between(datetime(2025, 2, 1), datetime(2025, 2, 8), closed="left")
+        .all()
+    )
+    assert df["PULocationID"].is_between(1, 265).all()
+    assert df["DOLocationID"].is_between(1, 265).all()
+    assert (df["trip_distance"] > 0).all()
+
+
+def test_write_taxi_data(tmp_path):
+    path = write_taxi_data(tmp_path / "taxi.parquet", 2_500, chunk_rows=1_000)
+
+    df = pl.read_parquet(path)
+    assert df.height == 2_500
+    assert df["tpep_pickup_datetime"].is_sorted()
+
+
+def test_time_function():
+    calls = []
+
+    result = time_function("append", lambda: calls.append(1), 10, repeats=3, warmup=2)
+
+    assert len(calls) == 5
+    assert len(result.times) == 3
+    assert result.key == "append[10]"
+    assert result.min <= result.median
+
+
+def test_save_and_load_results(tmp_path):
+    results = [
+        BenchmarkResult("stage", 100, [0.2, 0.1, 0.3]),
+        BenchmarkResult("predict", 10, [0.01], extra={"p50_ms": 10.0}),
+    ]
+
+    path = save_results(results, tmp_path / "out/results.json", {"scales": [100]})
+
+    assert load_results(path) == results
+    assert "stage[100]" in format_results(results)
+
+
+def test_compare_results():
+    baseline = [
+        BenchmarkResult("fast", 100, [1.0]),
+        BenchmarkResult("slow", 100, [1.0]),
+        BenchmarkResult("removed", 100, [1.0]),
+    ]
+    current = [
+        BenchmarkResult("fast", 100, [0.5]),
+        BenchmarkResult("slow", 100, [1.5]),
+        BenchmarkResult("new", 100, [1.0]),
+    ]
+
+    comparisons = compare_results(baseline, current, threshold=0.1)
+
+    assert [(c.key, c.ratio, c.regression) for c in comparisons] == [
+        ("fast[100]", 0.5, False),
+        ("slow[100]", 1.5, True),
+    ]
+    assert "REGRESSION" in format_comparisons(comparisons)
+
+
+def test_compare_results_median():
+    baseline = [BenchmarkResult("predict", 3, [1.0, 1.0, 1.0])]
+    current = [BenchmarkResult("predict", 3, [0.1, 2.0, 2.0])]
+
+    assert compare_results(baseline, current)[0].regression is False
+    assert compare_results(baseline, current, statistic="median")[0].ratio == 2.0
+
+
+def test_run_concurrent_load():
+    in_flight = 0
+    max_in_flight = 0
+    sent = []
+
+    async def send(i: int) -> None:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        sent.append(i)
+        in_flight -= 1
+
+    result = asyncio.run(run_concurrent_load("sleep", send, 20, concurrency=4))
+
+    assert sorted(sent) == list(range(20))
+    assert max_in_flight == 4
+    assert result.key == "sleep[concurrency=4][20]"
+    assert len(result.times) == 20
+    assert result.extra["throughput_rps"] > 0
+    assert result.extra["p50_ms"] <= result.extra["p99_ms"]
+    assert result.extra["p50_ms"] == pytest.approx(result.percentile(50) * 1000)
+
+
+def test_parquet_bytes_read(tmp_path):
+    path = tmp_path / "taxi.parquet"
+    # two row groups, one per week
+    write_taxi_data(path, 2_000, chunk_rows=1_000, days=14)
+
+    all_bytes = parquet_bytes_read([path])
+    column_bytes = parquet_bytes_read([path], ["trip_distance"])
+    pruned_bytes = parquet_bytes_read(
+        [path],
+        ["trip_distance"],
+        "tpep_pickup_datetime",
+        start=datetime(2025, 1, 9),
+        end=datetime(2025, 1, 10),
+    )
+
+    assert 0 < pruned_bytes < column_bytes < all_bytes
+
+
+def test_profile_stages():
+    lf = pl.LazyFrame({"x": list(range(10))})
+
+    reports = profile_stages(
+        lf,
+        [
+            ("scan", lambda lf: lf),
+            ("filter", lambda lf: lf.filter(pl.col("x") < 4)),
+            ("derive", lambda lf: lf.with_columns(y=pl.col("x") * 2)),
+        ],
+        bytes_read=123,
+    )
+
+    assert [(r.stage, r.rows, r.columns) for r in reports] == [
+        ("scan", 10, 1),
+        ("filter", 4, 1),
+        ("derive", 4, 2),
+    ]
+    assert [r.bytes_read for r in reports] == [123, 0, 0]
+    assert reports[1].memory_bytes < reports[0].memory_bytes
+    assert all(r.max_rss_bytes > 0 for r in reports)
+    assert "filter" in format_stage_reports(reports)
+
+
+def test_train_synthetic_model(tmp_path):
+    path = train_synthetic_model(tmp_path / "model.joblib", n_rows=5_000)
+
+    loaded = ModelHolder(path).load()
+
+    assert lookup_table_path(path).exists()
+    assert load_mmap_model(mmap_model_path(path)).source_version == loaded.version
+    assert loaded.model is None
+
+
+def test_time_import():
+    elapsed, packages = time_import("json")
+
+    assert elapsed >= 0
+    assert "json" in packages
+    assert "polars" not in packages
+
+
+def test_time_to_first_response():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        unused_tcp_port = sock.getsockname()[1]
+
+    elapsed = time_to_first_response(
+        [sys.executable, "-c", ECHO_SERVER, str(unused_tcp_port)],
+        f"http://127.0.0.1:{unused_tcp_port}/",
+        {"a": 1},
+        timeout=30,
+    )
+
+    assert 0 < elapsed < 30
+
+
+def test_time_to_first_response_server_exits():
+    with pytest.raises(RuntimeError, match="exited with code 3"):
+        time_to_first_response(
+            [sys.executable, "-c", "import sys; sys.exit(3)"],
+            "http://127.0.0.1:9/",
+            {},
+        )
@@ -0,0 +1,113 @@
+import io
+
+import numpy as np
+import polars as pl
+import pytest
+
+from e2e_taxi_ride_duration_prediction.serving.columnar import (
+    ARROW_STREAM_MEDIA_TYPE,
+    JSON_MEDIA_TYPE,
+    PARQUET_MEDIA_TYPE,
+    ColumnarDecodeError,
+    decode_rides,
+    encode_predictions,
+    media_type,
+    negotiate_response_media_type,
+)
+
+RIDES = pl.DataFrame(
+    {
+        "PULocationID": [132, 161],
+        "DOLocationID": [148, 236],
+        "trip_distance": [3.1, 2.5],
+        "fare_amount": [10.0, 12.0],
+    }
+)
+
+
+def _parquet_bytes(frame: pl.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    frame.write_parquet(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("body", "body_media_type"),
+    [
+        (RIDES.write_ipc_stream(None).getvalue(), ARROW_STREAM_MEDIA_TYPE),
+        (_parquet_bytes(RIDES), PARQUET_MEDIA_TYPE),
+    ],
+)
+def test_decode_rides(body, body_media_type):
+    rides = decode_rides(body, body_media_type)
+
+    assert len(rides) == 2
+    np.testing.assert_array_equal(rides.pickup_location_ids, [132, 161])
+    np.testing.assert_array_equal(rides.dropoff_location_ids, [148, 236])
+    np.testing.assert_array_equal(rides.trip_distances, [3.1, 2.5])
+
+
+def test_decode_rides_arrow_is_zero_copy():
+    rides = decode_rides(
+        RIDES.write_ipc_stream(None).getvalue(), ARROW_STREAM_MEDIA_TYPE
+    )
+
+    # views of the decoded Arrow buffers are read-only
+    assert not rides.trip_distances.flags.writeable
+
+
+@pytest.mark.parametrize(
+    ("frame", "message"),
+    [
+        (RIDES.drop("trip_distance"), "Could not read"),
+        (RIDES.with_columns(pl.col("trip_distance").cast(pl.String)), "numeric"),
+        (
+            RIDES.with_columns(pl.lit(None, dtype=pl.Int64).alias("PULocationID")),
+            "nulls",
+        ),
+        (RIDES.clear(), "no rides"),
+        (RIDES.with_columns(pl.Series("PULocationID", [132.7, 161.0])), "integer"),
+        (RIDES.with_columns(pl.Series("trip_distance", [float("nan"), 1.0])), "finite"),
+        (RIDES.with_columns(pl.Series("trip_distance", [float("inf"), 1.0])), "finite"),
+    ],
+)
+def test_decode_rides_invalid(frame, message):
+    with pytest.raises(ColumnarDecodeError, match=message):
+        decode_rides(frame.write_ipc_stream(None).getvalue(), ARROW_STREAM_MEDIA_TYPE)
+
+
+def test_decode_rides_unreadable_body():
+    with pytest.raises(ColumnarDecodeError):
+        decode_rides(b"not arrow", ARROW_STREAM_MEDIA_TYPE)
+
+
+@pytest.mark.parametrize(
+    ("response_media_type", "read"),
+    [
+        (ARROW_STREAM_MEDIA_TYPE, pl.read_ipc_stream),
+        (PARQUET_MEDIA_TYPE, pl.read_parquet),
+    ],
+)
+def test_encode_predictions(response_media_type, read):
+    content = encode_predictions(np.array([1.5, 2.5]), response_media_type)
+
+    assert read(content)["predicted_duration"].to_list() == [1.5, 2.5]
+
+
+@pytest.mark.parametrize(
+    ("accept", "request_media_type", "expected"),
+    [
+        (None, ARROW_STREAM_MEDIA_TYPE, ARROW_STREAM_MEDIA_TYPE),
+        ("*/*", PARQUET_MEDIA_TYPE, PARQUET_MEDIA_TYPE),
+        (JSON_MEDIA_TYPE, ARROW_STREAM_MEDIA_TYPE, JSON_MEDIA_TYPE),
+        (f"{PARQUET_MEDIA_TYPE}, */*", JSON_MEDIA_TYPE, PARQUET_MEDIA_TYPE),
+        ("text/html", JSON_MEDIA_TYPE, JSON_MEDIA_TYPE),
+    ],
+)
+def test_negotiate_response_media_type(accept, request_media_type, expected):
+    assert negotiate_response_media_type(accept, request_media_type) == expected
+
+
+def test_media_type():
+    assert media_type("Application/JSON; charset=utf-8") == JSON_MEDIA_TYPE
+    assert media_type(None) == JSON_MEDIA_TYPE
@@ -1,11 +1,15 @@
 from collections.abc import Generator
 from datetime import datetime
+from pathlib import Path
 
+import joblib
 import polars as pl
 import pytest
 from _pytest.logging import LogCaptureFixture
 from loguru import logger
 from prefect.testing.utilities import prefect_test_harness
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.linear_model import LinearRegression
 
 
 @pytest.fixture()
@@ -69,3 +73,21 @@ def caplog(caplog: LogCaptureFixture) -> Generator[LogCaptureFixture, None, None
     )
     yield caplog
     logger.remove(handler_id)
+
+
+@pytest.fixture
+def model_artifact(tmp_path: Path) -> Path:
+    """Small (LinearRegression, DictVectorizer) artifact trained on pair features."""
+    train_dicts = [
+        {"pickup_dropoff_pair": "132_148", "trip_distance": 3.1},
+        {"pickup_dropoff_pair": "161_236", "trip_distance": 2.5},
+        {"pickup_dropoff_pair": "132_148", "trip_distance": 5.0},
+        {"pickup_dropoff_pair": "1_2", "trip_distance": 1.0},
+    ]
+    dict_vectorizer = DictVectorizer()
+    X = dict_vectorizer.fit_transform(train_dicts)
+    model = LinearRegression().fit(X, [12.0, 9.0, 18.0, 4.0])
+
+    path = tmp_path / "model.joblib"
+    joblib.dump((model, dict_vectorizer), path)
+    return path
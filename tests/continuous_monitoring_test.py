@@ -0,0 +1,225 @@
+import asyncio
+import time
+from datetime import UTC, datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+from fastapi.testclient import TestClient
+
+from e2e_taxi_ride_duration_prediction.continuous_monitoring import (
+    MonitoringAlert,
+    PredictionLogReader,
+    SlidingWindowMonitor,
+    create_app,
+    join_actual_durations,
+    parse_window,
+)
+from e2e_taxi_ride_duration_prediction.monitoring_stats import DataProfile
+from e2e_taxi_ride_duration_prediction.serving.prediction_log import PredictionLogger
+
+NOW = datetime(2025, 3, 8, 12, 0, tzinfo=UTC)
+
+
+def _records(n: int, end: datetime, shift: float = 0.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    distance = rng.exponential(3, n) + shift
+    return pl.DataFrame(
+        {
+            "timestamp": [
+                end - timedelta(seconds=int(s)) for s in rng.uniform(1, 600, n)
+            ],
+            "PULocationID": rng.integers(1, 100, n) + int(shift * 30),
+            "DOLocationID": rng.integers(1, 100, n),
+            "trip_distance": distance,
+            "prediction": distance * 3 + 5,
+            "duration": distance * 3 + 5 + rng.normal(0, 1 + shift, n),
+        }
+    )
+
+
+def _reference() -> DataProfile:
+    reference = DataProfile.empty()
+    reference.update(_records(20_000, NOW, seed=1))
+    return reference
+
+
+def _monitor(clock, **kwargs) -> SlidingWindowMonitor:
+    return SlidingWindowMonitor(
+        _reference(),
+        windows={"1h": timedelta(hours=1), "1d": timedelta(days=1)},
+        clock=clock,
+        **kwargs,
+    )
+
+
+def test_parse_window():
+    assert parse_window("15m") == timedelta(minutes=15)
+    assert parse_window("1h") == timedelta(hours=1)
+    assert parse_window("7d") == timedelta(days=7)
+    with pytest.raises(ValueError):
+        parse_window("0h")
+    with pytest.raises(ValueError):
+        parse_window("1w")
+
+
+def test_windows_slide_and_expire():
+    now = [NOW]
+    monitor = _monitor(lambda: now[0], min_rows=100)
+
+    monitor.update(_records(4_000, NOW - timedelta(hours=3)))
+    monitor.update(_records(5_000, NOW))
+    # older than the longest window
+    assert monitor.update(_records(500, NOW - timedelta(days=2))) == 0
+
+    assert monitor.metrics("1h").rows == 5_000
+    assert monitor.metrics("1d").rows == 9_000
+    assert not monitor.metrics("1h").failed_tests
+    regression = monitor.metrics("1h").regression
+    assert regression is not None and regression["n"] == 5_000
+
+    now[0] = NOW + timedelta(hours=2)
+    assert monitor.metrics("1h").rows == 0
+    assert monitor.metrics("1d").rows == 9_000
+    now[0] = NOW + timedelta(days=1, hours=1)
+    monitor.update(_records(10, now[0]))
+    assert monitor.metrics("1d").rows == 10
+    # expired buckets were dropped
+    assert sum(profile.rows for profile in monitor._buckets.values()) == 10
+
+
+def test_check_alerts_once_per_new_failure():
+    alerts = []
+    monitor = _monitor(lambda: NOW, min_rows=100, alert_hook=alerts.append)
+
+    monitor.update(_records(5_000, NOW))
+    assert monitor.check() == []
+
+    monitor.update(_records(10_000, NOW, shift=3.0, seed=2))
+    monitor.check()
+    monitor.check()
+
+    assert [alert.window for alert in alerts] == ["1h", "1d"]
+    failed = alerts[0].failed_tests
+    assert {"drift:trip_distance", "drift:PULocationID", "drift_share"} <= set(failed)
+    assert "mae" in failed
+
+
+def test_few_rows_are_not_tested():
+    alerts = []
+    monitor = _monitor(lambda: NOW, alert_hook=alerts.append)
+
+    monitor.update(_records(50, NOW, shift=3.0))
+
+    assert monitor.metrics("1h").drift["trip_distance"].drifted
+    assert monitor.metrics("1h").failed_tests == []
+    assert monitor.check() == []
+
+
+def test_reader_reads_each_log_file_once(tmp_path):
+    reader = PredictionLogReader(tmp_path)
+    _records(10, NOW).write_parquet(tmp_path / "predictions-000001.parquet")
+    _records(10, NOW).write_parquet(tmp_path / ".predictions-000002.parquet.tmp")
+    monitor = _monitor(lambda: NOW)
+
+    assert monitor.poll(reader) == 10
+    assert monitor.poll(reader) == 0
+
+    _records(5, NOW).write_parquet(tmp_path / "predictions-000002.parquet")
+    (tmp_path / "predictions-000001.parquet").unlink()
+    assert monitor.poll(reader) == 5
+    assert monitor.metrics("1h").rows == 15
+
+
+def test_query_api(tmp_path):
+    _records(200, NOW).write_parquet(tmp_path / "predictions-000001.parquet")
+    monitor = _monitor(lambda: NOW, min_rows=100)
+
+    with TestClient(create_app(monitor, PredictionLogReader(tmp_path), 0.01)) as client:
+        # the log is polled in the background
+        deadline = time.monotonic() + 10
+        while monitor.metrics("1h").rows < 200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        windows = client.get("/windows").json()
+        one = client.get("/windows/1h")
+        missing = client.get("/windows/2h")
+
+    assert [window["window"] for window in windows] == ["1h", "1d"]
+    assert one.json()["rows"] == 200
+    assert one.json()["drift"]["trip_distance"]["method"] == "wasserstein"
+    assert missing.status_code == 404
+
+
+def test_poll_joins_actual_durations_of_served_log(tmp_path):
+    log_dir = tmp_path / "log"
+    prediction_logger = PredictionLogger(log_dir)
+    rng = np.random.default_rng(0)
+    n = 2_000
+    pickup = rng.integers(1, 266, n)
+    dropoff = rng.integers(1, 266, n)
+    distance = np.round(rng.exponential(3, n), 2)
+    prediction = distance * 3 + 5
+
+    async def run() -> None:
+        prediction_logger.log(pickup, dropoff, distance, prediction, "v1")
+        await prediction_logger.stop()
+
+    asyncio.run(run())
+    log = pl.read_parquet(log_dir / "*.parquet")
+    # TLC trips have naive New York times, the actual durations are far off
+    pickup_time = log["timestamp"].dt.convert_time_zone("America/New_York")
+    duration = prediction * 2
+    trips_path = tmp_path / "trips.parquet"
+    pl.DataFrame(
+        {
+            "tpep_pickup_datetime": pickup_time.dt.replace_time_zone(None),
+            "tpep_dropoff_datetime": pickup_time.dt.replace_time_zone(None)
+            + pl.Series((duration * 60_000_000).astype(np.int64)).cast(
+                pl.Duration("us")
+            ),
+            "PULocationID": pickup.astype(np.int64),
+            "DOLocationID": dropoff.astype(np.int64),
+            "trip_distance": distance,
+        }
+    ).write_parquet(trips_path)
+    reference = DataProfile.empty()
+    reference.update(
+        pl.DataFrame(
+            {
+                "PULocationID": pickup,
+                "DOLocationID": dropoff,
+                "trip_distance": distance,
+                "prediction": prediction,
+                "duration": prediction + rng.normal(0, 1, n),
+            }
+        )
+    )
+
+    def monitor(trips_path) -> tuple[SlidingWindowMonitor, list[MonitoringAlert]]:
+        alerts = []
+        return SlidingWindowMonitor(
+            reference,
+            windows={"1h": timedelta(hours=1)},
+            alert_hook=alerts.append,
+            clock=lambda: datetime.now(UTC),
+            trips=lambda: pl.scan_parquet(trips_path),
+        ), alerts
+
+    # durations have a resolution of seconds
+    joined = join_actual_durations(log, pl.scan_parquet(trips_path))
+    np.testing.assert_allclose(joined["duration"].to_numpy(), duration, atol=1 / 60)
+
+    # the served log has no target, without trips only drift is tested
+    unlabeled, alerts = monitor(tmp_path / "missing.parquet")
+    assert "duration" not in log.columns
+    assert unlabeled.poll(PredictionLogReader(log_dir)) == n
+    assert unlabeled.metrics("1h").regression is None
+    assert alerts == []
+
+    labeled, alerts = monitor(trips_path)
+    assert labeled.poll(PredictionLogReader(log_dir)) == n
+
+    regression = labeled.metrics("1h").regression
+    assert regression is not None and regression["n"] == n
+    assert [alert.window for alert in alerts] == ["1h"]
+    assert {"mae", "rmse"} <= set(alerts[0].failed_tests)
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from e2e_taxi_ride_duration_prediction.serving.executor import (
+    InferenceExecutor,
+    InferenceQueueFullError,
+)
+from e2e_taxi_ride_duration_prediction.serving.inference import predict_rides
+from e2e_taxi_ride_duration_prediction.serving.model_holder import ModelHolder
+
+RIDES = ([132, 1], [148, 2], [3.1, 0.5])
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_executor_predicts_like_inference(model_artifact, kind):
+    holder = ModelHolder(model_artifact)
+    executor = InferenceExecutor(max_workers=1, kind=kind)
+    try:
+        predictions = asyncio.run(executor.predict(holder, *RIDES))
+    finally:
+        executor.shutdown()
+
+    np.testing.assert_allclose(predictions, predict_rides(holder.get(), *RIDES))
+    assert executor.stats.completed == 1
+    assert executor.pending == 0
+
+
+def test_executor_rejects_when_queue_is_full(model_artifact):
+    holder = ModelHolder(model_artifact)
+    holder.get()
+    executor = InferenceExecutor(max_workers=1, max_queue_size=1)
+    release = threading.Event()
+
+    def blocking_predict(*args):
+        release.wait(timeout=5)
+        return predict_rides(*args)
+
+    async def run() -> list:
+        tasks = [
+            asyncio.create_task(executor.predict(holder, *RIDES)) for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        with pytest.raises(InferenceQueueFullError):
+            await executor.predict(holder, *RIDES)
+        release.set()
+        return list(await asyncio.gather(*tasks))
+
+    with patch(
+        "e2e_taxi_ride_duration_prediction.serving.executor.predict_rides",
+        blocking_predict,
+    ):
+        try:
+            results = asyncio.run(run())
+        finally:
+            executor.shutdown()
+
+    assert len(results) == 2
+    assert executor.stats.rejected == 1
+    assert executor.stats.completed == 2
+    assert executor.stats.max_pending == 2
+
+
+def test_executor_counts_cancelled_predictions_until_they_finish(model_artifact):
+    holder = ModelHolder(model_artifact)
+    holder.get()
+    executor = InferenceExecutor(max_workers=1, max_queue_size=0)
+    release = threading.Event()
+
+    def blocking_predict(*args):
+        release.wait(timeout=5)
+        return predict_rides(*args)
+
+    async def run() -> None:
+        request = asyncio.create_task(executor.predict(holder, *RIDES))
+        await asyncio.sleep(0.05)
+        # e.g. the client disconnected, the worker is still busy
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        assert executor.pending == 1
+        with pytest.raises(InferenceQueueFullError):
+            await executor.predict(holder, *RIDES)
+
+        release.set()
+        while executor.pending:
+            await asyncio.sleep(0.01)
+        await executor.predict(holder, *RIDES)
+
+    with patch(
+        "e2e_taxi_ride_duration_prediction.serving.executor.predict_rides",
+        blocking_predict,
+    ):
+        try:
+            asyncio.run(run())
+        finally:
+            executor.shutdown()
+
+    assert executor.stats.rejected == 1
+    assert executor.stats.completed == 2
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"max_workers": 0}, {"max_queue_size": -1}, {"kind": "fiber"}],
+)
+def test_executor_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        InferenceExecutor(**kwargs)
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.linear_model import LinearRegression
+
+from e2e_taxi_ride_duration_prediction.feature_cache import (
+    CachedFeatures,
+    FeatureCache,
+    pipeline_fingerprint,
+)
+
+
+@pytest.fixture
+def features() -> CachedFeatures:
+    dict_vectorizer = DictVectorizer()
+    X_train = dict_vectorizer.fit_transform(
+        [{"pair": "1_2", "trip_distance": 1.0}, {"pair": "3_4", "trip_distance": 2.0}]
+    )
+    X_test = dict_vectorizer.transform([{"pair": "1_2", "trip_distance": 3.0}])
+    return CachedFeatures(
+        X_train, X_test, np.array([10.0, 20.0]), np.array([30.0]), dict_vectorizer
+    )
+
+
+def test_pipeline_fingerprint(tmp_path):
+    path = tmp_path / "data.parquet"
+    path.write_bytes(b"a")
+
+    key = pipeline_fingerprint([path], features=["a"])
+
+    assert key == pipeline_fingerprint([path], features=["a"])
+    assert key != pipeline_fingerprint([path], features=["b"])
+
+    path.write_bytes(b"ab")
+    assert key != pipeline_fingerprint([path], features=["a"])
+
+
+def test_feature_cache_roundtrip(tmp_path, features):
+    cache = FeatureCache(tmp_path)
+
+    assert cache.get("key") is None
+    cache.put("key", features)
+    result = cache.get("key")
+
+    assert "key" in cache
+    assert result is not None
+    assert isinstance(result.X_train, csr_matrix)
+    assert isinstance(result.X_test, csr_matrix)
+    np.testing.assert_array_equal(result.X_train.toarray(), features.X_train.toarray())
+    np.testing.assert_array_equal(result.X_test.toarray(), features.X_test.toarray())
+    assert isinstance(result.y_train, np.memmap)
+    np.testing.assert_array_equal(result.y_train, features.y_train)
+    np.testing.assert_array_equal(result.y_test, features.y_test)
+    assert result.dict_vectorizer.vocabulary_ == features.dict_vectorizer.vocabulary_
+    # the memory-mapped targets can be trained on directly
+    LinearRegression().fit(result.X_train, result.y_train)
+
+
+def test_feature_cache_dense_matrices(tmp_path, features):
+    features.X_train = features.X_train.toarray()
+    cache = FeatureCache(tmp_path)
+
+    cache.put("key", features)
+
+    result = cache.get("key")
+    assert result is not None
+    np.testing.assert_array_equal(result.X_train, features.X_train)
+
+
+def test_feature_cache_lru_eviction(tmp_path, features):
+    cache = FeatureCache(tmp_path)
+    for key in ("a", "b"):
+        cache.put(key, features)
+    entry_size = cache.size_bytes() // 2
+    # make "a" older than "b", then use it so "b" becomes least recently used
+    os.utime(tmp_path / "a" / "meta.json", (0, 0))
+    cache.get("a")
+    cache.max_bytes = 2 * entry_size
+
+    cache.put("c", features)
+
+    assert [key for key, _, _ in cache.entries()] == ["a", "c"]
+
+
+def test_feature_cache_keeps_new_entry_larger_than_limit(tmp_path, features):
+    cache = FeatureCache(tmp_path, max_bytes=1)
+    cache.put("a", features)
+
+    cache.put("b", features)
+
+    assert [key for key, _, _ in cache.entries()] == ["b"]
@@ -0,0 +1,195 @@
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+import pytest
+from sklearn.feature_extraction import DictVectorizer
+
+from e2e_taxi_ride_duration_prediction.features import (
+    ColumnarDictEncoder,
+    fit_dict_vectorizer,
+)
+from e2e_taxi_ride_duration_prediction.location_pairs import (
+    PAIR_ID_FEATURE,
+    pickup_dropoff_pair_ids,
+)
+from e2e_taxi_ride_duration_prediction.preprocessing import (
+    cast_categorical_columns,
+    cast_location_ids,
+    create_pickup_dropoff_pair_enum,
+    create_pickup_dropoff_pair_ids,
+    create_pickup_dropoff_pairs,
+)
+
+
+def assert_same_matrix(result, expected):
+    assert result.shape == expected.shape
+    assert result.dtype == expected.dtype
+    np.testing.assert_array_equal(result.indptr, expected.indptr)
+    np.testing.assert_array_equal(result.indices, expected.indices)
+    np.testing.assert_array_equal(result.data, expected.data)
+
+
+@pytest.fixture
+def features_df(test_data: pl.LazyFrame) -> pl.DataFrame:
+    return (
+        test_data.pipe(cast_categorical_columns)
+        .pipe(create_pickup_dropoff_pairs)
+        .select(["pickup_dropoff_pair", "VendorID", "trip_distance", "RatecodeID"])
+        .collect()
+    )
+
+
+def test_fit_dict_vectorizer_matches_sklearn(features_df):
+    expected = DictVectorizer().fit(features_df.to_dicts())
+
+    result = fit_dict_vectorizer(features_df.lazy())
+
+    assert result.feature_names_ == expected.feature_names_
+    assert result.vocabulary_ == expected.vocabulary_
+
+
+def test_fit_dict_vectorizer_unsupported_dtype():
+    df = pl.DataFrame({"pickup": [datetime(2025, 1, 1)]})
+    with pytest.raises(TypeError, match="Unsupported dtype"):
+        fit_dict_vectorizer(df)
+
+
+def test_columnar_encoder_matches_dict_vectorizer(features_df):
+    dict_vectorizer = DictVectorizer().fit(features_df.head(3).to_dicts())
+
+    result = ColumnarDictEncoder(dict_vectorizer).transform(features_df)
+
+    assert_same_matrix(result, dict_vectorizer.transform(features_df.to_dicts()))
+
+
+def test_columnar_encoder_nulls_and_zeros():
+    df = pl.DataFrame(
+        {
+            "pickup_dropoff_pair": ["1_2", None, "1_2", "3_4"],
+            "trip_distance": [0.0, None, 2.5, 1.0],
+            "is_airport": [True, False, None, True],
+        }
+    )
+    dict_vectorizer = DictVectorizer().fit(df.to_dicts())
+
+    result = ColumnarDictEncoder(dict_vectorizer).transform(df)
+
+    expected = dict_vectorizer.transform(df.to_dicts())
+    assert result.nnz == expected.nnz
+    np.testing.assert_array_equal(result.indices, expected.indices)
+    np.testing.assert_array_equal(result.data, expected.data)
+
+
+def test_columnar_encoder_ignores_unknown_values_and_columns():
+    dict_vectorizer = DictVectorizer().fit(
+        [{"pickup_dropoff_pair": "1_2", "trip_distance": 1.0}]
+    )
+    df = pl.DataFrame(
+        {
+            "pickup_dropoff_pair": ["9_9", "1_2"],
+            "trip_distance": [3.0, 4.0],
+            "fare_amount": [10.0, 12.0],
+        }
+    )
+
+    result = ColumnarDictEncoder(dict_vectorizer).transform(df)
+
+    assert_same_matrix(result, dict_vectorizer.transform(df.to_dicts()))
+
+
+def test_columnar_encoder_dense_vectorizer():
+    dict_vectorizer = DictVectorizer(sparse=False).fit(
+        [{"pickup_dropoff_pair": "1_2", "trip_distance": 1.0}]
+    )
+    df = pl.DataFrame({"pickup_dropoff_pair": ["1_2"], "trip_distance": [2.0]})
+
+    result = ColumnarDictEncoder(dict_vectorizer).transform(df)
+
+    assert isinstance(result, np.ndarray)
+    np.testing.assert_array_equal(result, dict_vectorizer.transform(df.to_dicts()))
+
+
+def test_columnar_encoder_enum_columns():
+    df = (
+        pl.LazyFrame(
+            {
+                "PULocationID": [100, 200, 100, 5, None],
+                "DOLocationID": [110, 250, 120, 6, 7],
+                "trip_distance": [1.0, 2.0, 3.0, 4.0, 5.0],
+            }
+        )
+        .pipe(cast_location_ids)
+        .pipe(create_pickup_dropoff_pair_enum)
+        .select(["pickup_dropoff_pair", "trip_distance"])
+        .collect()
+    )
+    dict_vectorizer = fit_dict_vectorizer(df.head(3))
+    encoder = ColumnarDictEncoder(dict_vectorizer)
+    as_strings = df.with_columns(pl.col("pickup_dropoff_pair").cast(pl.String))
+
+    result = encoder.transform(df)
+
+    assert_same_matrix(result, dict_vectorizer.transform(as_strings.to_dicts()))
+    # the category lookup is reused for frames with the same Enum
+    cached = encoder._enum_cache["pickup_dropoff_pair"][1]
+    encoder.transform(df.tail(2))
+    assert encoder._enum_cache["pickup_dropoff_pair"][1] is cached
+
+
+def test_pickup_dropoff_pair_ids():
+    result = pickup_dropoff_pair_ids([1, 265, 300, -1], [2, 265, 1, 1])
+
+    np.testing.assert_array_equal(result, [268, 265 * 266 + 265, -1, -1])
+
+
+def test_fit_dict_vectorizer_pair_ids_match_pair_strings():
+    lf = pl.LazyFrame(
+        {
+            "PULocationID": [100, 200, 100, None],
+            "DOLocationID": [110, 250, 110, 7],
+            "trip_distance": [1.0, 2.0, 3.0, 4.0],
+        }
+    )
+    strings = lf.pipe(create_pickup_dropoff_pairs).select(
+        "pickup_dropoff_pair", "trip_distance"
+    )
+    ids = lf.pipe(create_pickup_dropoff_pair_ids).select(
+        PAIR_ID_FEATURE, "trip_distance"
+    )
+
+    expected = fit_dict_vectorizer(strings)
+    result = fit_dict_vectorizer(ids)
+
+    assert result.vocabulary_ == expected.vocabulary_
+    assert result.feature_names_ == expected.feature_names_
+
+
+def test_fit_dict_vectorizer_invalid_pair_id():
+    with pytest.raises(ValueError, match="Invalid"):
+        fit_dict_vectorizer(pl.DataFrame({PAIR_ID_FEATURE: [266**2]}))
+
+
+def test_columnar_encoder_pair_ids():
+    lf = pl.LazyFrame(
+        {
+            "PULocationID": [100, 200, 100, 5, None, 300],
+            "DOLocationID": [110, 250, 120, 6, 7, 1],
+            "trip_distance": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+        }
+    )
+    strings = (
+        lf.pipe(create_pickup_dropoff_pairs)
+        .select("pickup_dropoff_pair", "trip_distance")
+        .collect()
+    )
+    ids = (
+        lf.pipe(create_pickup_dropoff_pair_ids)
+        .select(PAIR_ID_FEATURE, "trip_distance")
+        .collect()
+    )
+    dict_vectorizer = DictVectorizer().fit(strings.head(3).to_dicts())
+
+    result = ColumnarDictEncoder(dict_vectorizer).transform(ids)
+
+    assert_same_matrix(result, dict_vectorizer.transform(strings.to_dicts()))
@@ -0,0 +1,88 @@
+import joblib
+import numpy as np
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.tree import DecisionTreeRegressor
+
+from e2e_taxi_ride_duration_prediction.mmap_model import (
+    compile_mmap_model,
+    mmap_model_path,
+    save_mmap_model,
+)
+from e2e_taxi_ride_duration_prediction.serving.inference import predict_rides
+from e2e_taxi_ride_duration_prediction.serving.model_holder import ModelHolder
+
+
+def test_predict_rides_uses_pickup_dropoff_pairs(model_artifact):
+    loaded_model = ModelHolder(model_artifact).get()
+    assert loaded_model.model is not None and loaded_model.dict_vectorizer is not None
+    expected = loaded_model.model.predict(
+        loaded_model.dict_vectorizer.transform(
+            [
+                {"pickup_dropoff_pair": "132_148", "trip_distance": 3.1},
+                {"pickup_dropoff_pair": "161_236", "trip_distance": 2.5},
+            ]
+        )
+    )
+
+    result = predict_rides(loaded_model, [132, 161], [148, 236], [3.1, 2.5])
+
+    assert result.dtype == np.float64
+    np.testing.assert_allclose(result, expected)
+
+
+def test_predict_rides_unknown_pair(model_artifact):
+    loaded_model = ModelHolder(model_artifact).get()
+    assert loaded_model.model is not None and loaded_model.dict_vectorizer is not None
+    expected = loaded_model.model.predict(
+        loaded_model.dict_vectorizer.transform([{"trip_distance": 3.1}])
+    )
+
+    result = predict_rides(loaded_model, [999], [998], [3.1])
+
+    np.testing.assert_allclose(result, expected)
+
+
+def test_predict_rides_generic_path(tmp_path):
+    train_dicts = [
+        {"pickup_dropoff_pair": "132_148", "trip_distance": 3.1},
+        {"pickup_dropoff_pair": "161_236", "trip_distance": 2.5},
+    ]
+    dict_vectorizer = DictVectorizer()
+    model = DecisionTreeRegressor().fit(
+        dict_vectorizer.fit_transform(train_dicts), [12.0, 9.0]
+    )
+    joblib.dump((model, dict_vectorizer), tmp_path / "tree.joblib")
+    loaded_model = ModelHolder(tmp_path / "tree.joblib").get()
+
+    result = predict_rides(loaded_model, [132, 161], [148, 236], [3.1, 2.5])
+
+    assert loaded_model.lookup_table is None
+    np.testing.assert_allclose(result, [12.0, 9.0])
+
+
+def test_predict_rides_mmap_model(model_artifact):
+    expected = predict_rides(
+        ModelHolder(model_artifact).get(),
+        [132, 161, 999],
+        [148, 236, 1],
+        [3.1, 2.5, 1.0],
+    )
+    loaded_model = ModelHolder(model_artifact).get()
+    assert loaded_model.model is not None and loaded_model.dict_vectorizer is not None
+    save_mmap_model(
+        compile_mmap_model(
+            loaded_model.model,
+            loaded_model.dict_vectorizer,
+            source_version=loaded_model.version,
+        ),
+        mmap_model_path(model_artifact),
+    )
+
+    result = predict_rides(
+        ModelHolder(model_artifact).get(),
+        [132, 161, 999],
+        [148, 236, 1],
+        [3.1, 2.5, 1.0],
+    )
+
+    np.testing.assert_allclose(result, expected)
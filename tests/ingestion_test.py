@@ -1,19 +1,91 @@
+import threading
+from collections.abc import Iterator
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from unittest.mock import Mock, patch
 
 import polars as pl
+import pyarrow.parquet as pq
 import pytest
 import requests
 
 from e2e_taxi_ride_duration_prediction.ingestion import (
     concatenate_parquet_files,
     download_parquet_file,
+    download_parquet_files,
     generate_year_month_tuples,
     get_data_path,
     get_nyc_taxi_data,
+    get_partition_paths,
+    scan_partitions,
+    sort_parquet_files,
 )
 
 
+class FileServer(ThreadingHTTPServer):
+    """Local stand-in for the TLC file server, supporting Range requests."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), FileRequestHandler)
+        self.files: dict[str, bytes] = {}
+        self.failures: dict[str, int] = {}
+        self.support_range = True
+        # bytes a 206 response starts before the requested offset
+        self.range_skew = 0
+        self.requests: list[tuple[str, str | None]] = []
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class FileRequestHandler(BaseHTTPRequestHandler):
+    server: FileServer
+
+    def do_GET(self) -> None:
+        range_header = self.headers.get("Range")
+        self.server.requests.append((self.path, range_header))
+
+        if self.server.failures.get(self.path, 0) > 0:
+            self.server.failures[self.path] -= 1
+            self.send_error(503)
+            return
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+
+        if range_header and self.server.support_range:
+            start = int(range_header.removeprefix("bytes=").removesuffix("-"))
+            start = max(start - self.server.range_skew, 0)
+            if start >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}"
+            )
+            data = data[start:]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def file_server() -> Iterator[FileServer]:
+    server = FileServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
 def test_generate_year_month_tuples_across_years():
     result = generate_year_month_tuples(start=(2019, 11), end=(2020, 3))
     expected = [
@@ -58,6 +130,117 @@ def test_get_data_path_different_years():
     assert result == expected
 
 
+def test_get_partition_paths():
+    root = Path("/test/path")
+
+    result = get_partition_paths(root, [(2022, 12), (2023, 1)])
+
+    assert result == [
+        Path("/test/path/data/raw/yellow_tripdata/year=2022/month=12/data.parquet"),
+        Path("/test/path/data/raw/yellow_tripdata/year=2023/month=01/data.parquet"),
+    ]
+
+
+def _write_month(path: Path, month: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pl.DataFrame(
+        {
+            "tpep_pickup_datetime": [f"2023-{month:02d}-01 10:00:00"],
+            # the TLC files change dtypes between months
+            "passenger_count": [1] if month == 1 else [1.0],
+        }
+    ).with_columns(pl.col("tpep_pickup_datetime").str.to_datetime()).write_parquet(path)
+
+
+def test_scan_partitions(tmp_path):
+    paths = get_partition_paths(tmp_path, [(2023, 1), (2023, 2)])
+    for month, path in enumerate(paths, start=1):
+        _write_month(path, month)
+
+    result = scan_partitions(paths)
+
+    df = result.collect()
+    assert df["month"].to_list() == [1, 2]
+    assert df["year"].to_list() == [2023, 2023]
+    assert df["passenger_count"].dtype == pl.Float64
+    assert result.filter(pl.col("month") == 2).collect().height == 1
+
+
+@patch("e2e_taxi_ride_duration_prediction.ingestion.download_parquet_file")
+def test_get_nyc_taxi_data_partitioned_downloads_missing_months(
+    mock_download, tmp_path
+):
+    _write_month(get_partition_paths(tmp_path, [(2023, 1)])[0], 1)
+
+    def mock_download_side_effect(
+        url: str, filepath: Path, session: requests.Session | None = None
+    ) -> bool:
+        _write_month(filepath, int(url[-10:-8]))
+        return True
+
+    mock_download.side_effect = mock_download_side_effect
+
+    result = get_nyc_taxi_data(tmp_path, start=(2023, 1), end=(2023, 3))
+
+    downloaded = sorted(call.args[0][-15:] for call in mock_download.call_args_list)
+    assert downloaded == ["2023-02.parquet", "2023-03.parquet"]
+    # downloads go to a staging name and only the sorted file is in the store
+    assert {call.args[1].name for call in mock_download.call_args_list} == {
+        ".data.parquet.download"
+    }
+    assert not list(tmp_path.rglob(".*"))
+    assert result.collect()["month"].sort().to_list() == [1, 2, 3]
+
+    # the overlapping range is served from the store without downloads
+    mock_download.reset_mock()
+    result = get_nyc_taxi_data(tmp_path, start=(2023, 2), end=(2023, 3))
+
+    mock_download.assert_not_called()
+    assert result.collect()["month"].sort().to_list() == [2, 3]
+
+
+@patch("e2e_taxi_ride_duration_prediction.ingestion.download_parquet_file")
+def test_get_nyc_taxi_data_partitioned_skips_unavailable_months(
+    mock_download, tmp_path
+):
+    _write_month(get_partition_paths(tmp_path, [(2023, 1)])[0], 1)
+    mock_download.return_value = False
+
+    result = get_nyc_taxi_data(tmp_path, start=(2023, 1), end=(2023, 2))
+
+    assert mock_download.call_count == 1
+    assert result.collect().height == 1
+
+
+@patch("e2e_taxi_ride_duration_prediction.ingestion.sort_parquet_files")
+@patch("e2e_taxi_ride_duration_prediction.ingestion.download_parquet_file")
+def test_get_nyc_taxi_data_partitioned_keeps_unsorted_months_out_of_the_store(
+    mock_download, mock_sort, tmp_path
+):
+    _write_month(get_partition_paths(tmp_path, [(2023, 1)])[0], 1)
+    feb_path = get_partition_paths(tmp_path, [(2023, 2)])[0]
+
+    def mock_download_side_effect(
+        url: str, filepath: Path, session: requests.Session | None = None
+    ) -> bool:
+        _write_month(filepath, 2)
+        return True
+
+    mock_download.side_effect = mock_download_side_effect
+    mock_sort.side_effect = OSError
+
+    with pytest.raises(OSError):
+        get_nyc_taxi_data(tmp_path, start=(2023, 1), end=(2023, 2))
+
+    # the interrupted month is not present and is sorted on the next run
+    assert not feb_path.exists()
+    mock_sort.side_effect = sort_parquet_files
+    result = get_nyc_taxi_data(tmp_path, start=(2023, 1), end=(2023, 2))
+
+    assert mock_sort.call_args.args[1] == [feb_path]
+    assert result.collect()["month"].sort().to_list() == [1, 2]
+
+
 def test_download_parquet_file_exists(tmp_path):
     filepath = tmp_path / "test.parquet"
     filepath.write_text("existing data")
@@ -71,7 +254,8 @@ def test_download_parquet_file_success(tmp_path):
 
     mock_response = Mock()
     mock_response.ok = True
-    mock_response.content = b"parquet data"
+    mock_response.status_code = 200
+    mock_response.iter_content.return_value = [b"parquet ", b"data"]
 
     with patch("requests.get", return_value=mock_response):
         result = download_parquet_file("http://example.com/test.parquet", filepath)
@@ -86,7 +270,8 @@ def test_download_parquet_file_with_session(tmp_path):
     mock_session = Mock()
     mock_response = Mock()
     mock_response.ok = True
-    mock_response.content = b"parquet data"
+    mock_response.status_code = 200
+    mock_response.iter_content.return_value = [b"parquet ", b"data"]
     mock_session.get.return_value = mock_response
 
     result = download_parquet_file(
@@ -96,7 +281,7 @@ def test_download_parquet_file_with_session(tmp_path):
     assert result is True
     assert filepath.read_bytes() == b"parquet data"
     mock_session.get.assert_called_once_with(
-        "http://example.com/test.parquet", stream=True
+        "http://example.com/test.parquet", stream=True, headers={}, timeout=30.0
     )
 
 
@@ -119,12 +304,143 @@ def test_download_parquet_file_http_error(tmp_path, caplog):
 def test_download_parquet_file_network_error(tmp_path, caplog):
     filepath = tmp_path / "test.parquet"
 
-    with patch("requests.get", side_effect=requests.RequestException("Network error")):
+    with (
+        patch("requests.get", side_effect=requests.RequestException("Network error")),
+        patch("e2e_taxi_ride_duration_prediction.ingestion.time.sleep") as mock_sleep,
+    ):
         result = download_parquet_file("http://example.com/test.parquet", filepath)
 
     assert result is False
     assert not filepath.exists()
     assert "Network error downloading" in caplog.text
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [1.0, 2.0, 4.0]
+
+
+def test_download_parquet_file_from_server(file_server, tmp_path):
+    file_server.files["/data.parquet"] = b"x" * 10_000
+    filepath = tmp_path / "data.parquet"
+
+    result = download_parquet_file(
+        file_server.url("/data.parquet"), filepath, chunk_size=1024
+    )
+
+    assert result is True
+    assert filepath.read_bytes() == b"x" * 10_000
+    assert not (tmp_path / "data.parquet.part").exists()
+
+
+def test_download_parquet_file_resumes_partial_download(file_server, tmp_path):
+    data = bytes(range(256)) * 40
+    file_server.files["/data.parquet"] = data
+    filepath = tmp_path / "data.parquet"
+    (tmp_path / "data.parquet.part").write_bytes(data[:4000])
+
+    result = download_parquet_file(file_server.url("/data.parquet"), filepath)
+
+    assert result is True
+    assert filepath.read_bytes() == data
+    assert file_server.requests == [("/data.parquet", "bytes=4000-")]
+
+
+def test_download_parquet_file_restarts_without_range_support(file_server, tmp_path):
+    data = bytes(range(256)) * 40
+    file_server.files["/data.parquet"] = data
+    file_server.support_range = False
+    filepath = tmp_path / "data.parquet"
+    (tmp_path / "data.parquet.part").write_bytes(b"stale")
+
+    result = download_parquet_file(file_server.url("/data.parquet"), filepath)
+
+    assert result is True
+    assert filepath.read_bytes() == data
+
+
+def test_download_parquet_file_restarts_on_mismatched_content_range(
+    file_server, tmp_path
+):
+    data = bytes(range(256)) * 40
+    file_server.files["/data.parquet"] = data
+    file_server.range_skew = 100
+    filepath = tmp_path / "data.parquet"
+    (tmp_path / "data.parquet.part").write_bytes(data[:4000])
+
+    result = download_parquet_file(
+        file_server.url("/data.parquet"), filepath, max_retries=0
+    )
+
+    assert result is True
+    assert filepath.read_bytes() == data
+    assert file_server.requests == [
+        ("/data.parquet", "bytes=4000-"),
+        ("/data.parquet", None),
+    ]
+
+
+def test_download_parquet_file_restarts_stale_partial_file(file_server, tmp_path):
+    data = b"parquet data"
+    file_server.files["/data.parquet"] = data
+    filepath = tmp_path / "data.parquet"
+    (tmp_path / "data.parquet.part").write_bytes(b"x" * 100)
+
+    with patch("e2e_taxi_ride_duration_prediction.ingestion.time.sleep") as sleep:
+        result = download_parquet_file(
+            file_server.url("/data.parquet"), filepath, max_retries=0
+        )
+
+    assert result is True
+    assert filepath.read_bytes() == data
+    assert len(file_server.requests) == 2
+    sleep.assert_not_called()
+
+
+def test_download_parquet_file_retries_server_errors(file_server, tmp_path):
+    file_server.files["/data.parquet"] = b"parquet data"
+    file_server.failures["/data.parquet"] = 2
+    filepath = tmp_path / "data.parquet"
+
+    result = download_parquet_file(
+        file_server.url("/data.parquet"), filepath, backoff_factor=0.0
+    )
+
+    assert result is True
+    assert filepath.read_bytes() == b"parquet data"
+    assert len(file_server.requests) == 3
+
+
+def test_download_parquet_file_gives_up_after_retries(file_server, tmp_path):
+    file_server.files["/data.parquet"] = b"parquet data"
+    file_server.failures["/data.parquet"] = 10
+    filepath = tmp_path / "data.parquet"
+
+    result = download_parquet_file(
+        file_server.url("/data.parquet"), filepath, max_retries=2, backoff_factor=0.0
+    )
+
+    assert result is False
+    assert not filepath.exists()
+    assert len(file_server.requests) == 3
+
+
+def test_download_parquet_files(file_server, tmp_path):
+    downloads = []
+    for month in range(1, 4):
+        file_server.files[f"/{month}.parquet"] = str(month).encode() * 1000
+        downloads.append(
+            (file_server.url(f"/{month}.parquet"), tmp_path / f"{month}.parquet")
+        )
+    downloads.append(
+        (file_server.url("/missing.parquet"), tmp_path / "missing.parquet")
+    )
+
+    with requests.Session() as session:
+        result = download_parquet_files(downloads, session, max_workers=3)
+
+    assert sorted(result) == sorted(path for _, path in downloads[:3])
+    for month in range(1, 4):
+        assert (tmp_path / f"{month}.parquet").read_bytes() == str(
+            month
+        ).encode() * 1000
+    assert not (tmp_path / "missing.parquet").exists()
 
 
 def test_concatenate_parquet_files_empty_list(tmp_path):
@@ -166,6 +482,57 @@ def test_concatenate_parquet_files(tmp_path):
     assert result_df["tpep_pickup_datetime"].is_sorted()
 
 
+def _write_unsorted_months(tmp_path: Path) -> list[Path]:
+    paths = []
+    for month in (2, 1):
+        path = tmp_path / f"yellow_tripdata_2023-{month:02d}.parquet"
+        pl.DataFrame(
+            {
+                "tpep_pickup_datetime": [
+                    datetime(2023, month, day, 10) for day in (20, 3, 11)
+                ],
+                "trip_distance": [float(month)] * 3,
+            }
+        ).write_parquet(path)
+        paths.append(path)
+    return paths
+
+
+def test_concatenate_parquet_files_monthly(tmp_path):
+    file_paths = _write_unsorted_months(tmp_path)
+    output_path = tmp_path / "out/output.parquet"
+
+    concatenate_parquet_files(
+        file_paths, output_path, sort_mode="monthly", row_group_size=2
+    )
+
+    result_df = pl.read_parquet(output_path)
+    assert result_df["tpep_pickup_datetime"].is_sorted()
+    assert result_df["trip_distance"].to_list() == [1.0] * 3 + [2.0] * 3
+    metadata = pq.ParquetFile(output_path).metadata
+    assert metadata.num_row_groups == 3
+    assert metadata.row_group(0).column(0).statistics.has_min_max
+
+
+def test_concatenate_parquet_files_unknown_sort_mode(tmp_path):
+    with pytest.raises(ValueError, match="Unknown sort mode"):
+        concatenate_parquet_files(
+            _write_unsorted_months(tmp_path), tmp_path / "output.parquet", "random"
+        )
+
+
+def test_sort_parquet_files_in_place(tmp_path):
+    file_paths = _write_unsorted_months(tmp_path)
+
+    sort_parquet_files(file_paths, file_paths, max_workers=2)
+
+    for path in file_paths:
+        assert pl.read_parquet(path)["tpep_pickup_datetime"].is_sorted()
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        p.name for p in file_paths
+    )
+
+
 @patch("requests.Session")
 @patch("e2e_taxi_ride_duration_prediction.ingestion.concatenate_parquet_files")
 @patch("e2e_taxi_ride_duration_prediction.ingestion.download_parquet_file")
@@ -185,7 +552,9 @@ def test_get_nyc_taxi_data_download_and_concatenate(
 
     mock_download.side_effect = mock_download_side_effect
 
-    def mock_concat_side_effect(file_paths: list[Path], output_path: Path) -> None:
+    def mock_concat_side_effect(
+        file_paths: list[Path], output_path: Path, sort_mode: str
+    ) -> None:
         sample_df = pl.DataFrame(
             {"tpep_pickup_datetime": ["2023-01-01 10:00:00"], "trip_distance": [1.0]}
         ).with_columns(pl.col("tpep_pickup_datetime").str.to_datetime())
@@ -195,10 +564,13 @@ def test_get_nyc_taxi_data_download_and_concatenate(
 
     mock_concat.side_effect = mock_concat_side_effect
 
-    result = get_nyc_taxi_data(tmp_path, start=(2023, 1), end=(2023, 2))
+    result = get_nyc_taxi_data(
+        tmp_path, start=(2023, 1), end=(2023, 2), partitioned=False
+    )
 
     assert mock_download.call_count == 2
     mock_concat.assert_called_once()
+    assert mock_concat.call_args.args[2] == "global"
 
     assert isinstance(result, pl.LazyFrame)
 
@@ -215,7 +587,9 @@ def test_get_nyc_taxi_data_existing_file(tmp_path, caplog):
 
     sample_df.write_parquet(output_file)
 
-    result = get_nyc_taxi_data(tmp_path, start=(2023, 1), end=(2023, 2))
+    result = get_nyc_taxi_data(
+        tmp_path, start=(2023, 1), end=(2023, 2), partitioned=False
+    )
 
     assert "Found existing parquet file" in caplog.text
     assert isinstance(result, pl.LazyFrame)
@@ -226,6 +600,9 @@ def test_get_nyc_taxi_data_existing_file(tmp_path, caplog):
 def test_get_nyc_taxi_data_no_files_downloaded(mock_download, mock_session, tmp_path):
     mock_download.return_value = False
 
+    with pytest.raises(FileNotFoundError, match="No parquet files were downloaded"):
+        get_nyc_taxi_data(tmp_path, start=(2023, 1), end=(2023, 2), partitioned=False)
+
     with pytest.raises(FileNotFoundError, match="No parquet files were downloaded"):
         get_nyc_taxi_data(tmp_path, start=(2023, 1), end=(2023, 2))
 
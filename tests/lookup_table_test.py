@@ -0,0 +1,113 @@
+from unittest.mock import Mock
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.linear_model import LinearRegression, SGDRegressor
+
+from e2e_taxi_ride_duration_prediction.lookup_table import (
+    LOCATION_ID_CARDINALITY,
+    compile_lookup_table,
+    load_lookup_table,
+    lookup_table_path,
+    pair_distance_coefficients,
+    save_lookup_table,
+)
+
+
+@pytest.fixture
+def model_and_vectorizer(model_artifact):
+    return joblib.load(model_artifact)
+
+
+def test_compile_lookup_table_matches_model(model_and_vectorizer):
+    model, dict_vectorizer = model_and_vectorizer
+    rides = [(132, 148, 3.1), (161, 236, 0.0), (1, 2, 7.5), (100, 200, 2.0)]
+    expected = model.predict(
+        dict_vectorizer.transform(
+            [
+                {"pickup_dropoff_pair": f"{pu}_{do}", "trip_distance": distance}
+                for pu, do, distance in rides
+            ]
+        )
+    )
+
+    table = compile_lookup_table(model, dict_vectorizer, "abc")
+    result = table.predict(*zip(*rides))
+
+    assert table.pair_weights.shape == (LOCATION_ID_CARDINALITY,) * 2
+    assert table.source_version == "abc"
+    np.testing.assert_allclose(result, expected)
+
+
+def test_pair_distance_coefficients(model_and_vectorizer):
+    model, dict_vectorizer = model_and_vectorizer
+
+    coefficients = pair_distance_coefficients(model, dict_vectorizer)
+
+    vocabulary = dict_vectorizer.vocabulary_
+    assert coefficients.distance_index == vocabulary["trip_distance"]
+    assert len(coefficients.pair_ids) == len(vocabulary) - 1
+    pair_id = 132 * LOCATION_ID_CARDINALITY + 148
+    index = coefficients.pair_indices[coefficients.pair_ids == pair_id]
+    assert index.tolist() == [vocabulary["pickup_dropoff_pair=132_148"]]
+    assert coefficients.intercept == model.intercept_
+
+
+def test_lookup_table_out_of_range_ids(model_and_vectorizer):
+    model, dict_vectorizer = model_and_vectorizer
+    table = compile_lookup_table(model, dict_vectorizer)
+
+    result = table.predict([-1, 999], [148, 148], [2.0, 2.0])
+
+    np.testing.assert_allclose(result, table.intercept + table.distance_coef * 2.0)
+
+
+def test_compile_lookup_table_non_linear_model(model_and_vectorizer):
+    _, dict_vectorizer = model_and_vectorizer
+    with pytest.raises(ValueError, match="not a single-output linear model"):
+        compile_lookup_table(Mock(spec=["predict"]), dict_vectorizer)
+
+
+def test_compile_lookup_table_unsupported_feature():
+    dict_vectorizer = DictVectorizer()
+    X = dict_vectorizer.fit_transform([{"VendorID": "1", "trip_distance": 1.0}])
+    model = LinearRegression().fit(X, [1.0])
+
+    with pytest.raises(ValueError, match="can not be compiled"):
+        compile_lookup_table(model, dict_vectorizer)
+
+
+def test_compile_lookup_table_sgd_regressor():
+    dict_vectorizer = DictVectorizer()
+    X = dict_vectorizer.fit_transform(
+        [
+            {"pickup_dropoff_pair": "132_148", "trip_distance": 3.0},
+            {"pickup_dropoff_pair": "1_2", "trip_distance": 1.0},
+        ]
+    )
+    model = SGDRegressor(max_iter=100, random_state=0).fit(X, [20.0, 8.0])
+
+    table = compile_lookup_table(model, dict_vectorizer)
+
+    # the intercept of an SGDRegressor is a (1,) array
+    assert model.intercept_.shape == (1,)
+    np.testing.assert_allclose(
+        table.predict([132, 1], [148, 2], [3.0, 1.0]), model.predict(X)
+    )
+
+
+def test_save_and_load_lookup_table(model_and_vectorizer, tmp_path):
+    model, dict_vectorizer = model_and_vectorizer
+    table = compile_lookup_table(model, dict_vectorizer, source_version="abc")
+    path = lookup_table_path(tmp_path / "model.joblib")
+
+    save_lookup_table(table, path)
+    loaded = load_lookup_table(path)
+
+    assert path.name == "model.lookup.npz"
+    np.testing.assert_array_equal(loaded.pair_weights, table.pair_weights)
+    assert loaded.distance_coef == table.distance_coef
+    assert loaded.intercept == table.intercept
+    assert loaded.source_version == "abc"
@@ -0,0 +1,94 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.datastructures import State
+
+from e2e_taxi_ride_duration_prediction.serving.metrics import (
+    REGISTRY,
+    MetricsMiddleware,
+    ServingCollector,
+    instrument_stages,
+)
+from e2e_taxi_ride_duration_prediction.serving.prediction_cache import PredictionCache
+
+
+def _sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _stage_count(stage: str) -> float:
+    return _sample("taxi_api_stage_duration_seconds_count", stage=stage)
+
+
+def test_metrics_middleware_records_requests_and_stages():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    @instrument_stages
+    async def get_item(item_id: int) -> dict[str, int]:
+        await asyncio.sleep(0)
+        return {"item_id": item_id}
+
+    before = {
+        "ok": _sample(
+            "taxi_api_requests_total",
+            method="GET",
+            route="/items/{item_id}",
+            status="200",
+        ),
+        "unmatched": _sample(
+            "taxi_api_requests_total", method="GET", route="unmatched", status="404"
+        ),
+        "validation": _stage_count("validation"),
+        "serialization": _stage_count("serialization"),
+    }
+
+    client = TestClient(app)
+    assert client.get("/items/1").json() == {"item_id": 1}
+    assert client.get("/items/2").status_code == 200
+    assert client.get("/does-not-exist").status_code == 404
+
+    # the route template is used as label, not the path
+    assert (
+        _sample(
+            "taxi_api_requests_total",
+            method="GET",
+            route="/items/{item_id}",
+            status="200",
+        )
+        == before["ok"] + 2
+    )
+    assert (
+        _sample(
+            "taxi_api_requests_total", method="GET", route="unmatched", status="404"
+        )
+        == before["unmatched"] + 1
+    )
+    assert _stage_count("validation") == before["validation"] + 2
+    assert _stage_count("serialization") == before["serialization"] + 2
+    assert _sample("taxi_api_requests_in_flight") == 0
+
+
+def test_serving_collector_reads_component_state():
+    cache = PredictionCache()
+    key = cache.key(1, 2, 1.0)
+    cache.get(key, "v1")
+    cache.put(key, "v1", 5.0)
+    cache.get(key, "v1")
+    state = State({"prediction_cache": cache})
+
+    samples = {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for metric in ServingCollector(state).collect()
+        for sample in metric.samples
+    }
+
+    assert (
+        samples[("taxi_api_prediction_cache_lookups_total", (("result", "hit"),))] == 1
+    )
+    assert (
+        samples[("taxi_api_prediction_cache_lookups_total", (("result", "miss"),))] == 1
+    )
+    assert samples[("taxi_api_prediction_cache_entries", ())] == 1
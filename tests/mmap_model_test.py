@@ -0,0 +1,117 @@
+from unittest.mock import Mock
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.linear_model import LinearRegression, SGDRegressor
+
+from e2e_taxi_ride_duration_prediction.mmap_model import (
+    compile_mmap_model,
+    load_mmap_model,
+    mmap_model_path,
+    read_mmap_model_version,
+    save_mmap_model,
+)
+
+
+@pytest.fixture
+def model_and_vectorizer(model_artifact):
+    return joblib.load(model_artifact)
+
+
+def test_compile_mmap_model_matches_model(model_and_vectorizer):
+    model, dict_vectorizer = model_and_vectorizer
+    rides = [(132, 148, 3.1), (161, 236, 0.0), (1, 2, 7.5), (100, 200, 2.0)]
+    expected = model.predict(
+        dict_vectorizer.transform(
+            [
+                {"pickup_dropoff_pair": f"{pu}_{do}", "trip_distance": distance}
+                for pu, do, distance in rides
+            ]
+        )
+    )
+
+    mmap_model = compile_mmap_model(model, dict_vectorizer, "abc")
+    result = mmap_model.predict(*zip(*rides))
+
+    assert mmap_model.source_version == "abc"
+    np.testing.assert_allclose(result, expected)
+
+
+def test_mmap_model_out_of_range_ids(model_and_vectorizer):
+    model, dict_vectorizer = model_and_vectorizer
+    mmap_model = compile_mmap_model(model, dict_vectorizer)
+
+    result = mmap_model.predict([-1, 999], [148, 148], [2.0, 2.0])
+
+    expected = model.predict(dict_vectorizer.transform([{"trip_distance": 2.0}]))
+    np.testing.assert_allclose(result, [expected[0]] * 2)
+
+
+def test_compile_mmap_model_non_linear_model(model_and_vectorizer):
+    _, dict_vectorizer = model_and_vectorizer
+    with pytest.raises(ValueError, match="not a single-output linear model"):
+        compile_mmap_model(Mock(spec=["predict"]), dict_vectorizer)
+
+
+def test_compile_mmap_model_unsupported_feature():
+    dict_vectorizer = DictVectorizer()
+    X = dict_vectorizer.fit_transform([{"VendorID": "1", "trip_distance": 1.0}])
+    model = LinearRegression().fit(X, [1.0])
+
+    with pytest.raises(ValueError, match="VendorID=1"):
+        compile_mmap_model(model, dict_vectorizer)
+
+
+def test_compile_mmap_model_sgd_regressor():
+    dict_vectorizer = DictVectorizer()
+    X = dict_vectorizer.fit_transform(
+        [
+            {"pickup_dropoff_pair": "132_148", "trip_distance": 3.0},
+            {"pickup_dropoff_pair": "1_2", "trip_distance": 1.0},
+        ]
+    )
+    model = SGDRegressor(max_iter=100, random_state=0).fit(X, [20.0, 8.0])
+
+    mmap_model = compile_mmap_model(model, dict_vectorizer)
+
+    np.testing.assert_allclose(
+        mmap_model.predict([132, 1], [148, 2], [3.0, 1.0]), model.predict(X)
+    )
+
+
+def test_save_and_load_mmap_model(model_artifact, model_and_vectorizer):
+    model, dict_vectorizer = model_and_vectorizer
+    mmap_model = compile_mmap_model(model, dict_vectorizer, source_version="v1")
+    path = mmap_model_path(model_artifact)
+
+    save_mmap_model(mmap_model, path)
+    loaded = load_mmap_model(path)
+
+    assert path == model_artifact.with_suffix(".mmap")
+    assert read_mmap_model_version(path) == "v1"
+    assert isinstance(loaded.coef, np.memmap)
+    assert isinstance(loaded.pair_index, np.memmap)
+    np.testing.assert_array_equal(loaded.coef, mmap_model.coef)
+    np.testing.assert_array_equal(loaded.pair_index, mmap_model.pair_index)
+    assert loaded.intercept == mmap_model.intercept
+    assert loaded.distance_index == mmap_model.distance_index
+
+
+def test_save_mmap_model_replaces_export(model_artifact, model_and_vectorizer):
+    model, dict_vectorizer = model_and_vectorizer
+    path = mmap_model_path(model_artifact)
+    save_mmap_model(
+        compile_mmap_model(model, dict_vectorizer, source_version="v1"), path
+    )
+    mapped = load_mmap_model(path)
+
+    save_mmap_model(
+        compile_mmap_model(model, dict_vectorizer, source_version="v2"), path
+    )
+
+    assert read_mmap_model_version(path) == "v2"
+    assert [p.name for p in path.parent.iterdir() if p.name.startswith(".")] == []
+    # arrays mapped before the replacement stay readable
+    np.testing.assert_array_equal(mapped.coef, load_mmap_model(path).coef)
@@ -0,0 +1,206 @@
+import asyncio
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.linear_model import LinearRegression
+
+from e2e_taxi_ride_duration_prediction.lookup_table import (
+    LookupTableModel,
+    lookup_table_path,
+    save_lookup_table,
+)
+from e2e_taxi_ride_duration_prediction.mmap_model import (
+    MmapLinearModel,
+    compile_mmap_model,
+    mmap_model_path,
+    save_mmap_model,
+)
+from e2e_taxi_ride_duration_prediction.serving.model_holder import (
+    ModelHolder,
+    watch_model_file,
+)
+
+
+def _rewrite_artifact(path: Path, intercept: float) -> None:
+    dict_vectorizer = DictVectorizer().fit([{"trip_distance": 1.0}])
+    model = LinearRegression()
+    model.coef_ = [0.0]
+    model.intercept_ = intercept
+    joblib.dump((model, dict_vectorizer), path)
+    # make sure the change is visible even on filesystems with coarse mtimes
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_get_loads_model_once(model_artifact):
+    holder = ModelHolder(model_artifact)
+
+    with patch(
+        "joblib.load",
+        wraps=joblib.load,
+    ) as mock_load:
+        first = holder.get()
+        second = holder.get()
+
+    assert mock_load.call_count == 1
+    assert first is second
+    assert isinstance(first.dict_vectorizer, DictVectorizer)
+    assert len(first.version) == 64
+
+
+def test_reload_if_changed_unchanged(model_artifact):
+    holder = ModelHolder(model_artifact)
+    holder.load()
+
+    assert holder.has_changed() is False
+    assert holder.reload_if_changed() is False
+
+
+def test_reload_if_changed_swaps_model(model_artifact):
+    holder = ModelHolder(model_artifact)
+    in_flight = holder.get()
+
+    _rewrite_artifact(model_artifact, intercept=42.0)
+
+    assert holder.reload_if_changed() is True
+    reloaded = holder.get()
+    assert reloaded.version != in_flight.version
+    assert isinstance(reloaded.model, LinearRegression)
+    assert reloaded.model.intercept_ == 42.0
+    # snapshots taken before the reload are untouched
+    assert isinstance(in_flight.model, LinearRegression)
+    assert in_flight.model.intercept_ != 42.0
+
+
+def test_reload_if_changed_keeps_model_on_failure(model_artifact, caplog):
+    holder = ModelHolder(model_artifact)
+    loaded = holder.load()
+
+    model_artifact.write_bytes(b"not a joblib file")
+    stat = model_artifact.stat()
+    os.utime(model_artifact, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert holder.reload_if_changed() is False
+    assert holder.get() is loaded
+    assert "Failed to reload model" in caplog.text
+
+
+def test_load_uses_exported_lookup_table(model_artifact):
+    version = ModelHolder(model_artifact).load().version
+    table = LookupTableModel(
+        pair_weights=np.zeros((2, 2)),
+        distance_coef=1.0,
+        intercept=0.0,
+        source_version=version,
+    )
+    save_lookup_table(table, lookup_table_path(model_artifact))
+
+    loaded = ModelHolder(model_artifact).load()
+
+    assert isinstance(loaded.lookup_table, LookupTableModel)
+    assert loaded.lookup_table.pair_weights.shape == (2, 2)
+
+
+def test_load_ignores_stale_lookup_table(model_artifact, caplog):
+    table = LookupTableModel(
+        pair_weights=np.zeros((2, 2)),
+        distance_coef=1.0,
+        intercept=0.0,
+        source_version="stale",
+    )
+    save_lookup_table(table, lookup_table_path(model_artifact))
+
+    loaded = ModelHolder(model_artifact).load()
+
+    assert "Ignoring stale lookup table" in caplog.text
+    assert loaded.lookup_table is not None
+    assert loaded.lookup_table.source_version == loaded.version
+
+
+def test_load_uses_mmap_model(model_artifact):
+    version = ModelHolder(model_artifact).load().version
+    model, dict_vectorizer = joblib.load(model_artifact)
+    mmap_model = compile_mmap_model(model, dict_vectorizer, source_version=version)
+    save_mmap_model(mmap_model, mmap_model_path(model_artifact))
+
+    with patch("joblib.load") as mock_load:
+        loaded = ModelHolder(model_artifact).load()
+
+    mock_load.assert_not_called()
+    assert isinstance(loaded.lookup_table, MmapLinearModel)
+    assert isinstance(loaded.lookup_table.coef, np.memmap)
+    assert loaded.model is None
+    assert loaded.version == version
+
+
+def test_load_ignores_stale_mmap_model(model_artifact, caplog):
+    model, dict_vectorizer = joblib.load(model_artifact)
+    mmap_model = compile_mmap_model(model, dict_vectorizer, source_version="stale")
+    save_mmap_model(mmap_model, mmap_model_path(model_artifact))
+
+    loaded = ModelHolder(model_artifact).load()
+
+    assert "Ignoring stale memory-mapped model" in caplog.text
+    assert loaded.model is not None
+    assert not isinstance(loaded.lookup_table, MmapLinearModel)
+
+
+def test_reload_if_changed_picks_up_new_export(model_artifact):
+    holder = ModelHolder(model_artifact)
+    version = holder.load().version
+    assert not isinstance(holder.get().lookup_table, MmapLinearModel)
+
+    model, dict_vectorizer = joblib.load(model_artifact)
+    mmap_model = compile_mmap_model(model, dict_vectorizer, source_version=version)
+    save_mmap_model(mmap_model, mmap_model_path(model_artifact))
+
+    assert holder.has_changed() is True
+    assert holder.reload_if_changed() is True
+    assert isinstance(holder.get().lookup_table, MmapLinearModel)
+    assert holder.get().version == version
+    assert holder.has_changed() is False
+
+
+def test_load_without_mmap(model_artifact):
+    version = ModelHolder(model_artifact).load().version
+    model, dict_vectorizer = joblib.load(model_artifact)
+    mmap_model = compile_mmap_model(model, dict_vectorizer, source_version=version)
+    save_mmap_model(mmap_model, mmap_model_path(model_artifact))
+
+    loaded = ModelHolder(model_artifact, use_mmap=False).load()
+
+    assert loaded.model is not None
+    assert not isinstance(loaded.lookup_table, MmapLinearModel)
+
+
+def test_load_missing_file(tmp_path):
+    holder = ModelHolder(tmp_path / "missing.joblib")
+
+    with pytest.raises(FileNotFoundError):
+        holder.load()
+    assert holder.is_loaded is False
+
+
+def test_watch_model_file(model_artifact):
+    holder = ModelHolder(model_artifact)
+    old_version = holder.load().version
+    _rewrite_artifact(model_artifact, intercept=7.0)
+
+    async def run_watcher() -> None:
+        task = asyncio.create_task(watch_model_file(holder, interval=0.01))
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if holder.get().version != old_version:
+                break
+        task.cancel()
+
+    asyncio.run(run_watcher())
+
+    model = holder.get().model
+    assert isinstance(model, LinearRegression)
+    assert model.intercept_ == 7.0
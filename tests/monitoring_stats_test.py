@@ -0,0 +1,164 @@
+import numpy as np
+import polars as pl
+import pytest
+from scipy.spatial.distance import jensenshannon
+from scipy.stats import wasserstein_distance
+
+from e2e_taxi_ride_duration_prediction.monitoring_stats import (
+    CategoryCounts,
+    DataProfile,
+    NumericHistogram,
+    compare_profiles,
+    load_profile,
+    read_profile_meta,
+    save_profile,
+)
+
+
+def test_numeric_histogram_update_and_merge():
+    histogram = NumericHistogram.empty([0.0, 1.0, 2.0])
+    histogram.update([-1.0, 0.0, 0.5, 1.5, 2.0, np.nan])
+    other = NumericHistogram.empty([0.0, 1.0, 2.0])
+    other.update([1.0, 5.0])
+
+    histogram.merge(other)
+
+    assert histogram.counts.tolist() == [1, 2, 2, 2]
+    assert histogram.nulls == 1
+    assert histogram.n == 7
+    assert histogram.mean == pytest.approx(np.mean([-1, 0, 0.5, 1.5, 2, 1, 5]))
+    assert histogram.std == pytest.approx(np.std([-1, 0, 0.5, 1.5, 2, 1, 5]))
+    with pytest.raises(ValueError):
+        histogram.merge(NumericHistogram.empty([0.0, 1.0]))
+
+
+def test_numeric_histogram_quantile():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 10, 100_000)
+    histogram = NumericHistogram.empty(np.arange(0.0, 10.5, 0.5))
+    histogram.update(values)
+
+    for q in (0.1, 0.5, 0.9):
+        assert histogram.quantile(q) == pytest.approx(np.quantile(values, q), abs=0.05)
+
+
+def test_category_counts():
+    counts = CategoryCounts.empty(cardinality=4)
+    counts.update([0, 1, 1, 3, 7, -1, np.nan])
+
+    assert counts.counts.tolist() == [1, 2, 0, 1, 2]
+    assert counts.nulls == 1
+
+
+def _profile(frame: pl.DataFrame, **kwargs) -> DataProfile:
+    profile = DataProfile.empty()
+    for batch in frame.iter_slices(100):
+        profile.update(batch, **kwargs)
+    return profile
+
+
+def test_data_profile_matches_full_data_statistics():
+    rng = np.random.default_rng(1)
+    frame = pl.DataFrame(
+        {
+            "PULocationID": rng.integers(1, 266, 1_000),
+            "DOLocationID": rng.integers(1, 266, 1_000),
+            "trip_distance": rng.exponential(3, 1_000),
+            "duration": rng.uniform(1, 60, 1_000),
+            "prediction": rng.uniform(1, 60, 1_000),
+        }
+    )
+
+    profile = _profile(frame, sample_fraction=0.1, seed=0)
+
+    assert profile.rows == 1_000
+    assert profile.regression.n == 1_000
+    assert profile.numeric["trip_distance"].mean == pytest.approx(
+        frame["trip_distance"].mean()
+    )
+    assert np.array_equal(
+        profile.categorical["PULocationID"].counts[:266],
+        np.bincount(frame["PULocationID"], minlength=266),
+    )
+    # 10% of every batch of 100 rows
+    assert profile.sample is not None
+    assert profile.sample.shape == (100, 5)
+
+
+def test_compare_profiles_detects_drift():
+    rng = np.random.default_rng(2)
+    reference = pl.DataFrame(
+        {
+            "PULocationID": rng.integers(1, 100, 5_000),
+            "trip_distance": rng.exponential(3, 5_000),
+        }
+    )
+    same = pl.DataFrame(
+        {
+            "PULocationID": rng.integers(1, 100, 5_000),
+            "trip_distance": rng.exponential(3, 5_000),
+        }
+    )
+    shifted = pl.DataFrame(
+        {
+            "PULocationID": rng.integers(150, 250, 5_000),
+            "trip_distance": rng.exponential(6, 5_000),
+        }
+    )
+
+    no_drift = compare_profiles(_profile(reference), _profile(same))
+    drift = compare_profiles(_profile(reference), _profile(shifted))
+
+    # columns without data are skipped
+    assert set(drift) == {"trip_distance", "PULocationID"}
+    assert not any(d.drifted for d in no_drift.values())
+    assert all(d.drifted for d in drift.values())
+    assert drift["PULocationID"].method == "jensenshannon"
+    # the binned scores approximate the exact ones
+    exact = wasserstein_distance(reference["trip_distance"], shifted["trip_distance"])
+    assert drift["trip_distance"].score == pytest.approx(
+        exact / reference["trip_distance"].std(), rel=0.05
+    )
+    exact_js = jensenshannon(
+        np.bincount(reference["PULocationID"], minlength=266),
+        np.bincount(shifted["PULocationID"], minlength=266),
+    )
+    assert drift["PULocationID"].score == pytest.approx(exact_js)
+
+
+def test_save_and_load_profile(tmp_path):
+    rng = np.random.default_rng(3)
+    frame = pl.DataFrame(
+        {
+            "PULocationID": rng.integers(1, 266, 500),
+            "trip_distance": rng.exponential(3, 500),
+            "duration": rng.uniform(1, 60, 500),
+            "prediction": rng.uniform(1, 60, 500),
+        }
+    )
+    profile = _profile(frame, sample_fraction=0.1)
+
+    save_profile(profile, tmp_path / "profile", meta={"model_version": "abc"})
+    loaded = load_profile(tmp_path / "profile")
+
+    assert read_profile_meta(tmp_path / "profile")["model_version"] == "abc"
+    assert loaded.rows == profile.rows
+    assert loaded.regression == profile.regression
+    for column, histogram in profile.numeric.items():
+        assert np.array_equal(loaded.numeric[column].counts, histogram.counts)
+        assert loaded.numeric[column].total == histogram.total
+    assert np.array_equal(
+        loaded.categorical["PULocationID"].counts,
+        profile.categorical["PULocationID"].counts,
+    )
+    assert loaded.sample is not None and profile.sample is not None
+    assert loaded.sample.equals(profile.sample)
+    assert compare_profiles(profile, loaded) == compare_profiles(profile, profile)
+    # loaded profiles keep accumulating
+    loaded.merge(profile)
+    assert loaded.rows == 2 * profile.rows
+
+
+def test_load_profile_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_profile(tmp_path / "missing")
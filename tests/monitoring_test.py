@@ -1,13 +1,27 @@
+import json
 import tempfile
 from datetime import datetime
 from pathlib import Path
 from unittest.mock import Mock, patch
 
+import joblib
+import numpy as np
 import polars as pl
+import pytest
+from sklearn.feature_extraction import DictVectorizer
 
+from e2e_taxi_ride_duration_prediction.features import ColumnarDictEncoder
 from e2e_taxi_ride_duration_prediction.monitoring import (
     add_predictions_to_data,
+    cached_reference_profile,
     generate_monitoring_report,
+    generate_streaming_monitoring_report,
+    profile_parquet,
+)
+from e2e_taxi_ride_duration_prediction.monitoring_stats import reference_profile_dir
+from e2e_taxi_ride_duration_prediction.serving.model_holder import (
+    LoadedModel,
+    ModelHolder,
 )
 
 
@@ -30,16 +44,54 @@ def test_add_predictions_to_data():
 
     mock_model = Mock()
     mock_model.predict.return_value = [15.0, 30.0]
-    mock_vectorizer = Mock()
+    vectorizer = DictVectorizer().fit(
+        [{"pickup_dropoff_pair": "1_3", "trip_distance": 1.0}]
+    )
+
+    loaded = LoadedModel(
+        model=mock_model,
+        dict_vectorizer=vectorizer,
+        feature_encoder=ColumnarDictEncoder(vectorizer),
+        lookup_table=None,
+        version="test",
+        mtime_ns=0,
+        size=0,
+    )
 
-    with (
-        patch("builtins.open", mock=Mock()),
-        patch("joblib.load", return_value=(mock_model, mock_vectorizer)),
-    ):
-        result_df = add_predictions_to_data(test_data, "dummy_model.pkl").collect()
+    result_df = add_predictions_to_data(test_data, loaded).collect()
 
-        assert result_df["prediction"].to_list() == [15.0, 30.0]
-        assert "duration" in result_df.columns
+    assert result_df["prediction"].to_list() == [15.0, 30.0]
+    assert "duration" in result_df.columns
+    assert "pickup_dropoff_pair_id" not in result_df.columns
+    (X_features,), _ = mock_model.predict.call_args
+    np.testing.assert_array_equal(
+        X_features.toarray(),
+        vectorizer.transform(
+            [
+                {"pickup_dropoff_pair": "1_3", "trip_distance": 1.0},
+                {"pickup_dropoff_pair": "2_4", "trip_distance": 2.0},
+            ]
+        ).toarray(),
+    )
+
+
+def test_add_predictions_to_data_loads_model_path(model_artifact):
+    data = pl.LazyFrame(
+        {
+            "PULocationID": [132, 161],
+            "DOLocationID": [148, 236],
+            "trip_distance": [3.1, 2.5],
+            "tpep_pickup_datetime": [datetime(2025, 1, 1)] * 2,
+            "tpep_dropoff_datetime": [datetime(2025, 1, 1, 0, 10)] * 2,
+        }
+    )
+    loaded = ModelHolder(model_artifact, use_mmap=False).get()
+
+    from_path = add_predictions_to_data.fn(data, model_artifact).collect()
+    from_model = add_predictions_to_data.fn(data, loaded).collect()
+
+    assert from_path.equals(from_model)
+    assert from_path["prediction"].to_list() == pytest.approx([12.0, 9.0], abs=1.0)
 
 
 def test_generate_monitoring_report():
@@ -62,6 +114,9 @@ def test_generate_monitoring_report():
         mock_run = Mock()
 
         with (
+            patch(
+                "e2e_taxi_ride_duration_prediction.monitoring.ModelHolder"
+            ) as mock_holder_class,
             patch(
                 "e2e_taxi_ride_duration_prediction.monitoring.add_predictions_to_data"
             ) as mock_add_pred,
@@ -73,7 +128,7 @@ def test_generate_monitoring_report():
             mock_report.run.return_value = mock_run
             mock_report_class.return_value = mock_report
 
-            mock_add_pred.return_value = test_data.lazy().with_columns(
+            mock_add_pred.fn.return_value = test_data.lazy().with_columns(
                 pl.lit(20.0).alias("prediction")
             )
 
@@ -86,3 +141,96 @@ def test_generate_monitoring_report():
 
             assert result is mock_run
             mock_run.save_html.assert_called_once_with(report_path)
+            # the model is loaded once and shared by both data sets
+            mock_holder_class.assert_called_once_with("dummy_model.pkl", use_mmap=False)
+            loaded = mock_holder_class.return_value.get.return_value
+            assert mock_add_pred.fn.call_count == 2
+            for call in mock_add_pred.fn.call_args_list:
+                assert call.args[1] is loaded
+
+
+def _rides(n: int) -> pl.DataFrame:
+    rng = np.random.default_rng(0)
+    pickup = datetime(2025, 1, 1)
+    return pl.DataFrame(
+        {
+            "PULocationID": rng.choice([132, 161], n),
+            "DOLocationID": rng.choice([148, 236], n),
+            "trip_distance": rng.uniform(1, 5, n),
+            "tpep_pickup_datetime": [pickup] * n,
+        }
+    ).with_columns(
+        (
+            pl.col("tpep_pickup_datetime")
+            + pl.duration(minutes=pl.col("trip_distance") * 3)
+        ).alias("tpep_dropoff_datetime")
+    )
+
+
+def test_generate_streaming_monitoring_report(model_artifact, tmp_path):
+    rides = _rides(10_000)
+    rides.head(6_000).write_parquet(tmp_path / "reference.parquet")
+    rides.tail(4_000).write_parquet(tmp_path / "current.parquet")
+    report_path = tmp_path / "report.html"
+
+    with patch("e2e_taxi_ride_duration_prediction.monitoring.Report") as report_class:
+        result = generate_streaming_monitoring_report.fn(
+            tmp_path / "reference.parquet",
+            tmp_path / "current.parquet",
+            str(report_path),
+            model_path=model_artifact,
+            max_memory_bytes=2**20,
+            sample_rows=100,
+        )
+
+    assert result.reference.rows == 6_000
+    assert result.current.rows == 4_000
+    assert result.current.regression.n == 4_000
+    assert not any(drift.drifted for drift in result.drift.values())
+    reference_sample, current_sample = report_class.return_value.run.call_args.args
+    assert 0 < len(reference_sample.as_dataframe()) <= 150
+    result.snapshot.save_html.assert_called_once_with(str(report_path))
+    summary = json.loads(report_path.with_suffix(".json").read_text())
+    assert summary["rows"] == {"reference": 6_000, "current": 4_000}
+    assert summary["regression"]["current"]["n"] == 4_000
+    # the reference profile was cached next to the model
+    assert len(list(reference_profile_dir(model_artifact).iterdir())) == 1
+
+
+def test_cached_reference_profile(model_artifact, tmp_path):
+    reference_path = tmp_path / "reference.parquet"
+    _rides(1_000).write_parquet(reference_path)
+
+    def profile(holder, max_batch_bytes=512 * 2**20):
+        return cached_reference_profile(
+            reference_path,
+            model_artifact,
+            holder,
+            max_batch_bytes=max_batch_bytes,
+            sample_rows=100,
+        )
+
+    with patch(
+        "e2e_taxi_ride_duration_prediction.monitoring.profile_parquet",
+        wraps=profile_parquet,
+    ) as profile_mock:
+        first = profile(ModelHolder(model_artifact))
+        second = profile(ModelHolder(model_artifact))
+        assert profile_mock.call_count == 1
+
+        # other batches sample other rows
+        profile(ModelHolder(model_artifact), max_batch_bytes=2**10)
+        assert profile_mock.call_count == 2
+
+        # a retrained model gets a new profile, the stale one is removed
+        model, dict_vectorizer = joblib.load(model_artifact)
+        model.intercept_ += 1.0
+        joblib.dump((model, dict_vectorizer), model_artifact)
+        retrained = profile(ModelHolder(model_artifact))
+        assert profile_mock.call_count == 3
+
+    assert second.rows == first.rows == 1_000
+    assert second.regression == first.regression
+    assert second.sample.equals(first.sample)
+    assert retrained.regression != first.regression
+    assert len(list(reference_profile_dir(model_artifact).iterdir())) == 1
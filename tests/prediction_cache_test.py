@@ -0,0 +1,76 @@
+import pytest
+
+from e2e_taxi_ride_duration_prediction.serving.prediction_cache import PredictionCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_prediction_cache_hit_and_miss():
+    cache = PredictionCache()
+    key = cache.key(132, 148, 3.14)
+
+    assert cache.get(key, "v1") is None
+    cache.put(key, "v1", 12.5)
+
+    assert cache.get(cache.key(132, 148, 3.11), "v1") == 12.5
+    assert cache.get(cache.key(132, 148, 3.21), "v1") is None
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 2
+    assert cache.stats.hit_rate == pytest.approx(1 / 3)
+
+
+def test_prediction_cache_lru_eviction():
+    cache = PredictionCache(max_size=2)
+    a, b, c = (cache.key(pu, 1, 1.0) for pu in (1, 2, 3))
+    cache.get(a, "v1")
+    cache.put(a, "v1", 1.0)
+    cache.put(b, "v1", 2.0)
+    # use "a" so "b" becomes least recently used
+    cache.get(a, "v1")
+
+    cache.put(c, "v1", 3.0)
+
+    assert cache.get(b, "v1") is None
+    assert cache.get(a, "v1") == 1.0
+    assert cache.get(c, "v1") == 3.0
+    assert cache.stats.evictions == 1
+
+
+def test_prediction_cache_ttl():
+    clock = FakeClock()
+    cache = PredictionCache(ttl_seconds=10, clock=clock)
+    key = cache.key(1, 2, 1.0)
+    cache.get(key, "v1")
+    cache.put(key, "v1", 5.0)
+
+    clock.now = 9.9
+    assert cache.get(key, "v1") == 5.0
+    clock.now = 10.0
+    assert cache.get(key, "v1") is None
+    assert cache.stats.expirations == 1
+    assert len(cache) == 0
+
+
+def test_prediction_cache_invalidated_by_new_model_version():
+    cache = PredictionCache()
+    key = cache.key(1, 2, 1.0)
+    cache.get(key, "v1")
+    cache.put(key, "v1", 5.0)
+
+    assert cache.get(key, "v2") is None
+    # a prediction of the old model that finishes after the switch is dropped
+    cache.put(key, "v1", 5.0)
+    assert cache.get(key, "v2") is None
+    assert cache.stats.invalidations == 1
+
+
+@pytest.mark.parametrize("kwargs", [{"max_size": 0}, {"distance_step": 0}])
+def test_prediction_cache_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        PredictionCache(**kwargs)
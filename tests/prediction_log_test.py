@@ -0,0 +1,188 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from e2e_taxi_ride_duration_prediction.continuous_monitoring import (
+    PredictionLogReader,
+    SlidingWindowMonitor,
+)
+from e2e_taxi_ride_duration_prediction.monitoring_stats import DataProfile
+from e2e_taxi_ride_duration_prediction.serving.prediction_log import PredictionLogger
+
+
+def _read_log(log_dir) -> pl.DataFrame:
+    return pl.read_parquet(log_dir / "predictions-*.parquet")
+
+
+def test_logger_writes_buffer_on_stop(tmp_path):
+    prediction_logger = PredictionLogger(tmp_path)
+
+    async def run() -> None:
+        prediction_logger.log([132], [148], [3.1], [12.5], "v1")
+        prediction_logger.log(
+            np.array([1, 2]), np.array([3, 4]), np.array([1.0, 2.0]), [5.0, 6.0], "v2"
+        )
+        assert prediction_logger.buffered_rows == 3
+        # nothing is written on the request path
+        assert not list(tmp_path.iterdir())
+        await prediction_logger.stop()
+
+    asyncio.run(run())
+
+    log = _read_log(tmp_path)
+    assert log.columns == [
+        "timestamp",
+        "PULocationID",
+        "DOLocationID",
+        "trip_distance",
+        "prediction",
+        "model_version",
+    ]
+    assert log["PULocationID"].to_list() == [132, 1, 2]
+    assert log["prediction"].to_list() == [12.5, 5.0, 6.0]
+    assert log["model_version"].cast(pl.String).to_list() == ["v1", "v2", "v2"]
+    assert log.schema["timestamp"] == pl.Datetime("us", "UTC")
+    assert prediction_logger.stats.written == 3
+    assert prediction_logger.stats.files == 1
+    assert prediction_logger.buffered_rows == 0
+
+
+def test_logger_flushes_by_size_and_time(tmp_path):
+    prediction_logger = PredictionLogger(tmp_path, flush_rows=4, flush_interval=0.05)
+
+    async def run() -> None:
+        for i in range(4):
+            prediction_logger.log([i], [i], [1.0], [2.0], "v1")
+        await asyncio.sleep(0.02)
+        assert prediction_logger.stats.files == 1
+        prediction_logger.log([9], [9], [1.0], [2.0], "v1")
+        await asyncio.sleep(0.2)
+        assert prediction_logger.stats.files == 2
+        await prediction_logger.stop()
+
+    asyncio.run(run())
+
+    assert len(list(tmp_path.glob("predictions-*.parquet"))) == 2
+    assert _read_log(tmp_path).height == 5
+    # no temporary files are left behind
+    assert not list(tmp_path.glob(".*"))
+
+
+def test_logger_drops_rows_when_buffer_is_full(tmp_path):
+    prediction_logger = PredictionLogger(tmp_path, max_buffered_rows=3)
+
+    async def run() -> None:
+        prediction_logger.log([1, 2], [1, 2], [1.0, 1.0], [2.0, 2.0], "v1")
+        prediction_logger.log([3, 4], [3, 4], [1.0, 1.0], [2.0, 2.0], "v1")
+        prediction_logger.log([5], [5], [1.0], [2.0], "v1")
+        await prediction_logger.stop()
+
+    asyncio.run(run())
+
+    # the rows that fit are kept
+    assert prediction_logger.stats.logged == 3
+    assert prediction_logger.stats.dropped == 2
+    assert _read_log(tmp_path)["PULocationID"].to_list() == [1, 2, 3]
+
+
+def test_logger_keeps_batches_larger_than_the_buffer(tmp_path):
+    prediction_logger = PredictionLogger(tmp_path, max_buffered_rows=3)
+    n = 10
+
+    async def run() -> None:
+        ids = np.arange(n)
+        prediction_logger.log(ids, ids, np.ones(n), np.ones(n), "v1")
+        # the oversized batch is flushed without waiting for the interval
+        await asyncio.sleep(0.2)
+        assert prediction_logger.stats.files == 1
+        prediction_logger.log([n], [n], [1.0], [1.0], "v1")
+        await prediction_logger.stop()
+
+    asyncio.run(run())
+
+    assert prediction_logger.stats.logged == n + 1
+    assert prediction_logger.stats.dropped == 0
+    assert _read_log(tmp_path).height == n + 1
+
+
+def test_logger_samples_rides(tmp_path):
+    prediction_logger = PredictionLogger(tmp_path, sample_rate=0.25, seed=0)
+    n = 10_000
+
+    async def run() -> None:
+        ids = np.arange(n)
+        prediction_logger.log(ids, ids, np.ones(n), np.ones(n), "v1")
+        for i in range(1_000):
+            prediction_logger.log([i], [i], [1.0], [1.0], "v1")
+        await prediction_logger.stop()
+
+    asyncio.run(run())
+
+    stats = prediction_logger.stats
+    assert stats.logged + stats.sampled_out == n + 1_000
+    assert stats.logged == pytest.approx(0.25 * (n + 1_000), rel=0.1)
+    assert _read_log(tmp_path).height == stats.logged
+
+
+def test_logger_removes_oldest_files(tmp_path):
+    prediction_logger = PredictionLogger(tmp_path, max_bytes=1)
+
+    async def run() -> None:
+        for i in range(3):
+            prediction_logger.log([i], [i], [1.0], [2.0], "v1")
+            await prediction_logger.stop()
+
+    asyncio.run(run())
+
+    # the newest file is kept even if it alone exceeds max_bytes
+    assert prediction_logger.stats.removed_files == 2
+    assert _read_log(tmp_path)["PULocationID"].to_list() == [2]
+
+
+def test_logger_survives_write_errors(tmp_path):
+    log_dir = tmp_path / "log"
+    log_dir.write_text("not a directory")
+    prediction_logger = PredictionLogger(log_dir)
+
+    async def run() -> None:
+        prediction_logger.log([1], [1], [1.0], [2.0], "v1")
+        await prediction_logger.stop()
+
+    asyncio.run(run())
+
+    assert prediction_logger.stats.write_errors == 1
+    assert prediction_logger.buffered_rows == 0
+
+
+def test_log_is_read_by_continuous_monitoring(tmp_path):
+    prediction_logger = PredictionLogger(tmp_path)
+    rng = np.random.default_rng(0)
+    n = 1_000
+
+    async def run() -> None:
+        prediction_logger.log(
+            rng.integers(1, 266, n),
+            rng.integers(1, 266, n),
+            rng.exponential(3, n),
+            rng.uniform(1, 60, n),
+            "v1",
+        )
+        await prediction_logger.stop()
+
+    asyncio.run(run())
+    monitor = SlidingWindowMonitor(
+        DataProfile.empty(),
+        windows={"1h": timedelta(hours=1)},
+        clock=lambda: datetime.now(UTC),
+    )
+
+    assert monitor.poll(PredictionLogReader(tmp_path)) == n
+    assert monitor.metrics("1h").rows == n
+
+
+def test_sample_rate_is_validated(tmp_path):
+    with pytest.raises(ValueError):
+        PredictionLogger(tmp_path, sample_rate=0.0)
@@ -5,12 +5,20 @@ import pytest
 from polars.testing import assert_frame_equal
 
 from e2e_taxi_ride_duration_prediction.preprocessing import (
+    LOCATION_ID_ENUM,
     basic_preprocessing,
     calculate_duration,
     cast_categorical_columns,
+    cast_location_ids,
+    create_pickup_dropoff_pair_enum,
+    create_pickup_dropoff_pair_ids,
     create_pickup_dropoff_pairs,
+    feature_preprocessing,
     filter_by_date_range,
+    filter_partitions,
     filter_valid_durations,
+    pickup_dropoff_pair_enum,
+    required_columns,
 )
 
 
@@ -130,3 +138,117 @@ def test_basic_preprocessing(test_data, test_date_range):
     )
     result = basic_preprocessing(test_data, start, end)
     assert_frame_equal(result, expected)
+
+
+def test_required_columns():
+    result = required_columns(["pickup_dropoff_pair", "trip_distance", "VendorID"])
+    assert result == [
+        "tpep_pickup_datetime",
+        "tpep_dropoff_datetime",
+        "PULocationID",
+        "DOLocationID",
+        "trip_distance",
+        "VendorID",
+    ]
+
+
+def test_filter_partitions():
+    lf = pl.LazyFrame(
+        {"year": [2024, 2025, 2025, 2025], "month": [12, 1, 2, 3], "x": [1, 2, 3, 4]}
+    )
+
+    result = filter_partitions(lf, datetime(2025, 1, 15), datetime(2025, 3, 1))
+
+    assert result.collect()["x"].to_list() == [2, 3]
+
+
+def test_filter_partitions_without_partition_columns(test_data, test_date_range):
+    start, end = test_date_range
+    result = filter_partitions(test_data, start, end)
+    assert_frame_equal(result, test_data)
+
+
+def test_cast_location_ids():
+    lf = pl.LazyFrame({"PULocationID": [1, 265, 300], "DOLocationID": [0, 7, -1]})
+
+    result = cast_location_ids(lf).collect()
+
+    assert result.schema == pl.Schema(
+        {"PULocationID": LOCATION_ID_ENUM, "DOLocationID": LOCATION_ID_ENUM}
+    )
+    assert result["PULocationID"].to_list() == ["1", "265", None]
+    assert result["DOLocationID"].to_list() == ["0", "7", None]
+
+
+def test_create_pickup_dropoff_pair_enum():
+    lf = pl.LazyFrame({"PULocationID": [100, 265, 300], "DOLocationID": [110, 1, 2]})
+
+    result = lf.pipe(cast_location_ids).pipe(create_pickup_dropoff_pair_enum)
+
+    pairs = result.collect()["pickup_dropoff_pair"]
+    assert pairs.dtype == pickup_dropoff_pair_enum()
+    assert pairs.to_list() == ["100_110", "265_1", None]
+
+
+def test_feature_preprocessing(test_data, test_date_range):
+    start, end = test_date_range
+    features = ["pickup_dropoff_pair", "trip_distance", "VendorID"]
+    expected = (
+        basic_preprocessing(test_data, start, end)
+        .select(["tpep_pickup_datetime", *features, "duration"])
+        .with_columns(pl.col("pickup_dropoff_pair").cast(pl.String))
+    )
+
+    result = feature_preprocessing(test_data, start, end, features)
+
+    assert result.collect_schema()["pickup_dropoff_pair"] == pickup_dropoff_pair_enum()
+    assert_frame_equal(
+        result.with_columns(pl.col("pickup_dropoff_pair").cast(pl.String)), expected
+    )
+
+
+def test_create_pickup_dropoff_pair_ids():
+    lf = pl.LazyFrame(
+        {"PULocationID": [100, 265, 300, None], "DOLocationID": [110, 1, 2, 3]}
+    )
+
+    result = create_pickup_dropoff_pair_ids(lf).collect()["pickup_dropoff_pair_id"]
+
+    assert result.dtype == pl.UInt32
+    assert result.to_list() == [100 * 266 + 110, 265 * 266 + 1, None, None]
+
+
+def test_feature_preprocessing_pair_ids(test_data, test_date_range):
+    start, end = test_date_range
+    expected = (
+        basic_preprocessing(test_data, start, end)
+        .select("PULocationID", "DOLocationID")
+        .collect()
+    )
+
+    result = feature_preprocessing(
+        test_data, start, end, ["pickup_dropoff_pair_id", "trip_distance"]
+    ).collect()
+
+    assert result.columns == [
+        "tpep_pickup_datetime",
+        "pickup_dropoff_pair_id",
+        "trip_distance",
+        "duration",
+    ]
+    assert result["pickup_dropoff_pair_id"].to_list() == [
+        int(pu) * 266 + int(do)
+        for pu, do in zip(expected["PULocationID"], expected["DOLocationID"])
+    ]
+
+
+def test_feature_preprocessing_prunes_scan(tmp_path, test_data, test_date_range):
+    start, end = test_date_range
+    path = tmp_path / "data.parquet"
+    test_data.collect().write_parquet(path)
+
+    plan = feature_preprocessing(pl.scan_parquet(path), start, end).explain()
+
+    n_columns = len(test_data.collect_schema())
+    assert f"PROJECT 5/{n_columns} COLUMNS" in plan
+    assert "SELECTION" in plan
@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+import pytest
+
+from e2e_taxi_ride_duration_prediction.scoring import (
+    read_scored,
+    resolve_input_paths,
+    score_frame,
+    score_parquet_files,
+)
+from e2e_taxi_ride_duration_prediction.serving.inference import predict_rides
+from e2e_taxi_ride_duration_prediction.serving.model_holder import ModelHolder
+
+
+@pytest.fixture
+def rides() -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "tpep_pickup_datetime": [
+                datetime(2025, 1, 5),
+                datetime(2025, 1, 20),
+                datetime(2025, 2, 3),
+                datetime(2025, 2, 4),
+            ],
+            "PULocationID": [132, 161, 1, None],
+            "DOLocationID": [148, 236, 2, 148],
+            "trip_distance": [3.1, 2.5, 1.0, 3.1],
+            "fare_amount": [10.0, 12.0, 5.0, 7.0],
+        }
+    )
+
+
+def test_score_frame_nulls_for_incomplete_rides(model_artifact, rides):
+    holder = ModelHolder(model_artifact)
+
+    scored = score_frame(holder, rides)
+
+    expected = predict_rides(holder.get(), [132, 161, 1], [148, 236, 2], [3.1, 2.5, 1])
+    np.testing.assert_allclose(scored["prediction"].to_numpy()[:3], expected)
+    assert scored["prediction"][3] is None
+    assert scored.columns == [*rides.columns, "prediction"]
+
+
+def test_resolve_input_paths(tmp_path):
+    for month in ("01", "02"):
+        (tmp_path / f"month={month}").mkdir()
+        (tmp_path / f"month={month}" / "data.parquet").touch()
+
+    paths = resolve_input_paths(str(tmp_path / "**/*.parquet"))
+
+    assert [path.parent.name for path in paths] == ["month=01", "month=02"]
+    with pytest.raises(FileNotFoundError):
+        resolve_input_paths(str(tmp_path / "*.csv"))
+
+
+def test_score_parquet_files(model_artifact, rides, tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    rides.head(2).write_parquet(input_dir / "a.parquet")
+    rides.tail(2).write_parquet(input_dir / "b.parquet")
+    output_dir = tmp_path / "scored"
+
+    report = score_parquet_files.fn(
+        resolve_input_paths(str(input_dir / "*.parquet")),
+        model_artifact,
+        output_dir,
+        columns=["fare_amount"],
+        batch_rows=1,
+        max_workers=1,
+    )
+
+    assert report.rows == 4
+    assert report.batches == 4
+    assert report.files == 2
+    assert sorted(p.name for p in output_dir.glob("year=2025/month=*")) == [
+        "month=1",
+        "month=2",
+    ]
+    scored = read_scored(output_dir).sort("tpep_pickup_datetime").collect()
+    expected = score_frame(ModelHolder(model_artifact), rides)
+    np.testing.assert_allclose(
+        scored["prediction"].to_numpy()[:3], expected["prediction"].to_numpy()[:3]
+    )
+    assert scored["prediction"][3] is None
+    assert scored["month"].to_list() == [1, 1, 2, 2]
+    assert set(scored.columns) == {
+        "tpep_pickup_datetime",
+        "PULocationID",
+        "DOLocationID",
+        "trip_distance",
+        "fare_amount",
+        "prediction",
+        "year",
+        "month",
+    }
+
+
+def test_score_parquet_files_refuses_previous_output(model_artifact, rides, tmp_path):
+    input_path = tmp_path / "rides.parquet"
+    rides.write_parquet(input_path)
+    output_dir = tmp_path / "scored"
+    stale = output_dir / "year=2025/month=1/part-000009-0.parquet"
+    stale.parent.mkdir(parents=True)
+    rides.head(1).write_parquet(stale)
+
+    with pytest.raises(FileExistsError):
+        score_parquet_files.fn([input_path], model_artifact, output_dir)
+
+    report = score_parquet_files.fn(
+        [input_path], model_artifact, output_dir, max_workers=1, overwrite=True
+    )
+
+    assert not stale.exists()
+    assert read_scored(output_dir).collect().height == report.rows == rides.height
@@ -1,6 +1,32 @@
+import asyncio
+import subprocess
+import sys
+from unittest.mock import patch
+
+import httpx
+import joblib
+import polars as pl
+import pytest
 from fastapi.testclient import TestClient
 
-from e2e_taxi_ride_duration_prediction.serving.main import app
+from e2e_taxi_ride_duration_prediction.serving.batching import MicroBatcher
+from e2e_taxi_ride_duration_prediction.serving.columnar import ARROW_STREAM_MEDIA_TYPE
+from e2e_taxi_ride_duration_prediction.serving.executor import InferenceQueueFullError
+from e2e_taxi_ride_duration_prediction.serving.main import (
+    _predict_with_current_model,
+    app,
+)
+from e2e_taxi_ride_duration_prediction.serving.model_holder import ModelHolder
+from e2e_taxi_ride_duration_prediction.serving.prediction_cache import PredictionCache
+from e2e_taxi_ride_duration_prediction.serving.prediction_log import PredictionLogger
+
+
+@pytest.fixture
+def holder(model_artifact):
+    original = app.state.model_holder
+    app.state.model_holder = ModelHolder(model_artifact)
+    yield app.state.model_holder
+    app.state.model_holder = original
 
 
 def test_predict_endpoint():
@@ -26,3 +52,354 @@ def test_predict_invalid_types():
         json={"PULocationID": "invalid", "DOLocationID": 148, "trip_distance": 3.1},
     )
     assert response.status_code == 422
+
+
+def test_lifespan_loads_model_once(holder):
+    with patch(
+        "joblib.load",
+        wraps=joblib.load,
+    ) as mock_load:
+        with TestClient(app) as client:
+            assert holder.is_loaded
+            for _ in range(3):
+                response = client.post(
+                    "/predict",
+                    json={
+                        "PULocationID": 132,
+                        "DOLocationID": 148,
+                        "trip_distance": 3.1,
+                    },
+                )
+                assert response.status_code == 200
+
+    assert mock_load.call_count == 1
+
+
+def test_admin_reload(holder):
+    with TestClient(app) as client:
+        version = holder.get().version
+        response = client.post("/admin/reload")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "version": version,
+        "model_path": str(holder.model_path),
+    }
+
+
+def test_predict_batch_endpoint(holder):
+    client = TestClient(app)
+    rides = {"PULocationID": [132, 161], "DOLocationID": [148, 236]}
+    distances = [3.1, 2.5]
+
+    response = client.post("/predict/batch", json={**rides, "trip_distance": distances})
+
+    assert response.status_code == 200
+    batch = response.json()["predicted_duration"]
+    assert len(batch) == 2
+    for i, distance in enumerate(distances):
+        single = client.post(
+            "/predict",
+            json={
+                "PULocationID": rides["PULocationID"][i],
+                "DOLocationID": rides["DOLocationID"][i],
+                "trip_distance": distance,
+            },
+        ).json()["predicted_duration"]
+        assert batch[i] == pytest.approx(single)
+
+
+def test_predict_batch_mismatched_lengths(holder):
+    client = TestClient(app)
+    response = client.post(
+        "/predict/batch",
+        json={
+            "PULocationID": [132, 161],
+            "DOLocationID": [148],
+            "trip_distance": [3.1],
+        },
+    )
+    assert response.status_code == 422
+
+
+def test_predict_batch_empty(holder):
+    client = TestClient(app)
+    response = client.post(
+        "/predict/batch",
+        json={"PULocationID": [], "DOLocationID": [], "trip_distance": []},
+    )
+    assert response.status_code == 422
+
+
+def test_predict_with_micro_batching(holder):
+    original = app.state.batcher
+    app.state.batcher = MicroBatcher(
+        _predict_with_current_model, max_batch_size=16, max_wait_ms=20
+    )
+    payload = {"PULocationID": 132, "DOLocationID": 148, "trip_distance": 3.1}
+
+    async def run() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return list(
+                await asyncio.gather(
+                    *(client.post("/predict", json=payload) for _ in range(8))
+                )
+            )
+
+    try:
+        responses = asyncio.run(run())
+        stats = TestClient(app).get("/stats/batching").json()
+    finally:
+        app.state.batcher = original
+
+    expected = TestClient(app).post("/predict", json=payload).json()
+    assert all(r.status_code == 200 for r in responses)
+    assert all(r.json() == pytest.approx(expected) for r in responses)
+    assert stats["enabled"] is True
+    assert stats["items"] == 8
+    assert stats["batches"] < 8
+
+
+def test_predict_with_micro_batching_returns_503_when_saturated(holder):
+    async def slow_predict(pickup_ids, dropoff_ids, distances):
+        await asyncio.sleep(0.1)
+        return await _predict_with_current_model(pickup_ids, dropoff_ids, distances)
+
+    original = app.state.batcher
+    app.state.batcher = MicroBatcher(
+        slow_predict,
+        max_batch_size=2,
+        max_wait_ms=1,
+        max_concurrent_batches=1,
+        max_queue_size=4,
+    )
+    payload = {"PULocationID": 132, "DOLocationID": 148, "trip_distance": 3.1}
+
+    async def run() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return list(
+                await asyncio.gather(
+                    *(client.post("/predict", json=payload) for _ in range(20))
+                )
+            )
+
+    try:
+        responses = asyncio.run(run())
+        stats = TestClient(app).get("/stats/batching").json()
+    finally:
+        app.state.batcher = original
+
+    statuses = [r.status_code for r in responses]
+    assert set(statuses) == {200, 503}
+    assert all(
+        r.headers["Retry-After"] == "1" for r in responses if r.status_code == 503
+    )
+    assert stats["rejected"] == statuses.count(503)
+
+
+def test_batching_stats_disabled():
+    original = app.state.batcher
+    app.state.batcher = None
+    try:
+        response = TestClient(app).get("/stats/batching")
+    finally:
+        app.state.batcher = original
+
+    assert response.status_code == 200
+    assert response.json()["enabled"] is False
+
+
+def test_serving_imports_no_training_stack():
+    code = (
+        "import sys\n"
+        "import e2e_taxi_ride_duration_prediction.serving.main\n"
+        "print(sorted({name.partition('.')[0] for name in sys.modules}))\n"
+    )
+    packages = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+
+    for heavy in ("polars", "sklearn", "scipy", "joblib", "pyarrow", "prefect"):
+        assert f"'{heavy}'" not in packages
+
+
+def test_predict_returns_503_when_queue_is_full(holder):
+    with patch.object(
+        app.state.executor,
+        "predict",
+        side_effect=InferenceQueueFullError("full"),
+    ):
+        response = TestClient(app).post(
+            "/predict",
+            json={"PULocationID": 132, "DOLocationID": 148, "trip_distance": 3.1},
+        )
+        stats = TestClient(app).get("/stats/inference")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert stats.status_code == 200
+    assert stats.json()["executor"] == "thread"
+
+
+def test_predict_uses_prediction_cache(holder):
+    original = app.state.prediction_cache
+    app.state.prediction_cache = PredictionCache(max_size=10)
+    payload = {"PULocationID": 132, "DOLocationID": 148, "trip_distance": 3.1}
+    try:
+        with TestClient(app) as client:
+            first = client.post("/predict", json=payload).json()
+            second = client.post("/predict", json=payload).json()
+            client.post("/admin/reload")
+            third = client.post("/predict", json=payload).json()
+            stats = client.get("/stats/cache").json()
+    finally:
+        app.state.prediction_cache = original
+
+    assert first == second == third
+    assert stats["enabled"] is True
+    # reloading an unchanged artifact keeps the model version and the entries
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["size"] == 1
+
+
+def test_prediction_cache_stats_disabled():
+    response = TestClient(app).get("/stats/cache")
+
+    assert response.status_code == 200
+    assert response.json()["enabled"] is False
+
+
+def test_metrics_endpoint(holder):
+    with TestClient(app) as client:
+        client.post(
+            "/predict",
+            json={"PULocationID": 132, "DOLocationID": 148, "trip_distance": 3.1},
+        )
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    for stage in ("validation", "queue", "encode", "predict", "serialization"):
+        assert f'taxi_api_stage_duration_seconds_count{{stage="{stage}"}}' in body
+    assert (
+        'taxi_api_requests_total{method="POST",route="/predict",status="200"}' in body
+    )
+    assert "taxi_api_model_batch_size_rides_bucket" in body
+    assert f'version="{holder.get().version[:12]}"' in body
+    assert "taxi_api_requests_in_flight" in body
+
+
+def test_predict_batch_arrow(holder):
+    rides = {
+        "PULocationID": [132, 161],
+        "DOLocationID": [148, 236],
+        "trip_distance": [3.1, 2.5],
+    }
+    client = TestClient(app)
+    expected = client.post("/predict/batch", json=rides).json()
+
+    response = client.post(
+        "/predict/batch",
+        content=pl.DataFrame(rides).write_ipc_stream(None).getvalue(),
+        headers={"content-type": ARROW_STREAM_MEDIA_TYPE},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == ARROW_STREAM_MEDIA_TYPE
+    predictions = pl.read_ipc_stream(response.content)["predicted_duration"]
+    assert predictions.to_list() == pytest.approx(expected["predicted_duration"])
+
+
+def test_predict_batch_json_response_for_arrow_request(holder):
+    rides = pl.DataFrame(
+        {"PULocationID": [132], "DOLocationID": [148], "trip_distance": [3.1]}
+    )
+
+    response = TestClient(app).post(
+        "/predict/batch",
+        content=rides.write_ipc_stream(None).getvalue(),
+        headers={"content-type": ARROW_STREAM_MEDIA_TYPE, "accept": "application/json"},
+    )
+
+    assert response.status_code == 200
+    assert len(response.json()["predicted_duration"]) == 1
+
+
+def test_predict_batch_invalid_arrow(holder):
+    response = TestClient(app).post(
+        "/predict/batch",
+        content=b"not arrow",
+        headers={"content-type": ARROW_STREAM_MEDIA_TYPE},
+    )
+
+    assert response.status_code == 422
+
+
+def test_predict_batch_arrow_float_location_ids(holder):
+    rides = pl.DataFrame(
+        {"PULocationID": [132.7], "DOLocationID": [148], "trip_distance": [3.1]}
+    )
+
+    response = TestClient(app).post(
+        "/predict/batch",
+        content=rides.write_ipc_stream(None).getvalue(),
+        headers={"content-type": ARROW_STREAM_MEDIA_TYPE},
+    )
+
+    assert response.status_code == 422
+    assert "integer" in response.json()["detail"]
+
+
+def test_predict_batch_unsupported_media_type(holder):
+    response = TestClient(app).post(
+        "/predict/batch", content=b"1,2,3", headers={"content-type": "text/csv"}
+    )
+
+    assert response.status_code == 415
+
+
+def test_predictions_are_logged(holder, tmp_path):
+    original = app.state.prediction_logger
+    app.state.prediction_logger = PredictionLogger(tmp_path)
+    try:
+        with TestClient(app) as client:
+            client.post(
+                "/predict",
+                json={"PULocationID": 132, "DOLocationID": 148, "trip_distance": 3.1},
+            )
+            client.post(
+                "/predict/batch",
+                json={
+                    "PULocationID": [132, 161],
+                    "DOLocationID": [148, 236],
+                    "trip_distance": [3.1, 2.5],
+                },
+            )
+            buffered = client.get("/stats/prediction-log").json()["buffered"]
+        # the log is flushed on shutdown
+        stats = app.state.prediction_logger.stats
+    finally:
+        app.state.prediction_logger = original
+
+    log = pl.read_parquet(tmp_path / "predictions-*.parquet")
+    assert buffered == 3
+    assert stats.written == 3
+    assert log["PULocationID"].to_list() == [132, 132, 161]
+    assert log["model_version"].cast(pl.String).unique().to_list() == [
+        holder.get().version
+    ]
+
+
+def test_prediction_log_stats_disabled():
+    response = TestClient(app).get("/stats/prediction-log")
+
+    assert response.status_code == 200
+    assert response.json()["enabled"] is False
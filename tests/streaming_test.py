@@ -0,0 +1,92 @@
+import numpy as np
+import polars as pl
+import pytest
+from sklearn.metrics import (
+    mean_absolute_error,
+    mean_squared_error,
+    r2_score,
+    root_mean_squared_error,
+)
+
+from e2e_taxi_ride_duration_prediction.streaming import (
+    LazyFrameBatches,
+    RegressionStats,
+    batch_rows_for_memory,
+    estimate_row_bytes,
+)
+
+
+@pytest.fixture
+def numbers_lf() -> pl.LazyFrame:
+    return pl.LazyFrame({"x": list(range(10)), "y": [float(i) for i in range(10)]})
+
+
+def test_lazy_frame_batches(numbers_lf):
+    with LazyFrameBatches(numbers_lf, batch_rows=4) as batches:
+        first_pass = [batch.height for batch in batches]
+        second_pass = pl.concat(list(batches))
+
+        assert batches.num_rows == 10
+
+    assert first_pass == [4, 4, 2]
+    assert second_pass.equals(numbers_lf.collect())
+
+
+def test_lazy_frame_batches_max_batch_bytes(numbers_lf):
+    batches = LazyFrameBatches(numbers_lf, max_batch_bytes=16 * 4 * 3)
+    assert batches.batch_rows == 3
+
+
+def test_lazy_frame_batches_requires_size(numbers_lf):
+    with pytest.raises(ValueError, match="batch_rows or max_batch_bytes"):
+        LazyFrameBatches(numbers_lf)
+
+
+def test_lazy_frame_batches_requires_context(numbers_lf):
+    with pytest.raises(RuntimeError, match="context manager"):
+        list(LazyFrameBatches(numbers_lf, batch_rows=2))
+
+
+def test_estimate_row_bytes():
+    schema = pl.Schema({"a": pl.Int64, "b": pl.UInt8, "c": pl.String})
+    assert estimate_row_bytes(schema) == 8 + 1 + 32
+    assert batch_rows_for_memory(schema, 1, overhead_factor=1) == 1
+
+
+def test_regression_stats_matches_sklearn():
+    rng = np.random.default_rng(42)
+    y_true = rng.normal(20, 5, 1_000)
+    y_pred = y_true + rng.normal(0, 2, 1_000)
+
+    stats = RegressionStats()
+    for start in range(0, 1_000, 300):
+        stats.update(y_true[start : start + 300], y_pred[start : start + 300])
+    stats.update([], [])
+
+    assert stats.n == 1_000
+    assert stats.mean_absolute_error == pytest.approx(
+        mean_absolute_error(y_true, y_pred)
+    )
+    assert stats.mean_squared_error == pytest.approx(mean_squared_error(y_true, y_pred))
+    assert stats.root_mean_squared_error == pytest.approx(
+        root_mean_squared_error(y_true, y_pred)
+    )
+    assert stats.r2_score == pytest.approx(r2_score(y_true, y_pred))
+
+
+def test_regression_stats_merge():
+    rng = np.random.default_rng(0)
+    y_true = rng.normal(20, 5, 1_000)
+    y_pred = y_true + rng.normal(0, 2, 1_000)
+    left, right = RegressionStats(), RegressionStats()
+    left.update(y_true[:400], y_pred[:400])
+    right.update(y_true[400:], y_pred[400:])
+
+    left.merge(right)
+    left.merge(RegressionStats())
+
+    assert left.n == 1_000
+    assert left.r2_score == pytest.approx(r2_score(y_true, y_pred))
+    assert left.root_mean_squared_error == pytest.approx(
+        root_mean_squared_error(y_true, y_pred)
+    )
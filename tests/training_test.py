@@ -10,13 +10,29 @@ import pytest
 from polars.testing import assert_frame_equal
 from scipy.sparse import csr_matrix, spmatrix
 from sklearn.linear_model import LinearRegression
+from xgboost import XGBRegressor
 
+from e2e_taxi_ride_duration_prediction.features import fit_dict_vectorizer
+from e2e_taxi_ride_duration_prediction.lookup_table import (
+    load_lookup_table,
+    lookup_table_path,
+)
+from e2e_taxi_ride_duration_prediction.mmap_model import (
+    load_mmap_model,
+    mmap_model_path,
+)
+from e2e_taxi_ride_duration_prediction.streaming import LazyFrameBatches
 from e2e_taxi_ride_duration_prediction.training import (
     dict_vectorize_features,
+    export_lookup_table,
+    export_mmap_model,
     save_model_and_vectorizer,
     time_series_train_test_split,
     train_model,
+    train_model_streaming,
+    train_xgboost_external_memory,
     validate_model,
+    validate_model_streaming,
     vectorize_target,
 )
 
@@ -165,3 +181,110 @@ def test_save_model_and_vectorizer():
     finally:
         if save_path.exists():
             save_path.unlink()
+
+
+def test_export_lookup_table(model_artifact):
+    model, dict_vectorizer = joblib.load(model_artifact)
+
+    table_path = export_lookup_table((model, dict_vectorizer), model_artifact)
+
+    assert table_path == lookup_table_path(model_artifact)
+    table = load_lookup_table(table_path)
+    assert len(table.source_version) == 64
+    assert table.distance_coef == model.coef_[-1]
+
+
+def test_export_lookup_table_non_linear_model(model_artifact, caplog):
+    _, dict_vectorizer = joblib.load(model_artifact)
+
+    result = export_lookup_table(
+        (Mock(spec=["predict"]), dict_vectorizer), model_artifact
+    )
+
+    assert result is None
+    assert not lookup_table_path(model_artifact).exists()
+    assert "Skipping lookup table export" in caplog.text
+
+
+def test_export_mmap_model(model_artifact):
+    model, dict_vectorizer = joblib.load(model_artifact)
+
+    export_path = export_mmap_model((model, dict_vectorizer), model_artifact)
+
+    assert export_path == mmap_model_path(model_artifact)
+    mmap_model = load_mmap_model(export_path)
+    assert len(mmap_model.source_version) == 64
+    assert mmap_model.coef[mmap_model.distance_index] == model.coef_[-1]
+
+
+def test_export_mmap_model_non_linear_model(model_artifact, caplog):
+    _, dict_vectorizer = joblib.load(model_artifact)
+
+    result = export_mmap_model(
+        (Mock(spec=["predict"]), dict_vectorizer), model_artifact
+    )
+
+    assert result is None
+    assert not mmap_model_path(model_artifact).exists()
+    assert "Skipping memory-mapped model export" in caplog.text
+
+
+@pytest.fixture
+def streaming_data() -> pl.LazyFrame:
+    rng = np.random.default_rng(0)
+    pairs = rng.choice(["132_148", "161_236", "1_2"], 200)
+    distances = rng.uniform(0.5, 10, 200)
+    durations = 3 * distances + np.where(pairs == "1_2", 10.0, 2.0)
+    return pl.LazyFrame(
+        {
+            "pickup_dropoff_pair": pairs,
+            "trip_distance": distances,
+            "duration": durations,
+        }
+    )
+
+
+def test_train_model_streaming(streaming_data):
+    features = ["pickup_dropoff_pair", "trip_distance"]
+    dict_vectorizer = fit_dict_vectorizer(streaming_data.select(features))
+    model = Mock()
+
+    with LazyFrameBatches(streaming_data, batch_rows=64) as batches:
+        result = train_model_streaming(
+            model, batches, dict_vectorizer, features, epochs=2
+        )
+
+    assert result is model
+    assert model.partial_fit.call_count == 8
+    X, y = model.partial_fit.call_args_list[0].args
+    assert X.shape == (64, len(dict_vectorizer.vocabulary_))
+    assert y.shape == (64,)
+
+
+def test_validate_model_streaming_matches_validate_model(streaming_data):
+    features = ["pickup_dropoff_pair", "trip_distance"]
+    X_train, _, dict_vectorizer = dict_vectorize_features(
+        streaming_data, streaming_data, features
+    )
+    y = streaming_data.select("duration").collect().to_numpy().ravel()
+    model = LinearRegression().fit(X_train, y)
+
+    with LazyFrameBatches(streaming_data, batch_rows=50) as batches:
+        results = validate_model_streaming(model, batches, dict_vectorizer, features)
+
+    expected = validate_model(model, X_train, y)
+    assert results == pytest.approx(expected)
+
+
+def test_train_xgboost_external_memory(streaming_data):
+    features = ["pickup_dropoff_pair", "trip_distance"]
+    dict_vectorizer = fit_dict_vectorizer(streaming_data.select(features))
+
+    with LazyFrameBatches(streaming_data, batch_rows=64) as batches:
+        model = train_xgboost_external_memory(
+            batches, dict_vectorizer, features, num_boost_round=5
+        )
+        results = validate_model_streaming(model, batches, dict_vectorizer, features)
+
+    assert isinstance(model, XGBRegressor)
+    assert results["test_r2_score"] > 0.5